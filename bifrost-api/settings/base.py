@@ -194,7 +194,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',  # TODO check if disable, and also delete CSRF
         'rest_framework.authentication.TokenAuthentication',
-        'oauth2_provider_jwt.authentication.JWTAuthentication',
+        'workflow.authentication.RoleClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'workflow.permissions.IsSuperUserBrowseableAPI',
@@ -346,6 +346,92 @@ else:
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
 DEFAULT_REPLYTO_EMAIL = os.getenv('DEFAULT_REPLYTO_EMAIL')
 
+# API Gateway settings
+
+# Parsed Swagger specs of the logic modules are cached per process
+GATEWAY_SPEC_CACHE_TTL = int(os.getenv('GATEWAY_SPEC_CACHE_TTL', 600))
+GATEWAY_SPEC_CACHE_REFRESH_AFTER = int(os.getenv('GATEWAY_SPEC_CACHE_REFRESH_AFTER', 300))
+GATEWAY_SPEC_CACHE_MAXSIZE = int(os.getenv('GATEWAY_SPEC_CACHE_MAXSIZE', 128))
+
+# Routes of the logic modules are cached per process, changes of other processes are applied once they change the
+# version in this cache of CACHES (if it's shared between the processes) or after this timeout
+GATEWAY_ROUTING_TABLE_CACHE = os.getenv('GATEWAY_ROUTING_TABLE_CACHE', 'default')
+GATEWAY_ROUTING_TABLE_TTL = int(os.getenv('GATEWAY_ROUTING_TABLE_TTL', 60))
+# Unknown endpoint names aren't looked up in the database again for this number of seconds
+GATEWAY_ROUTING_TABLE_MISSING_TTL = int(os.getenv('GATEWAY_ROUTING_TABLE_MISSING_TTL', 5))
+
+# Aggregated Swagger document: specs of the services are fetched concurrently with a timeout per service and cached,
+# unreachable services are retried after GATEWAY_DOCS_RETRY_AFTER seconds
+GATEWAY_DOCS_CACHE_TTL = int(os.getenv('GATEWAY_DOCS_CACHE_TTL', 600))
+GATEWAY_DOCS_RETRY_AFTER = int(os.getenv('GATEWAY_DOCS_RETRY_AFTER', 60))
+GATEWAY_DOCS_FETCH_TIMEOUT = float(os.getenv('GATEWAY_DOCS_FETCH_TIMEOUT', 5))
+GATEWAY_DOCS_FETCH_WORKERS = int(os.getenv('GATEWAY_DOCS_FETCH_WORKERS', 10))
+
+# Keep-alive HTTP connections to the logic modules, pool size is per logic module (host)
+GATEWAY_HTTP_POOL_MAXSIZE = int(os.getenv('GATEWAY_HTTP_POOL_MAXSIZE', 20))
+GATEWAY_HTTP_CONNECT_TIMEOUT = float(os.getenv('GATEWAY_HTTP_CONNECT_TIMEOUT', 5))
+GATEWAY_HTTP_READ_TIMEOUT = float(os.getenv('GATEWAY_HTTP_READ_TIMEOUT', 60))
+GATEWAY_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('GATEWAY_HTTP_KEEPALIVE_TIMEOUT', 30))
+GATEWAY_HTTP_DNS_CACHE_TTL = int(os.getenv('GATEWAY_HTTP_DNS_CACHE_TTL', 300))
+
+# Cache of related records' responses (timeouts are set per LogicModuleModel), alias of a cache in CACHES
+# to share it between processes or local memory of the process if not set
+GATEWAY_RESPONSE_CACHE_BACKEND = os.getenv('GATEWAY_RESPONSE_CACHE_BACKEND')
+GATEWAY_RESPONSE_CACHE_MAXSIZE = int(os.getenv('GATEWAY_RESPONSE_CACHE_MAXSIZE', 1024))
+# How long stale responses with an ETag are kept to be revalidated with conditional requests
+GATEWAY_RESPONSE_CACHE_REVALIDATE_TIMEOUT = int(os.getenv('GATEWAY_RESPONSE_CACHE_REVALIDATE_TIMEOUT', 3600))
+
+# Passed-through responses bigger than this (in bytes) or of unknown size are streamed to the client
+GATEWAY_STREAMING_MIN_SIZE = int(os.getenv('GATEWAY_STREAMING_MIN_SIZE', 1024 * 1024))
+GATEWAY_STREAMING_CHUNK_SIZE = int(os.getenv('GATEWAY_STREAMING_CHUNK_SIZE', 64 * 1024))
+# Maximum size (in bytes) of request bodies, p.e. uploads, which are forwarded to the services
+GATEWAY_MAX_UPLOAD_SIZE = int(os.getenv('GATEWAY_MAX_UPLOAD_SIZE', 100 * 1024 * 1024))
+
+# Header with the ID of a gateway request, it's forwarded to the services and a valid incoming ID is reused
+GATEWAY_TRACE_HEADER = os.getenv('GATEWAY_TRACE_HEADER', 'X-Request-ID')
+# Comma separated exporters of the gateway requests' timings, p.e. 'gateway.tracing.LogExporter'
+GATEWAY_TRACE_EXPORTERS = os.getenv('GATEWAY_TRACE_EXPORTERS', 'gateway.tracing.MetricsExporter').split(',')
+
+# Serializer of JSON payloads, 'gateway.json_backends.OrjsonJSONBackend' is faster but requires orjson to be installed
+GATEWAY_JSON_BACKEND = os.getenv('GATEWAY_JSON_BACKEND', 'gateway.json_backends.StdlibJSONBackend')
+
+# Circuit breakers of the services: the circuit opens when of the last GATEWAY_CIRCUIT_WINDOW requests (at least
+# GATEWAY_CIRCUIT_MIN_CALLS) the share of failures or of requests slower than GATEWAY_CIRCUIT_SLOW_CALL_DURATION
+# seconds reaches its rate, requests fail fast then and a probe request is sent after GATEWAY_CIRCUIT_OPEN_DURATION
+GATEWAY_CIRCUIT_WINDOW = int(os.getenv('GATEWAY_CIRCUIT_WINDOW', 20))
+GATEWAY_CIRCUIT_MIN_CALLS = int(os.getenv('GATEWAY_CIRCUIT_MIN_CALLS', 10))
+GATEWAY_CIRCUIT_ERROR_RATE = float(os.getenv('GATEWAY_CIRCUIT_ERROR_RATE', 0.5))
+GATEWAY_CIRCUIT_SLOW_CALL_DURATION = float(os.getenv('GATEWAY_CIRCUIT_SLOW_CALL_DURATION', 10))
+GATEWAY_CIRCUIT_SLOW_CALL_RATE = float(os.getenv('GATEWAY_CIRCUIT_SLOW_CALL_RATE', 0.8))
+GATEWAY_CIRCUIT_OPEN_DURATION = float(os.getenv('GATEWAY_CIRCUIT_OPEN_DURATION', 30))
+
+# Max number of related records' pks that DataMesh requests with one list request
+DATAMESH_BATCH_SIZE = int(os.getenv('DATAMESH_BATCH_SIZE', 100))
+
+# Limits of simultaneous DataMesh requests of one async gateway request in total and per service,
+# and the deadline in seconds after which outstanding requests are cancelled and partial data is returned
+DATAMESH_CONCURRENCY_LIMIT = int(os.getenv('DATAMESH_CONCURRENCY_LIMIT', 100))
+DATAMESH_SERVICE_CONCURRENCY_LIMIT = int(os.getenv('DATAMESH_SERVICE_CONCURRENCY_LIMIT', 20))
+DATAMESH_TIMEOUT = float(os.getenv('DATAMESH_TIMEOUT', 30))
+
+# The DataMesh configuration (LogicModuleModels and Relationships) is cached in each process. Changes in the process
+# reload it immediately, changes in other processes after this number of seconds
+DATAMESH_GRAPH_TTL = int(os.getenv('DATAMESH_GRAPH_TTL', 60))
+
+# Opt-in join mode: related records of ?join requests are spliced into the raw body of the service's response instead
+# of decoding it, big bodies (see GATEWAY_STREAMING_MIN_SIZE) are joined and streamed in chunks of this number of
+# items, related records of chunks which fail are listed in datamesh_partial_relationships of their items
+DATAMESH_JOIN_SPLICING = os.getenv('DATAMESH_JOIN_SPLICING', 'False') == 'True'
+DATAMESH_JOIN_CHUNK_SIZE = int(os.getenv('DATAMESH_JOIN_CHUNK_SIZE', 500))
+
+# Number of JoinRecords written or deleted with one query by the bulk endpoints of JoinRecords
+DATAMESH_BULK_WRITE_BATCH_SIZE = int(os.getenv('DATAMESH_BULK_WRITE_BATCH_SIZE', 1000))
+
+# Compiled CoreGroup permissions of the users are cached in this cache of CACHES, they are keyed by the users'
+# core_groups_version, so changes of the permissions are applied in all processes even if the cache isn't shared
+WORKFLOW_PERMISSIONS_CACHE = os.getenv('WORKFLOW_PERMISSIONS_CACHE', 'default')
+WORKFLOW_PERMISSIONS_CACHE_TIMEOUT = int(os.getenv('WORKFLOW_PERMISSIONS_CACHE_TIMEOUT', 300))
+
 # Swagger settings - for generate_swagger management command
 
 SWAGGER_SETTINGS = {
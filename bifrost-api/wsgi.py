@@ -15,3 +15,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE",
                       "bifrost-api.settings.production")
 
 application = get_wsgi_application()
+
+# route requests to the logic modules without querying them on the first requests
+from django.db import DatabaseError  # noqa: E402
+from gateway.routing import routing_table  # noqa: E402
+
+try:
+    routing_table.load()
+except DatabaseError:
+    # p.e. the database isn't migrated yet, the routes are loaded on the first request then
+    pass
@@ -25,3 +25,27 @@ def wsgi_request_factory():
         return WSGIRequest(environ)
 
     return _make_wsgi_request
+
+
+@pytest.fixture(autouse=True)
+def clear_gateway_caches():
+    """ Process-wide gateway caches must not leak data between tests """
+    from gateway.cache import docs_cache, response_cache, spec_cache
+    from gateway.health import circuit_breakers
+    from gateway.routing import routing_table
+    from gateway.sessions import session_pool
+    from gateway.tracing import metrics
+    spec_cache.clear()
+    docs_cache.clear()
+    routing_table.clear()
+    response_cache.clear()
+    session_pool.close()
+    metrics.clear()
+    circuit_breakers.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_relationship_graph():
+    """ Rolled back DataMesh configuration of a test doesn't invalidate the graph by signals """
+    from datamesh.graph import relationship_graph
+    relationship_graph.clear()
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import LogicModuleModel, Relationship
+
+
+class RelationshipGraphSnapshot:
+    """
+    LogicModuleModels indexed by (logic module endpoint name, endpoint) and their relationships with direction,
+    loaded with two queries. Snapshots are never changed, a new one is loaded instead.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._models = {}
+        self._relationships = defaultdict(list)
+
+        for model in LogicModuleModel.objects.all():
+            self._models[(model.logic_module_endpoint_name, model.endpoint)] = model
+        for relationship in Relationship.objects.select_related('origin_model', 'related_model'):
+            self._relationships[relationship.origin_model_id].append((relationship, True))
+            if relationship.related_model_id != relationship.origin_model_id:
+                self._relationships[relationship.related_model_id].append((relationship, False))
+
+    def get_model(self, logic_module_endpoint: str, model_endpoint: str) -> LogicModuleModel:
+        try:
+            return self._models[(logic_module_endpoint, model_endpoint)]
+        except KeyError:
+            raise LogicModuleModel.DoesNotExist(
+                f'LogicModuleModel with endpoint {model_endpoint} of {logic_module_endpoint} does not exist.')
+
+    def get_relationships(self, model: LogicModuleModel) -> List[Tuple[Relationship, bool]]:
+        """ Same like LogicModuleModel.get_relationships, but without queries """
+        return list(self._relationships.get(model.pk, []))
+
+
+class RelationshipGraph:
+    """
+    Process-wide DataMesh configuration. It's loaded once and reloaded after it was invalidated by changes of
+    LogicModuleModels or Relationships in this process, or after `ttl` seconds to apply changes of other processes.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self) -> RelationshipGraphSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version and not self._is_expired(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != self._version or self._is_expired(snapshot):
+                snapshot = self._snapshot = RelationshipGraphSnapshot(self._version)
+            return snapshot
+
+    def _is_expired(self, snapshot: RelationshipGraphSnapshot) -> bool:
+        return self.ttl is not None and time.monotonic() - snapshot.loaded_at > self.ttl
+
+    def invalidate(self) -> None:
+        """ Increment the version, so the graph is reloaded on the next access """
+        with self._lock:
+            self._version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        snapshot = self._snapshot
+        return {
+            'version': self._version,
+            'loaded_version': snapshot.version if snapshot else None,
+            'ttl': self.ttl,
+        }
+
+
+relationship_graph = RelationshipGraph(ttl=settings.DATAMESH_GRAPH_TTL)
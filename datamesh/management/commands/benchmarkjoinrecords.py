@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from datamesh.models import JoinRecord, Relationship, LogicModuleModel
+
+BATCH_SIZE = 10000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = """
+    Measure the latency of join resolution on a big JoinRecord table.
+
+    JoinRecords are generated in a transaction, which is rolled back at the end, so the benchmark can be run
+    against a copy of the production database. On PostgreSQL the lookups are measured again after dropping
+    the lookup indexes (also rolled back) to show their gain.
+
+    Example:
+    python manage.py benchmarkjoinrecords --records=1000000 --lookups=500
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1000000, help='Number of JoinRecords to generate.')
+        parser.add_argument('--relationships', type=int, default=10,
+                            help='Number of relationships the JoinRecords are spread over.')
+        parser.add_argument('--lookups', type=int, default=500, help='Number of lookups to measure per scenario.')
+        parser.add_argument('--batch', type=int, default=50, help='Number of origin records per index lookup.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                relationships, samples = self._generate(options['records'], options['relationships'])
+                self._analyze()
+                self._run('with lookup indexes', relationships, samples, options)
+                if connection.vendor == 'postgresql':
+                    with connection.schema_editor() as schema_editor:
+                        for index in JoinRecord._meta.indexes:
+                            schema_editor.remove_index(JoinRecord, index)
+                    self._analyze()
+                    self._run('without lookup indexes', relationships, samples, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Generated JoinRecords rolled back.')
+
+    def _generate(self, records: int, relationships_count: int):
+        """ Create relationships of both primary key types and spread the JoinRecords evenly over them """
+        relationships = []
+        for i in range(relationships_count):
+            suffix = uuid.uuid4().hex[:8]
+            origin_model = LogicModuleModel.objects.create(
+                logic_module_endpoint_name=f'benchmark-{suffix}', model=f'Origin{i}',
+                endpoint='/origins/', lookup_field_name='uuid')
+            related_model = LogicModuleModel.objects.create(
+                logic_module_endpoint_name=f'benchmark-related-{suffix}', model=f'Related{i}',
+                endpoint='/relateds/', lookup_field_name='id')
+            relationships.append(Relationship.objects.create(
+                origin_model=origin_model, related_model=related_model, key=f'benchmark_{suffix}'))
+
+        samples = {relationship.pk: ([], []) for relationship in relationships}
+        start = time.perf_counter()
+        created = 0
+        while created < records:
+            batch = []
+            for i in range(created, min(created + BATCH_SIZE, records)):
+                relationship = relationships[i % relationships_count]
+                # every origin record has three related records
+                record_uuid = uuid.UUID(int=i // (3 * relationships_count) << 16 | i % relationships_count, version=4)
+                batch.append(JoinRecord(relationship=relationship, record_uuid=record_uuid, related_record_id=i + 1))
+                record_uuids, related_record_ids = samples[relationship.pk]
+                if random.random() < 0.001:
+                    record_uuids.append(record_uuid)
+                    related_record_ids.append(i + 1)
+            JoinRecord.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f'Generated {created} JoinRecords in {time.perf_counter() - start:.1f}s')
+        return relationships, samples
+
+    @staticmethod
+    def _analyze():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {JoinRecord._meta.db_table}')
+
+    def _run(self, title: str, relationships, samples, options) -> None:
+        self.stdout.write(title)
+        lookups, batch_size = options['lookups'], options['batch']
+
+        def forward():
+            relationship = random.choice(relationships)
+            list(JoinRecord.objects.get_join_records(
+                random.choice(samples[relationship.pk][0] or [uuid.uuid4()]), relationship, True))
+
+        def reverse():
+            relationship = random.choice(relationships)
+            list(JoinRecord.objects.get_join_records(
+                random.choice(samples[relationship.pk][1] or [0]), relationship, False))
+
+        def index():
+            relationship = random.choice(relationships)
+            record_uuids = samples[relationship.pk][0]
+            JoinRecord.objects.get_join_records_index(
+                random.sample(record_uuids, min(batch_size, len(record_uuids))), [(relationship, True)])
+
+        for name, lookup in (('forward by uuid', forward), ('reverse by id', reverse),
+                             (f'index of {batch_size} records', index)):
+            timings = []
+            for _ in range(lookups):
+                start = time.perf_counter()
+                lookup()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(f'  {name}: median {statistics.median(timings):.2f}ms, '
+                              f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms, max {timings[-1]:.2f}ms')
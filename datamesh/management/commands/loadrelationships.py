@@ -1,17 +1,65 @@
 import json
+import re
+import time
+import uuid
+from typing import Any, Iterator, List, Optional, TextIO
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
 from datamesh.models import JoinRecord, Relationship, LogicModuleModel
-from gateway.models import LogicModule
 from workflow.models import Organization
 
 DEFAULT_FILE_NAME = 'data/contacts.json'
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+# LogicModuleModels of the default import, they are created if they don't exist yet
+DEFAULT_LOGIC_MODULE_MODELS = {
+    'crm.Contact': {'endpoint': '/contact/', 'lookup_field_name': 'uuid'},
+    'location.SiteProfile': {'endpoint': '/siteprofiles/', 'lookup_field_name': 'uuid'},
+}
+
+
+def iter_json_array(json_file: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """ Yield the items of a JSON array one by one without loading the whole file into memory """
+    decoder = json.JSONDecoder()
+    buffer = json_file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('The file has to contain a JSON array.')
+    pos = 1
+    eof = False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            if end == len(buffer) and not eof:
+                # a number might continue in the next chunk
+                raise json.JSONDecodeError('Item at the end of the buffer', buffer, end)
+        except json.JSONDecodeError:
+            # the item is cut at the end of the buffer, read more
+            if eof:
+                raise CommandError('The JSON array in the file is incomplete.')
+            chunk = json_file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
 
 
 class Command(BaseCommand):
     help = """
-    Load relationships from a file, which should be named 'contacts.json' or specify the name with the --file parameter.
+    Load relationships from a dump of the origin model, which should be named 'contacts.json' or specify the name
+    with the --file parameter. By default contacts of the crm service are related to the site profiles in their
+    `siteprofile_uuids`, any other pair of LogicModuleModels can be given with the --origin and --related parameters.
+    The LogicModuleModels of the default are created if they don't exist, other ones have to exist.
+    Records with invalid pks are skipped and counted. JoinRecords of the relationship which aren't in the dump
+    are deleted, unless records were skipped.
 
     To get the file, get the pod-name of the crm_service in your kubernetes namespace and run:
         kubectl exec -n <namespace> -it <pod-name> -- bash -c "python manage.py dumpdata
@@ -21,69 +69,161 @@ class Command(BaseCommand):
     kubectl exec -n kupfer-dev -it crm-service-cf5576999-vj5s4 -- bash -c "python manage.py dumpdata --format=json --indent=4 contact.Contact" > data/contacts.json
     kubectl cp data/contacts.json kupfer-dev/bifrost-7b96bb7487-f7c6m:/code/contacts.json
     kubectl exec -n kupfer-dev -it bifrost-7b96bb7487-f7c6m bash -- -c "python manage.py loadrelationships --file=contacts.json"
+    python manage.py loadrelationships --file=products.json --origin=products.Product --related=documents.Document --related-field=document_uuids
     """  # noqa
 
-    counter = 0
-
     def add_arguments(self, parser):
-        """Add --file argument to Command."""
+        """Add arguments to Command."""
         parser.add_argument(
             '--file', default=None, nargs='?', help='Path of file to import.',
         )
+        parser.add_argument(
+            '--origin', default='crm.Contact',
+            help='Origin LogicModuleModel as <logic module endpoint name>.<model>, p.e.: crm.Contact',
+        )
+        parser.add_argument(
+            '--related', default='location.SiteProfile',
+            help='Related LogicModuleModel as <logic module endpoint name>.<model>, p.e.: location.SiteProfile',
+        )
+        parser.add_argument(
+            '--key', default=None,
+            help='Key of the relationship if it has to be created, p.e.: contact_siteprofile_relationship',
+        )
+        parser.add_argument(
+            '--related-field', default='siteprofile_uuids',
+            help='Field of the dumped records with the pks of the related records (a list or a JSON encoded list).',
+        )
+        parser.add_argument(
+            '--organization-field', default='organization_uuid',
+            help='Field of the dumped records with the uuid of their organization.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Number of JoinRecords written in one transaction.',
+        )
+
+    @staticmethod
+    def _get_logic_module_model(name: str) -> LogicModuleModel:
+        endpoint_name, _, model = name.partition('.')
+        if name in DEFAULT_LOGIC_MODULE_MODELS:
+            logic_module_model, _ = LogicModuleModel.objects.get_or_create(
+                logic_module_endpoint_name=endpoint_name, model=model, defaults=DEFAULT_LOGIC_MODULE_MODELS[name])
+            return logic_module_model
+        try:
+            return LogicModuleModel.objects.get(logic_module_endpoint_name=endpoint_name, model=model)
+        except LogicModuleModel.DoesNotExist:
+            raise CommandError(f'LogicModuleModel {name} not found.')
+
+    @staticmethod
+    def _normalize_pk(pk: Any) -> Optional[str]:
+        """ Same representation for pks from the file and from the database, raises ValueError for invalid pks """
+        if pk is None or pk == '':
+            return None
+        if str(pk).isdigit():
+            return str(int(pk))
+        try:
+            return str(uuid.UUID(str(pk)))
+        except ValueError:
+            raise ValueError(f'Invalid pk {pk!r}, it has to be an integer or a UUID.')
+
+    @staticmethod
+    def _get_related_pks(value: Any) -> List[Any]:
+        if isinstance(value, str):
+            value = json.loads(value) if value.startswith('[') else [value]
+        return value or []
+
+    @staticmethod
+    def _make_join_record(relationship: Relationship, record_pk: str, related_record_pk: str,
+                          organization_uuid: str) -> JoinRecord:
+        join_record = JoinRecord(relationship=relationship, organization_id=organization_uuid)
+        for field_prefix, pk in (('', record_pk), ('related_', related_record_pk)):
+            field = 'record_id' if pk.isdigit() else 'record_uuid'
+            setattr(join_record, field_prefix + field, pk)
+        return join_record
+
+    def _write(self, batch: List[JoinRecord], batch_size: int) -> None:
+        with transaction.atomic():
+            JoinRecord.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+
+    def _report(self, records: int, join_records: int, start: float) -> None:
+        elapsed = time.monotonic() - start
+        self.stdout.write(f'{records} records parsed, {join_records} JoinRecords written '
+                          f'({records / elapsed:.0f} records/s, {join_records / elapsed:.0f} JoinRecords/s)')
 
     def handle(self, *args, **options):
         """
-        Load contacts with siteprofile_uuids from file and write the data directly
-        into the JoinRecords.
+        Stream records from file and write their relationships directly into the JoinRecords in batches.
         """
-        filename = options.get('file')
-        if not filename:
-            filename = DEFAULT_FILE_NAME
-        with open(filename, 'r', encoding='utf-8') as contacts_file:
-            contacts = json.load(contacts_file)
-        crm_logic_module = LogicModule.objects.get(endpoint_name='crm')
-        location_logic_module = LogicModule.objects.get(endpoint_name='location')
-
-        origin_model, _ = LogicModuleModel.objects.get_or_create(
-            model='Contact',
-            logic_module_endpoint_name=crm_logic_module.endpoint_name,
-            endpoint='/contact/',
-            lookup_field_name='uuid',
-        )
-        related_model, _ = LogicModuleModel.objects.get_or_create(
-            model='SiteProfile',
-            logic_module_endpoint_name=location_logic_module.endpoint_name,
-            endpoint='/siteprofiles/',
-            lookup_field_name='uuid',
-        )
+        filename = options.get('file') or DEFAULT_FILE_NAME
+        batch_size = options['batch_size']
+        related_field = options['related_field']
+        organization_field = options['organization_field']
+
+        origin_model = self._get_logic_module_model(options['origin'])
+        related_model = self._get_logic_module_model(options['related'])
+        key = options['key'] or f'{origin_model.model.lower()}_{related_model.model.lower()}_relationship'
         relationship, _ = Relationship.objects.get_or_create(
             origin_model=origin_model,
             related_model=related_model,
-            key='contact_siteprofile_relationship'
+            defaults={'key': key},
         )
-        eligible_join_records = []
-        # create JoinRecords with contact.id and siteprofile_uuid for all contacts
-        for contact in contacts:
-            organization_uuid = contact['fields']['organization_uuid']
-            try:
-                organization = Organization.objects.get(pk=organization_uuid)
-            except Organization.DoesNotExist:
-                print(f'Organization({organization_uuid}) not found.')
-                continue
-            self.counter += 1
-            siteprofile_uuids = contact['fields']['siteprofile_uuids']
-            if not siteprofile_uuids:
-                continue
-            for siteprofile_uuid in json.loads(siteprofile_uuids):
-                join_record, _ = JoinRecord.objects.get_or_create(
-                    relationship=relationship,
-                    record_uuid=contact['pk'],
-                    related_record_uuid=siteprofile_uuid,
-                    defaults={'organization': organization}
-                )
-                print(join_record)
-                eligible_join_records.append(join_record.pk)
-        print(f'{self.counter} Contacts parsed and written to the JoinRecords.')
+        organizations = {str(pk) for pk in Organization.objects.values_list('pk', flat=True)}
+
+        start = time.monotonic()
+        records = written = invalid = 0
+        imported = set()
+        batch = []
+        with open(filename, 'r', encoding='utf-8') as json_file:
+            for record in iter_json_array(json_file):
+                fields = record.get('fields', record)
+                try:
+                    organization_uuid = self._normalize_pk(fields.get(organization_field))
+                    record_pk = self._normalize_pk(record.get('pk'))
+                    related_record_pks = [self._normalize_pk(related_pk)
+                                          for related_pk in self._get_related_pks(fields.get(related_field))]
+                except ValueError as e:
+                    invalid += 1
+                    self.stdout.write(f'Record {record.get("pk")!r} skipped: {e}')
+                    continue
+                if organization_uuid not in organizations:
+                    self.stdout.write(f'Organization({organization_uuid}) not found.')
+                    continue
+                records += 1
+                if record_pk is None:
+                    continue
+                for related_record_pk in related_record_pks:
+                    if related_record_pk is None or (record_pk, related_record_pk) in imported:
+                        continue
+                    imported.add((record_pk, related_record_pk))
+                    batch.append(self._make_join_record(relationship, record_pk, related_record_pk,
+                                                        organization_uuid))
+                    if len(batch) >= batch_size:
+                        self._write(batch, batch_size)
+                        written += len(batch)
+                        batch = []
+                        self._report(records, written, start)
+        if batch:
+            self._write(batch, batch_size)
+            written += len(batch)
+        self._report(records, written, start)
+        self.stdout.write(f'{records} records parsed and written to the JoinRecords.')
+        if invalid:
+            # JoinRecords of the skipped records would be deleted as outdated
+            self.stdout.write(f'{invalid} record(s) with invalid pks skipped, no JoinRecords are deleted.')
+            return
+
         # delete not eligible JoinRecords in this relationship
-        deleted, _ = JoinRecord.objects.exclude(pk__in=eligible_join_records).filter(relationship=relationship).delete()
-        print(f'{deleted} JoinRecord(s) deleted.')
+        join_records = JoinRecord.objects.filter(relationship=relationship).values_list(
+            'pk', 'record_id', 'record_uuid', 'related_record_id', 'related_record_uuid')
+        outdated = []
+        for pk, record_id, record_uuid, related_record_id, related_record_uuid in join_records.iterator():
+            record_pk = self._normalize_pk(record_id if record_id is not None else record_uuid)
+            related_record_pk = self._normalize_pk(
+                related_record_id if related_record_id is not None else related_record_uuid)
+            if (record_pk, related_record_pk) not in imported:
+                outdated.append(pk)
+        deleted = 0
+        for i in range(0, len(outdated), batch_size):
+            with transaction.atomic():
+                count, _ = JoinRecord.objects.filter(pk__in=outdated[i:i + batch_size]).delete()
+                deleted += count
+        self.stdout.write(f'{deleted} JoinRecord(s) deleted.')
@@ -1,6 +1,8 @@
-from typing import Any
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
 
-from django.db.models import Manager, QuerySet, Model
+from django.db.models import Manager, QuerySet, Model, Q
 
 from gateway import utils
 
@@ -20,3 +22,44 @@ class JoinRecordManager(Manager):
             pk_field = 'related_' + pk_field
 
         return self.filter(relationship=relationship).filter(**{pk_field: str(origin_pk)})
+
+    def get_join_records_index(self,
+                               origin_pks: Iterable[Any],
+                               relationships: List[Tuple[Model, bool]]) -> Dict[Tuple[Any, str], List[str]]:
+        """
+        Get related records' pks for all origin_pks on all relationships (with direction) in one query.
+        :return dict: maps (relationship pk, str(origin_pk)) to the list of the related records' pks
+        """
+        # map pks of the DB representation to the pks how they were passed
+        origin_uuids, origin_ids = {}, {}
+        for origin_pk in origin_pks:
+            if utils.valid_uuid4(str(origin_pk)):
+                origin_uuids[uuid.UUID(str(origin_pk))] = str(origin_pk)
+            else:
+                origin_ids[int(origin_pk)] = str(origin_pk)
+
+        directions = {}
+        lookups = Q()
+        for relationship, is_forward_relationship in relationships:
+            directions[relationship.pk] = is_forward_relationship
+            prefix = '' if is_forward_relationship else 'related_'
+            if origin_uuids:
+                lookups |= Q(relationship=relationship, **{f'{prefix}record_uuid__in': origin_uuids.keys()})
+            if origin_ids:
+                lookups |= Q(relationship=relationship, **{f'{prefix}record_id__in': origin_ids.keys()})
+
+        index = defaultdict(list)
+        if not lookups:
+            return index
+
+        rows = self.filter(lookups).values_list(
+            'relationship_id', 'record_id', 'record_uuid', 'related_record_id', 'related_record_uuid')
+        for relationship_pk, record_id, record_uuid, related_record_id, related_record_uuid in rows:
+            record_pk = record_id if record_id is not None else record_uuid
+            related_record_pk = related_record_id if related_record_id is not None else related_record_uuid
+            if not directions[relationship_pk]:
+                record_pk, related_record_pk = related_record_pk, record_pk
+            origin_pk = origin_ids.get(record_pk) if isinstance(record_pk, int) else origin_uuids.get(record_pk)
+            if origin_pk is not None:
+                index[(relationship_pk, origin_pk)].append(str(related_record_pk))
+        return index
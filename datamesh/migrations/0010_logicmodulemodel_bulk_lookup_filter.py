@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0009_logicmodulemodel_is_local'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodulemodel',
+            name='bulk_lookup_filter',
+            field=models.SlugField(blank=True, help_text="Filter of the list endpoint for many values of lookup_field_name, p.e.: 'id__in' or 'uuid__in'. If set, related records are retrieved with one request", max_length=64, null=True),
+        ),
+    ]
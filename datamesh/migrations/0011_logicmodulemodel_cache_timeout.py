@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0010_logicmodulemodel_bulk_lookup_filter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodulemodel',
+            name='cache_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text="Seconds to cache responses of related records of this model across requests. Not cached if empty", null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0011_logicmodulemodel_cache_timeout'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='joinrecord',
+            index=models.Index(fields=['relationship', 'record_id', 'related_record_id', 'related_record_uuid'], name='joinrecord_forward_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrecord',
+            index=models.Index(fields=['relationship', 'record_uuid', 'related_record_id', 'related_record_uuid'], name='joinrecord_forward_uuid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrecord',
+            index=models.Index(fields=['relationship', 'related_record_id', 'record_id', 'record_uuid'], name='joinrecord_reverse_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrecord',
+            index=models.Index(fields=['relationship', 'related_record_uuid', 'record_id', 'record_uuid'], name='joinrecord_reverse_uuid_idx'),
+        ),
+    ]
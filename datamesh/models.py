@@ -17,6 +17,8 @@ class LogicModuleModel(models.Model):
     endpoint = models.CharField(max_length=255, help_text="Endpoint of the model with leading and trailing slashs, p.e.: '/siteprofiles/'")
     lookup_field_name = models.SlugField(max_length=64, default='id', help_text="Name of the field in the model for detail methods, p.e.: 'id' or 'uuid'")
     is_local = models.BooleanField(default=False, help_text="Local model is taken from BiFrost")
+    bulk_lookup_filter = models.SlugField(max_length=64, blank=True, null=True, help_text="Filter of the list endpoint for many values of lookup_field_name, p.e.: 'id__in' or 'uuid__in'. If set, related records are retrieved with one request")
+    cache_timeout = models.PositiveIntegerField(blank=True, null=True, help_text="Seconds to cache responses of related records of this model across requests. Not cached if empty")
 
     class Meta:
         unique_together = (
@@ -87,6 +89,18 @@ class JoinRecord(models.Model):
     objects = JoinRecordManager()
 
     class Meta:
+        # the partial unique indexes below can't be used for lookups without their conditions, so every lookup
+        # direction gets a composite index which also covers the other side of the join for index-only scans
+        indexes = [
+            models.Index(fields=['relationship', 'record_id', 'related_record_id', 'related_record_uuid'],
+                         name='joinrecord_forward_id_idx'),
+            models.Index(fields=['relationship', 'record_uuid', 'related_record_id', 'related_record_uuid'],
+                         name='joinrecord_forward_uuid_idx'),
+            models.Index(fields=['relationship', 'related_record_id', 'record_id', 'record_uuid'],
+                         name='joinrecord_reverse_id_idx'),
+            models.Index(fields=['relationship', 'related_record_uuid', 'record_id', 'record_uuid'],
+                         name='joinrecord_reverse_uuid_idx'),
+        ]
         # 4 UniqueConstraints for unique_together for 'relationship','organization',
         # 'record_id', 'record_uuid', 'related_record_id', 'related_record_uuid'
         constraints = [
@@ -0,0 +1,32 @@
+import codecs
+import json
+from typing import Iterator
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON into an iterator of its items, so very large payloads are processed
+    while they are read.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None) -> Iterator:
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if stream is None:
+            return iter(())
+        return self._iter_items(codecs.getreader(encoding)(stream))
+
+    @staticmethod
+    def _iter_items(reader) -> Iterator:
+        for line_number, line in enumerate(reader, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ParseError(f'NDJSON parse error in line {line_number} - {e}')
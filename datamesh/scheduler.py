@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, List, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutScheduler:
+    """
+    Runs DataMesh sub-requests with a global and a per-service concurrency limit.
+    All tasks of one request share a deadline, tasks still running after it are cancelled.
+    Tasks failing with one of `partial_errors` (p.e. their service is unavailable) are skipped like cancelled ones.
+    Has to be created in the event loop it's used in.
+    """
+
+    def __init__(self, global_limit: int, service_limit: int, timeout: float,
+                 partial_errors: Tuple[Type[Exception], ...] = ()):
+        self.timeout = timeout
+        self.partial_errors = partial_errors
+        self._global_semaphore = asyncio.Semaphore(global_limit)
+        self._service_semaphores = defaultdict(lambda: asyncio.Semaphore(service_limit))
+
+    async def limit(self, service: str, coroutine: Awaitable) -> Any:
+        """ Awaits a single sub-request once there is a free slot for its service """
+        async with self._global_semaphore:
+            async with self._service_semaphores[service]:
+                return await coroutine
+
+    async def _run_task(self, coroutine: Awaitable) -> bool:
+        """ Whether the task was completed, it wasn't if it failed with one of the partial errors """
+        try:
+            await coroutine
+        except self.partial_errors as e:
+            logger.warning(f'DataMesh task skipped: {e.__class__.__name__}: {e}')
+            return False
+        return True
+
+    async def run(self, tasks: List[Tuple[Awaitable, list]]) -> list:
+        """
+        Runs tasks given as tuples of coroutine and the list of targets (any objects) the task is filling.
+        Re-raises the first exception of a task. Returns the targets of the tasks cancelled by the deadline
+        or skipped because of a partial error.
+        """
+        futures = {asyncio.ensure_future(self._run_task(coroutine)): targets for coroutine, targets in tasks}
+        if not futures:
+            return []
+
+        done, pending = await asyncio.wait(futures, timeout=self.timeout, return_when=asyncio.FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+        for future in done:
+            if not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+
+        if pending:
+            logger.warning(f'DataMesh deadline of {self.timeout}s exceeded, {len(pending)} task(s) cancelled')
+        skipped = [future for future in done if not future.cancelled() and not future.result()]
+        return [target for future in list(pending) + skipped for target in futures[future]]
@@ -88,3 +88,23 @@ class JoinRecordSerializer(serializers.ModelSerializer):
         model = JoinRecord
         exclude = ('relationship', )
         read_only_fields = ('organization', )
+
+
+class JoinRecordBulkSerializer(serializers.Serializer):
+    """
+    One item of a bulk request of JoinRecords, validated without database queries.
+    The relationship is resolved for all items at once by the view.
+    """
+
+    origin_model_name = serializers.CharField()
+    related_model_name = serializers.CharField()
+    record_id = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    record_uuid = serializers.UUIDField(required=False, allow_null=True)
+    related_record_id = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    related_record_uuid = serializers.UUIDField(required=False, allow_null=True)
+
+    def validate(self, attrs: dict) -> dict:
+        for prefix in ('', 'related_'):
+            if (attrs.get(f'{prefix}record_id') is None) == (attrs.get(f'{prefix}record_uuid') is None):
+                raise serializers.ValidationError(f'Either {prefix}record_id or {prefix}record_uuid is required.')
+        return attrs
@@ -1,16 +1,26 @@
 import logging
 import asyncio
-from typing import Any, Dict, Generator, Union
+from typing import Any, Dict, Generator, Iterable, List, Union
 
 from django.apps import apps
+from django.conf import settings
 from django.forms.models import model_to_dict
 
-from .models import LogicModuleModel, Relationship, JoinRecord
-from .utils import prepare_lookup_kwargs
+from gateway import tracing
+from gateway.exceptions import ServiceUnavailable
+
+from .models import Relationship, JoinRecord
 from .exceptions import DatameshConfigurationError
+from .graph import relationship_graph
+from .scheduler import FanOutScheduler
+from .splicing import JSONItem, JSONItems
 
 logger = logging.getLogger(__name__)
 
+# key in a data item listing its relationships that couldn't be completed before the deadline or because their
+# service is unavailable
+PARTIAL_RELATIONSHIPS_KEY = 'datamesh_partial_relationships'
+
 
 class DataMesh:
     """
@@ -18,13 +28,19 @@ class DataMesh:
     For each model DataMesh object should be created.
     """
 
-    def __init__(self, logic_module_endpoint: str, model_endpoint: str, access_validator: Any = None):
-        self._logic_module_model = LogicModuleModel.objects.get(logic_module_endpoint_name=logic_module_endpoint,
-                                                                endpoint=model_endpoint)
-        self._relationships = self._logic_module_model.get_relationships()
+    def __init__(self, logic_module_endpoint: str, model_endpoint: str, access_validator: Any = None,
+                 batch_requests: bool = True):
+        graph = relationship_graph.get()
+        self._logic_module_model = graph.get_model(logic_module_endpoint, model_endpoint)
+        self._relationships = graph.get_relationships(self._logic_module_model)
         self._origin_lookup_field = self._logic_module_model.lookup_field_name
         self._access_validator = access_validator
         self._cache = {}
+        self._join_records_index = {}
+        self._indexed_pks = set()
+        self._batch_requests = batch_requests
+        self._batch_size = settings.DATAMESH_BATCH_SIZE
+        self._bulk_lookup_filters = {}
 
     @property
     def related_logic_modules(self) -> list:
@@ -41,39 +57,84 @@ class DataMesh:
             self._related_logic_modules = set(modules_list + modules_list_reverse)
         return self._related_logic_modules
 
+    def index_join_records(self, origin_pks: Iterable[Any]) -> None:
+        """
+        Loads join records of all given origin records at once instead of querying them record by record
+        """
+        origin_pks = {str(origin_pk) for origin_pk in origin_pks if origin_pk} - self._indexed_pks
+        if origin_pks:
+            with tracing.stage('joinrecords'):
+                self._join_records_index.update(
+                    JoinRecord.objects.get_join_records_index(origin_pks, self._relationships))
+            self._indexed_pks.update(origin_pks)
+
     def get_related_records_meta(self, origin_pk: Any) -> Generator[tuple, None, None]:
         """
         Gets list of related records' META-data that is used for retrieving data for each of these records
         """
+        self.index_join_records([origin_pk])
         for relationship, is_forward_lookup in self._relationships:
-            join_records = JoinRecord.objects.get_join_records(origin_pk, relationship, is_forward_lookup)
-            if join_records:
-                related_model, related_record_field = prepare_lookup_kwargs(
-                    is_forward_lookup, relationship, join_records[0])
-
-                for join_record in join_records:
-
-                    params = {
-                            'pk': (str(getattr(join_record, related_record_field))),
-                            'model': related_model.endpoint.strip('/'),
-                            'service': related_model.logic_module_endpoint_name,
-                            'pk_name': related_model.lookup_field_name,
-                        }
-
-                    yield relationship, params
+            related_model = relationship.related_model if is_forward_lookup else relationship.origin_model
+            if related_model.bulk_lookup_filter:
+                key = (related_model.logic_module_endpoint_name, related_model.endpoint.strip('/'))
+                self._bulk_lookup_filters[key] = related_model.bulk_lookup_filter
+            for related_pk in self._join_records_index.get((relationship.pk, str(origin_pk)), []):
+                params = {
+                    'pk': related_pk,
+                    'model': related_model.endpoint.strip('/'),
+                    'service': related_model.logic_module_endpoint_name,
+                    'pk_name': related_model.lookup_field_name,
+                    'cache_timeout': related_model.cache_timeout,
+                }
+                yield relationship, params
 
     def extend_data(self, data: Union[dict, list], client_map: Dict[str, Any]) -> None:
         """
         Extends given data according to this DataMesh's relationships.
         For getting extended data it uses a client objects (one for each related service).
         """
+        batches = {}
         if isinstance(data, dict):
             # one-object JSON
-            self._add_nested_data(data, client_map)
+            self._add_nested_data(data, client_map, batches)
         elif isinstance(data, list):
             # many-objects JSON
+            self.index_join_records(data_item.get(self._origin_lookup_field) for data_item in data)
             for data_item in data:
-                self._add_nested_data(data_item, client_map)
+                self._add_nested_data(data_item, client_map, batches)
+
+        for batch in batches.values():
+            try:
+                self._extend_with_batch(batch, client_map.get(batch['service']))
+            except ServiceUnavailable as e:
+                logger.warning(e.content)
+                for _, data_item, key in batch['records']:
+                    self._mark_partial(data_item, key)
+
+    @staticmethod
+    def _mark_partial(data_item: dict, key: str) -> None:
+        partial_relationships = data_item.setdefault(PARTIAL_RELATIONSHIPS_KEY, [])
+        if key not in partial_relationships:
+            partial_relationships.append(key)
+
+    def get_origin_stubs(self, items: JSONItems, chunk: List[JSONItem]) -> List[dict]:
+        """
+        Data items with just the origin lookup field read from the raw response body. They are extended instead of
+        the decoded items and their related records are spliced into the body with `splice_data`
+        """
+        return [{self._origin_lookup_field: items.get_value(item, self._origin_lookup_field)} for item in chunk]
+
+    def set_partial_data(self, stubs: List[dict]) -> None:
+        """ Related records of the stubs couldn't be retrieved, they are spliced without them and listed as partial """
+        for stub in stubs:
+            for relationship, _ in self._relationships:
+                stub[relationship.key] = []
+                self._mark_partial(stub, relationship.key)
+
+    def splice_data(self, items: JSONItems, chunk: List[JSONItem], stubs: List[dict]) -> bytes:
+        """ Raw items of the chunk with the related records of their extended stubs """
+        return items.splice(chunk, [{key: value for key, value in stub.items() if key != self._origin_lookup_field}
+                                    for stub in stubs])
 
     def _extend_with_local(self, data_item: dict, relationship: Relationship, params: dict) -> None:
         """ Extend data from local object (via Django ORM query)"""
@@ -103,7 +164,7 @@ class DataMesh:
             data_item[relationship.key].append(obj_dict)
             self._cache[cache_key] = obj_dict
 
-    def _add_nested_data(self, data_item: dict, client_map: Dict[str, Any]) -> None:
+    def _add_nested_data(self, data_item: dict, client_map: Dict[str, Any], batches: dict) -> None:
         """
         Nest data retrieved from related services.
         """
@@ -121,36 +182,121 @@ class DataMesh:
                 self._extend_with_local(data_item, relationship, params)
                 continue
 
+            if self._add_to_batch(batches, data_item, relationship.key, params):
+                continue
+
             params['method'] = 'get'
             client = client_map.get(params['service'])
+            try:
+                self._extend_with_remote(client, data_item[relationship.key], **params)
+            except ServiceUnavailable as e:
+                logger.warning(e.content)
+                self._mark_partial(data_item, relationship.key)
 
-            if hasattr(client, 'request') and callable(client.request):
-                content = client.request(**params)
-                if isinstance(content, tuple):  # assume that response body is the first returned value
-                    content = content[0]
-                if isinstance(content, dict):
-                    data_item[relationship.key].append(dict(content))
-                else:
-                    logger.error(f'No response data for join record (request params: {params})')
+    def _extend_with_remote(self, client: Any, placeholder: list, **request_kwargs) -> None:
+        """ Performs data request and extends data with received data """
+        if hasattr(client, 'request') and callable(client.request):
+            content = client.request(**request_kwargs)
+            if isinstance(content, tuple):  # assume that response body is the first returned value
+                content = content[0]
+            if isinstance(content, dict):
+                placeholder.append(dict(content))
+            else:
+                logger.error(f'No response data for join record (request params: {request_kwargs})')
+        else:
+            raise DatameshConfigurationError(f'DataMesh Error: Client should have request method')
+
+    def _add_to_batch(self, batches: dict, data_item: dict, key: str, params: dict) -> bool:
+        """
+        Registers related record for retrieving it together with other records of the same model.
+        Returns False if batch requests are disabled or not supported by the related model.
+        """
+        batch_key = (params['service'], params['model'])
+        if not self._batch_requests or batch_key not in self._bulk_lookup_filters:
+            return False
+        batch = batches.setdefault(batch_key, {
+            'service': params['service'],
+            'model': params['model'],
+            'pk_name': params['pk_name'],
+            'lookup_filter': self._bulk_lookup_filters[batch_key],
+            'cache_timeout': params['cache_timeout'],
+            'records': [],
+        })
+        batch['records'].append((params, data_item, key))
+        return True
+
+    def _get_batch_requests_kwargs(self, batch: dict) -> Generator[dict, None, None]:
+        """ Splits distinct pks of the batch into chunks and yields list request kwargs for each of them """
+        pks = list(dict.fromkeys(params['pk'] for params, _, _ in batch['records']))
+        for i in range(0, len(pks), self._batch_size):
+            yield {
+                'method': 'get',
+                'service': batch['service'],
+                'model': batch['model'],
+                'query_params': {batch['lookup_filter']: ','.join(pks[i:i + self._batch_size])},
+                'cache_timeout': batch['cache_timeout'],
+            }
+
+    @staticmethod
+    def _parse_batch_content(content: Any, pk_name: str) -> Dict[str, dict]:
+        """ Maps records from a list response by their pks """
+        if isinstance(content, tuple):  # assume that response body is the first returned value
+            content = content[0]
+        if isinstance(content, dict):
+            # In case of pagination take 'results' as a items data
+            content = content.get('results', [])
+        if not isinstance(content, list):
+            return {}
+        return {str(item[pk_name]): item for item in content if isinstance(item, dict) and pk_name in item}
+
+    def _extend_with_batch(self, batch: dict, client: Any) -> None:
+        """ Retrieves records of the batch with list requests and scatters them into their placeholders """
+        if not (hasattr(client, 'request') and callable(client.request)):
+            raise DatameshConfigurationError(f'DataMesh Error: Client should have request method')
+        records = {}
+        for request_kwargs in self._get_batch_requests_kwargs(batch):
+            records.update(self._parse_batch_content(client.request(**request_kwargs), batch['pk_name']))
+
+        for params, data_item, key in batch['records']:
+            if params['pk'] in records:
+                data_item[key].append(dict(records[params['pk']]))
             else:
-                raise DatameshConfigurationError(f'DataMesh Error: Client should have request method')
+                # p.e. the list response is paginated and the record is on another page
+                params['method'] = 'get'
+                self._extend_with_remote(client, data_item[key], **params)
 
     async def async_extend_data(self, data: Union[dict, list], client_map: Dict[str, Any]):
         """
-        Async aggregation logic
+        Async aggregation logic. Related records are requested with limited concurrency within a deadline,
+        relationships of items which couldn't be completed in time or whose service is unavailable are listed in
+        PARTIAL_RELATIONSHIPS_KEY.
         """
+        self._scheduler = FanOutScheduler(global_limit=settings.DATAMESH_CONCURRENCY_LIMIT,
+                                          service_limit=settings.DATAMESH_SERVICE_CONCURRENCY_LIMIT,
+                                          timeout=settings.DATAMESH_TIMEOUT,
+                                          partial_errors=(ServiceUnavailable,))
         tasks = []
+        batches = {}
         if isinstance(data, dict):
             # detailed view
-            tasks.extend(await self._prepare_tasks(data, client_map))
+            tasks.extend(await self._prepare_tasks(data, client_map, batches))
         elif isinstance(data, list):
             # list view
+            self.index_join_records(data_item.get(self._origin_lookup_field) for data_item in data)
             for data_item in data:
-                tasks.extend(await self._prepare_tasks(data_item, client_map))
-        await asyncio.gather(*tasks)
+                tasks.extend(await self._prepare_tasks(data_item, client_map, batches))
+        for batch in batches.values():
+            targets = [(data_item, key) for _, data_item, key in batch['records']]
+            tasks.append((self._async_extend_with_batch(batch, client_map.get(batch['service'])), targets))
 
-    async def _prepare_tasks(self, data_item: dict, client_map: Dict[str, Any]) -> list:
-        """ Creates a list of coroutines for extending data from other services asynchronously """
+        for data_item, key in await self._scheduler.run(tasks):
+            self._mark_partial(data_item, key)
+
+    async def _prepare_tasks(self, data_item: dict, client_map: Dict[str, Any], batches: dict) -> list:
+        """
+        Creates a list of coroutines for extending data from other services asynchronously
+        together with the (data item, relationship key) they are filling.
+        """
         tasks = []
 
         origin_pk = data_item.get(self._origin_lookup_field)
@@ -167,19 +313,43 @@ class DataMesh:
                 self._extend_with_local(data_item, relationship, params)
                 continue
 
+            if self._add_to_batch(batches, data_item, relationship.key, params):
+                continue
+
             params['method'] = 'get'
             client = client_map.get(params['service'])
-            tasks.append(self._extend_content(client, data_item[relationship.key], **params))
+            tasks.append((self._extend_content(client, data_item[relationship.key], **params),
+                          [(data_item, relationship.key)]))
 
         return tasks
 
     async def _extend_content(self, client: Any, placeholder: list, **request_kwargs) -> None:
         """ Performs data request and extends data with received data """
 
-        content = await client.request(**request_kwargs)
+        content = await self._scheduler.limit(request_kwargs['service'], client.request(**request_kwargs))
         if isinstance(content, tuple):  # assume that response body is the first returned value
             content = content[0]
         if isinstance(content, dict):
             placeholder.append(dict(content))
         else:
             logger.error(f'No response data for join record (request params: {request_kwargs})')
+
+    async def _async_extend_with_batch(self, batch: dict, client: Any) -> None:
+        """ Asynchronously retrieves records of the batch and scatters them into their placeholders """
+        contents = await asyncio.gather(*[
+            self._scheduler.limit(batch['service'], client.request(**request_kwargs))
+            for request_kwargs in self._get_batch_requests_kwargs(batch)
+        ])
+        records = {}
+        for content in contents:
+            records.update(self._parse_batch_content(content, batch['pk_name']))
+
+        tasks = []
+        for params, data_item, key in batch['records']:
+            if params['pk'] in records:
+                data_item[key].append(dict(records[params['pk']]))
+            else:
+                # p.e. the list response is paginated and the record is on another page
+                params['method'] = 'get'
+                tasks.append(self._extend_content(client, data_item[key], **params))
+        await asyncio.gather(*tasks)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .graph import relationship_graph
+from .models import LogicModuleModel, Relationship
+
+
+@receiver([post_save, post_delete], sender=LogicModuleModel)
+@receiver([post_save, post_delete], sender=Relationship)
+def invalidate_relationship_graph(sender, **kwargs):
+    """
+    Reload the cached DataMesh configuration after it was changed.
+    """
+    relationship_graph.invalidate()
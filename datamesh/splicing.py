@@ -0,0 +1,138 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from gateway.json_backends import get_json_backend
+
+# strings (incl. escaped quotes) and brackets, numbers and literals don't change the structure and are skipped
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]', re.DOTALL)
+_COLON = re.compile(rb'\s*:\s*')
+_SEPARATOR = re.compile(rb'[\s,]*')
+_SCALAR = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null', re.DOTALL)
+
+_OPENING = frozenset(b'{[')
+_CLOSING = frozenset(b'}]')
+_QUOTE = ord('"')
+
+
+class JSONItem(NamedTuple):
+    prefix_start: int  # end of the previous item, bytes in between (p.e. commas) are kept as they are
+    start: int
+    end: int
+    keys: Dict[str, int]  # top-level keys of the object mapped to the positions of their values
+
+
+def _decode_key(token: bytes) -> str:
+    return json.loads(token) if b'\\' in token else token[1:-1].decode('utf-8')
+
+
+def _to_bytes(data: Any) -> bytes:
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+
+def _scan_object(body: bytes, start: int, stop_at: Optional[str] = None) -> JSONItem:
+    """
+    Finds the end of the JSON object at `start` and its top-level keys. With `stop_at` the scan stops
+    after that key (the end is unknown then)
+    """
+    depth = 0
+    keys = {}
+    for match in _TOKEN.finditer(body, start):
+        token = match.group()
+        if token[0] in _OPENING:
+            depth += 1
+        elif token[0] in _CLOSING:
+            depth -= 1
+            if depth == 0:
+                return JSONItem(start, start, match.end(), keys)
+        elif depth == 1 and token[0] == _QUOTE:
+            colon = _COLON.match(body, match.end())
+            if colon:
+                key = _decode_key(token)
+                keys[key] = colon.end()
+                if key == stop_at:
+                    return JSONItem(start, start, -1, keys)
+    raise ValueError('The JSON object is incomplete.')
+
+
+class JSONItems:
+    """
+    Data items of a JSON response body (a list, a paginated list in 'results' or one object), located without
+    decoding the body. Their top-level keys are found too, so fields can be read and spliced into the items.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.items = []
+        pos = _SEPARATOR.match(body).end()
+        if body.startswith(b'{', pos):
+            results = _scan_object(body, pos, stop_at='results').keys.get('results')
+            if results is None or not body.startswith(b'[', results):
+                item = _scan_object(body, pos)
+                self.items.append(item._replace(prefix_start=0))
+                self.tail_start = item.end
+                return
+            pos = results
+        elif not body.startswith(b'[', pos):
+            raise ValueError('The body is neither a JSON object nor a list.')
+
+        prefix_start = 0
+        pos += 1
+        while True:
+            pos = _SEPARATOR.match(body, pos).end()
+            if body.startswith(b']', pos):
+                break
+            if not body.startswith(b'{', pos):
+                raise ValueError('Items of the list have to be JSON objects.')
+            item = _scan_object(body, pos)._replace(prefix_start=prefix_start)
+            self.items.append(item)
+            prefix_start = pos = item.end
+        self.tail_start = prefix_start
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def chunks(self, size: Optional[int] = None) -> Iterator[List[JSONItem]]:
+        """ Items in chunks of the given size, all of them at once without size """
+        size = size or max(len(self.items), 1)
+        for i in range(0, len(self.items), size):
+            yield self.items[i:i + size]
+
+    @property
+    def tail(self) -> bytes:
+        """ Rest of the body after the last item """
+        return self.body[self.tail_start:]
+
+    def get_value(self, item: JSONItem, key: str) -> Any:
+        """ Value of a top-level field of the item, None if it's missing """
+        pos = item.keys.get(key)
+        if pos is None:
+            return None
+        match = _SCALAR.match(self.body, pos)
+        if match:
+            return json.loads(match.group())
+        return json.loads(self.body[item.start:item.end])[key]
+
+    def splice(self, items: List[JSONItem], fields: List[Dict[str, Any]]) -> bytes:
+        """
+        Items with their preceding bytes, the fields are added to each item as serialized fragments.
+        Items that already contain one of the fields are decoded and encoded again to replace it
+        """
+        backend = get_json_backend()
+        parts = []
+        for item, item_fields in zip(items, fields):
+            parts.append(self.body[item.prefix_start:item.start])
+            if not item_fields:
+                parts.append(self.body[item.start:item.end])
+            elif any(key in item.keys for key in item_fields):
+                data = backend.loads(self.body[item.start:item.end])
+                data.update(item_fields)
+                parts.append(_to_bytes(backend.dumps(data)))
+            else:
+                fragment = _to_bytes(backend.dumps(item_fields))[1:-1]
+                parts.append(self.body[item.start:item.end - 1])
+                if item.keys:
+                    parts.append(b', ')
+                parts.append(fragment)
+                parts.append(b'}')
+        return b''.join(parts)
@@ -1,12 +1,14 @@
 import asyncio
 
 import pytest
+from django.db import connection
 from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
 
 import factories
 from datamesh.tests.fixtures import (relationship, relationship2, relationship_with_10_records,
                                      relationship_with_local, org)
-from datamesh.services import DataMesh
+from datamesh.services import DataMesh, PARTIAL_RELATIONSHIPS_KEY
 
 
 @pytest.mark.django_db()
@@ -111,6 +113,72 @@ class TestSyncDataMesh:
             assert len(nested) == 1
             assert nested[0]['uuid'] == str(join_records[i].related_record_uuid)
 
+    def test_join_data_list_loads_join_records_at_once(self, relationship_with_10_records):
+        join_records = relationship_with_10_records.joinrecords.all()
+        logic_module_model = relationship_with_10_records.origin_model
+        data = [{'uuid': str(item.record_uuid)} for item in join_records]
+
+        class ClientMock:
+            def request(self, **kwargs):
+                return {'uuid': kwargs['pk']}
+        client_map = {relationship_with_10_records.related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        with CaptureQueriesContext(connection) as context:
+            datamesh.extend_data(data, client_map)
+
+        # the relationship graph is loaded with the related models, only the join records are queried
+        assert len(context.captured_queries) == 1
+        assert all(len(item[relationship_with_10_records.key]) == 1 for item in data)
+
+    def test_relationship_graph_is_cached(self, relationship, relationship2):
+        logic_module_model = relationship.origin_model
+        DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                 model_endpoint=logic_module_model.endpoint)
+
+        with CaptureQueriesContext(connection) as context:
+            datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                                model_endpoint=logic_module_model.endpoint)
+            assert datamesh.related_logic_modules == {'products', 'documents', 'location'}
+        assert len(context.captured_queries) == 0
+
+        relationship2.delete()
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        assert datamesh.related_logic_modules == {'products', 'documents'}
+
+    def test_join_data_list_with_bulk_lookup_filter(self, relationship_with_10_records):
+        join_records = list(relationship_with_10_records.joinrecords.all())
+        related_model = relationship_with_10_records.related_model
+        related_model.bulk_lookup_filter = 'uuid__in'
+        related_model.save()
+
+        logic_module_model = relationship_with_10_records.origin_model
+        data = [{'uuid': str(item.record_uuid)} for item in join_records]
+
+        # mock client for related logic module, the last record is missing in the list response
+        requests = []
+
+        class ClientMock:
+            def request(self, **kwargs):
+                requests.append(kwargs)
+                if 'query_params' in kwargs:
+                    pks = kwargs['query_params']['uuid__in'].split(',')
+                    return [{'uuid': pk} for pk in pks[:-1]]
+                return {'uuid': kwargs['pk']}
+        client_map = {related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        datamesh.extend_data(data, client_map)
+
+        assert len(requests) == 2
+        assert 'pk' not in requests[0]
+        assert requests[1]['pk'] == str(join_records[-1].related_record_uuid)
+        for i, item in enumerate(data):
+            assert item[relationship_with_10_records.key] == [{'uuid': str(join_records[i].related_record_uuid)}]
+
     def test_relationship_with_local_lm(self, relationship_with_local, org):
         factories.JoinRecord(relationship=relationship_with_local, record_id=1,
                              related_record_uuid=org.organization_uuid,
@@ -237,6 +305,63 @@ class TestAsyncDataMesh:
             assert len(nested) == 1
             assert nested[0]['uuid'] == str(join_records[i].related_record_uuid)
 
+    def test_join_data_list_with_bulk_lookup_filter(self, relationship_with_10_records):
+        join_records = list(relationship_with_10_records.joinrecords.all())
+        related_model = relationship_with_10_records.related_model
+        related_model.bulk_lookup_filter = 'uuid__in'
+        related_model.save()
+
+        logic_module_model = relationship_with_10_records.origin_model
+        data = [{'uuid': str(item.record_uuid)} for item in join_records]
+
+        # mock client for related logic module, the last record is missing in the list response
+        requests = []
+
+        class ClientMock:
+            async def request(self, **kwargs):
+                requests.append(kwargs)
+                if 'query_params' in kwargs:
+                    pks = kwargs['query_params']['uuid__in'].split(',')
+                    return [{'uuid': pk} for pk in pks[:-1]]
+                return {'uuid': kwargs['pk']}
+        client_map = {related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        asyncio.run(datamesh.async_extend_data(data, client_map))
+
+        assert len(requests) == 2
+        assert 'pk' not in requests[0]
+        assert requests[1]['pk'] == str(join_records[-1].related_record_uuid)
+        for i, item in enumerate(data):
+            assert item[relationship_with_10_records.key] == [{'uuid': str(join_records[i].related_record_uuid)}]
+
+    def test_join_data_one_obj_deadline_exceeded(self, relationship, settings):
+        settings.DATAMESH_TIMEOUT = 0.05
+        factories.JoinRecord(relationship=relationship, record_id=1, related_record_id=2,
+                             record_uuid=None, related_record_uuid=None)
+
+        logic_module_model = relationship.origin_model
+        data = {'id': 1, 'name': 'test'}
+
+        # mock client for related logic module, which doesn't respond in time
+        class ClientMock:
+            async def request(self, **kwargs):
+                await asyncio.sleep(5)
+                return {'id': 2}
+        client_map = {relationship.related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        asyncio.run(datamesh.async_extend_data(data, client_map))
+
+        assert data == {
+            'id': 1,
+            'name': 'test',
+            relationship.key: [],
+            PARTIAL_RELATIONSHIPS_KEY: [relationship.key],
+        }
+
     def test_relationship_with_local_lm(self, relationship_with_local, org):
         factories.JoinRecord(relationship=relationship_with_local, record_id=1,
                              related_record_uuid=org.organization_uuid,
@@ -0,0 +1,78 @@
+import io
+import json
+import uuid
+
+import pytest
+from django.core.management import call_command
+
+import factories
+from datamesh.models import JoinRecord
+
+from workflow.tests.fixtures import org
+from .fixtures import relationship
+
+
+@pytest.mark.django_db()
+def test_loadrelationships(relationship, org, tmp_path):
+    document_uuids = [str(uuid.uuid4()) for _ in range(3)]
+    outdated = factories.JoinRecord(relationship=relationship, record_id=99, related_record_id=None,
+                                    related_record_uuid=uuid.uuid4(), organization=org)
+    existing = factories.JoinRecord(relationship=relationship, record_id=1, related_record_id=None,
+                                    related_record_uuid=document_uuids[0], organization=org)
+    dump = [
+        {'pk': 1, 'fields': {'organization_uuid': str(org.pk), 'document_uuids': json.dumps(document_uuids[:2])}},
+        {'pk': 2, 'fields': {'organization_uuid': str(org.pk), 'document_uuids': document_uuids[1:] * 2}},
+        {'pk': 3, 'fields': {'organization_uuid': str(uuid.uuid4()), 'document_uuids': document_uuids}},
+    ]
+    dump_file = tmp_path / 'products.json'
+    dump_file.write_text(json.dumps(dump, indent=4))
+
+    call_command('loadrelationships', file=str(dump_file), origin='products.Product', related='documents.Document',
+                 related_field='document_uuids', batch_size=2)
+
+    join_records = JoinRecord.objects.filter(relationship=relationship)
+    assert sorted((jr.record_id, str(jr.related_record_uuid)) for jr in join_records) == sorted([
+        (1, document_uuids[0]), (1, document_uuids[1]), (2, document_uuids[1]), (2, document_uuids[2]),
+    ])
+    assert join_records.filter(pk=existing.pk).exists()
+    assert not join_records.filter(pk=outdated.pk).exists()
+
+
+@pytest.mark.django_db()
+def test_loadrelationships_creates_default_models(org, tmp_path):
+    siteprofile_uuid = str(uuid.uuid4())
+    dump = [{'pk': str(uuid.uuid4()), 'fields': {'organization_uuid': str(org.pk),
+                                                 'siteprofile_uuids': json.dumps([siteprofile_uuid])}}]
+    dump_file = tmp_path / 'contacts.json'
+    dump_file.write_text(json.dumps(dump))
+
+    call_command('loadrelationships', file=str(dump_file))
+
+    join_record = JoinRecord.objects.get()
+    assert join_record.relationship.key == 'contact_siteprofile_relationship'
+    assert join_record.relationship.origin_model.endpoint == '/contact/'
+    assert join_record.relationship.related_model.lookup_field_name == 'uuid'
+    assert str(join_record.related_record_uuid) == siteprofile_uuid
+
+
+@pytest.mark.django_db()
+def test_loadrelationships_skips_invalid_pks(relationship, org, tmp_path):
+    existing = factories.JoinRecord(relationship=relationship, record_id=5, related_record_id=None,
+                                    related_record_uuid=uuid.uuid4(), organization=org)
+    document_uuid = str(uuid.uuid4())
+    dump = [
+        {'pk': 'not-a-pk', 'fields': {'organization_uuid': str(org.pk), 'document_uuids': [document_uuid]}},
+        {'pk': 1, 'fields': {'organization_uuid': str(org.pk), 'document_uuids': ['not-a-uuid']}},
+        {'pk': 2, 'fields': {'organization_uuid': str(org.pk), 'document_uuids': [document_uuid]}},
+    ]
+    dump_file = tmp_path / 'products.json'
+    dump_file.write_text(json.dumps(dump))
+    stdout = io.StringIO()
+
+    call_command('loadrelationships', file=str(dump_file), origin='products.Product', related='documents.Document',
+                 related_field='document_uuids', stdout=stdout)
+
+    assert "Record 'not-a-pk' skipped: Invalid pk 'not-a-pk'" in stdout.getvalue()
+    assert '2 record(s) with invalid pks skipped' in stdout.getvalue()
+    assert sorted(JoinRecord.objects.filter(relationship=relationship).values_list('record_id', flat=True)) == [2, 5]
+    assert JoinRecord.objects.filter(pk=existing.pk).exists()
@@ -152,3 +152,29 @@ def test_unique_together_join_record_uuid_id(relationship, org):
                 relationship=relationship,
             )
     assert JoinRecord.objects.count() == 1
+
+
+@pytest.mark.django_db()
+def test_get_join_records_index(relationship, org):
+    record_uuid = uuid.uuid4()
+    related_record_uuid = uuid.uuid4()
+    JoinRecord.objects.create(relationship=relationship, record_id=1, related_record_id=2, organization=org)
+    JoinRecord.objects.create(relationship=relationship, record_id=1, related_record_id=3, organization=org)
+    JoinRecord.objects.create(relationship=relationship, record_uuid=record_uuid,
+                              related_record_uuid=related_record_uuid, organization=org)
+    JoinRecord.objects.create(relationship=relationship, record_id=5, related_record_id=6, organization=org)
+
+    index = JoinRecord.objects.get_join_records_index([1, str(record_uuid)], [(relationship, True)])
+
+    assert sorted(index[(relationship.pk, '1')]) == ['2', '3']
+    assert index[(relationship.pk, str(record_uuid))] == [str(related_record_uuid)]
+    assert (relationship.pk, '5') not in index
+
+
+@pytest.mark.django_db()
+def test_get_join_records_index_reverse(relationship, org):
+    JoinRecord.objects.create(relationship=relationship, record_id=1, related_record_id=2, organization=org)
+
+    index = JoinRecord.objects.get_join_records_index([2], [(relationship, False)])
+
+    assert index[(relationship.pk, '2')] == ['1']
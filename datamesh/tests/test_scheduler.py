@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from datamesh.scheduler import FanOutScheduler
+
+
+def test_limit_concurrency_per_service():
+    running = {'documents': 0, 'location': 0}
+    max_running = {'documents': 0, 'location': 0}
+
+    async def request(service):
+        running[service] += 1
+        max_running[service] = max(max_running[service], running[service])
+        await asyncio.sleep(0.01)
+        running[service] -= 1
+
+    async def run():
+        scheduler = FanOutScheduler(global_limit=10, service_limit=2, timeout=5)
+        tasks = [(scheduler.limit(service, request(service)), [])
+                 for service in ['documents', 'location'] * 5]
+        return await scheduler.run(tasks)
+
+    assert asyncio.run(run()) == []
+    assert max_running == {'documents': 2, 'location': 2}
+
+
+def test_deadline_cancels_pending_tasks():
+    async def request(delay):
+        await asyncio.sleep(delay)
+
+    async def run():
+        scheduler = FanOutScheduler(global_limit=10, service_limit=10, timeout=0.05)
+        return await scheduler.run([(request(0), ['fast']), (request(5), ['slow'])])
+
+    assert asyncio.run(run()) == ['slow']
+
+
+def test_task_exception_is_raised():
+    async def request():
+        raise ValueError('Service error')
+
+    async def run():
+        scheduler = FanOutScheduler(global_limit=10, service_limit=10, timeout=5)
+        return await scheduler.run([(request(), [])])
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_partial_error_skips_task():
+    async def request(error=None):
+        await asyncio.sleep(0.01)
+        if error:
+            raise error
+
+    async def run():
+        scheduler = FanOutScheduler(global_limit=10, service_limit=10, timeout=5, partial_errors=(KeyError,))
+        return await scheduler.run([(request(KeyError('documents')), ['unavailable']), (request(), ['ok'])])
+
+    assert asyncio.run(run()) == ['unavailable']
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from datamesh.splicing import JSONItems
+
+
+def splice(body: bytes, chunk_size: int = None) -> bytes:
+    items = JSONItems(body)
+    chunks = []
+    for chunk in items.chunks(chunk_size):
+        chunks.append(items.splice(chunk, [{'documents': [{'id': items.get_value(item, 'id')}]} for item in chunk]))
+    return b''.join(chunks) + items.tail
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1, 2])
+def test_splice_list(chunk_size):
+    body = b' [{"id": 1, "nested": {"a": [1, "}]"]}, "name": "x\\"y"},\n {"id": 2}, {"id": 3, "documents": []}] '
+
+    assert json.loads(splice(body, chunk_size)) == [
+        {'id': 1, 'nested': {'a': [1, '}]']}, 'name': 'x"y', 'documents': [{'id': 1}]},
+        {'id': 2, 'documents': [{'id': 2}]},
+        {'id': 3, 'documents': [{'id': 3}]},
+    ]
+
+
+def test_splice_paginated_list():
+    body = b'{"count": 2, "next": null, "results": [{"id": 1}, {"id": 2}], "previous": null}'
+
+    assert splice(body) == (b'{"count": 2, "next": null, "results": [{"id": 1, "documents": [{"id": 1}]}, '
+                            b'{"id": 2, "documents": [{"id": 2}]}], "previous": null}')
+
+
+@pytest.mark.parametrize('body, expected', [
+    (b'{"id": 7, "results": "none"}', {'id': 7, 'results': 'none', 'documents': [{'id': 7}]}),
+    (b'{}', {'documents': [{'id': None}]}),
+    (b'[]', []),
+    (b'{"count": 0, "results": []}', {'count': 0, 'results': []}),
+])
+def test_splice_object_and_empty_list(body, expected):
+    assert json.loads(splice(body)) == expected
+
+
+@pytest.mark.parametrize('body', [b'"text"', b'IT IS A TEST', b'[1, 2]', b'[{"id": 1}', b'{"id": [1}'])
+def test_invalid_body(body):
+    with pytest.raises(ValueError):
+        JSONItems(body)
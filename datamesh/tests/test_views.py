@@ -1,3 +1,4 @@
+import json
 import uuid
 from urllib.parse import urlencode
 
@@ -6,6 +7,7 @@ from rest_framework.reverse import reverse
 
 import factories
 from datamesh import views
+from datamesh.models import JoinRecord
 from workflow.tests.fixtures import org, org_admin, org_member, TEST_USER_DATA
 from .fixtures import (
     document_logic_module,
@@ -166,6 +168,111 @@ class TestJoinRecordCreateView(TestJoinRecordBase):
         assert response.data["organization"] == str(TEST_USER_DATA["organization_uuid"])
 
 
+
+@pytest.mark.django_db()
+class TestJoinRecordBulkView(TestJoinRecordBase):
+
+    @pytest.fixture
+    def document_appointment_relationship(self, document_logic_module_model, appointment_logic_module_model):
+        return factories.Relationship(origin_model=document_logic_module_model,
+                                      related_model=appointment_logic_module_model)
+
+    def test_join_record_bulk_create(self, request_factory, org_admin, document_appointment_relationship):
+        existing = factories.JoinRecord(relationship=document_appointment_relationship, record_id=1,
+                                        related_record_id=None, related_record_uuid=uuid.uuid4(),
+                                        organization=org_admin.organization)
+        link = {"origin_model_name": "documentDocument", "related_model_name": "crmAppointment"}
+        data = [
+            {**link, "record_uuid": "322f71fe-b606-48ce-bae6-d5254479ad6f", "related_record_id": 7},
+            {**link, "record_id": 1, "related_record_uuid": str(existing.related_record_uuid)},
+            {**link, "record_id": 2},
+            {"origin_model_name": "crmAppointment", "related_model_name": "documentDocument",
+             "record_id": 2, "related_record_id": 3},
+        ]
+        request = request_factory.post("", data, format="json")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk"})(request)
+        assert response.status_code == 200
+        assert [result["status"] for result in response.data] == [201, 200, 400, 400]
+        assert response.data[1]["join_record_uuid"] == str(existing.pk)
+        join_record = JoinRecord.objects.get(pk=response.data[0]["join_record_uuid"])
+        assert str(join_record.record_uuid) == "322f71fe-b606-48ce-bae6-d5254479ad6f"
+        assert join_record.related_record_id == 7
+        assert str(join_record.organization_id) == self.session["jwt_organization_uuid"]
+
+    def test_join_record_bulk_create_ndjson(self, request_factory, org_admin, document_appointment_relationship):
+        lines = [json.dumps({"origin_model_name": "documentDocument", "related_model_name": "crmAppointment",
+                             "record_id": i, "related_record_id": i}) for i in range(5)]
+        request = request_factory.post("", "\n".join(lines + lines[:1]), content_type="application/x-ndjson")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk"})(request)
+        assert response.status_code == 200
+        assert [result["status"] for result in response.data] == [201] * 5 + [200]
+        assert JoinRecord.objects.filter(relationship=document_appointment_relationship).count() == 5
+
+    def test_join_record_bulk_delete(self, request_factory, org_admin, document_appointment_relationship):
+        join_records = factories.JoinRecord.create_batch(
+            size=2, relationship=document_appointment_relationship, organization=org_admin.organization)
+        other_organization_join_record = factories.JoinRecord(relationship=document_appointment_relationship)
+        data = [{"origin_model_name": "documentDocument", "related_model_name": "crmAppointment",
+                 "record_id": join_record.record_id, "related_record_uuid": str(join_record.related_record_uuid)}
+                for join_record in join_records + [other_organization_join_record]]
+        request = request_factory.post("", data, format="json")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk_delete"})(request)
+        assert response.status_code == 200
+        assert [result["status"] for result in response.data] == [204, 204, 404]
+        assert list(JoinRecord.objects.all()) == [other_organization_join_record]
+
+    def test_join_record_bulk_delete_keeps_other_related_records(self, request_factory, org_admin,
+                                                                 document_appointment_relationship):
+        join_records = factories.JoinRecord.create_batch(
+            size=2, relationship=document_appointment_relationship, organization=org_admin.organization,
+            record_id=1)
+        data = [{"origin_model_name": "documentDocument", "related_model_name": "crmAppointment",
+                 "record_id": 1, "related_record_uuid": str(join_records[0].related_record_uuid)}]
+        request = request_factory.post("", data, format="json")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk_delete"})(request)
+        assert [result["status"] for result in response.data] == [204]
+        assert list(JoinRecord.objects.all()) == [join_records[1]]
+
+    def test_join_record_bulk_create_concurrent_insert(self, request_factory, org_admin, monkeypatch,
+                                                       document_appointment_relationship):
+        stored = factories.JoinRecord(relationship=document_appointment_relationship, record_id=1,
+                                      related_record_id=2, related_record_uuid=None,
+                                      organization=org_admin.organization)
+        get_join_records = views.JoinRecordViewSet._get_join_records
+        lookups = []
+
+        def get_join_records_after_concurrent_insert(queryset, keys):
+            # the first lookup happens before the concurrent request inserted the JoinRecord
+            lookups.append(keys)
+            return {} if len(lookups) == 1 else get_join_records(queryset, keys)
+
+        monkeypatch.setattr(views.JoinRecordViewSet, "_get_join_records",
+                            staticmethod(get_join_records_after_concurrent_insert))
+        data = [{"origin_model_name": "documentDocument", "related_model_name": "crmAppointment",
+                 "record_id": 1, "related_record_id": 2}]
+        request = request_factory.post("", data, format="json")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk"})(request)
+        assert response.data == [{"index": 0, "status": 200, "join_record_uuid": str(stored.pk)}]
+        assert JoinRecord.objects.count() == 1
+
+    @pytest.mark.parametrize("data", [{}, 7, "text", None])
+    def test_join_record_bulk_create_invalid_payload(self, request_factory, org_admin, data):
+        request = request_factory.post("", json.dumps(data), content_type="application/json")
+        request.user = org_admin
+        request.session = self.session
+        response = views.JoinRecordViewSet.as_view({"post": "bulk"})(request)
+        assert response.status_code == 400
+
 @pytest.mark.django_db()
 def test_join_record_detail_view(request_factory, join_record, org_admin):
     request = request_factory.get("")
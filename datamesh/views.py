@@ -1,12 +1,29 @@
+from collections import defaultdict
+from collections.abc import Iterator
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
 
 from .filters import JoinRecordFilter
 from .mixins import OrganizationQuerySetMixin
 from .models import JoinRecord, LogicModuleModel, Relationship
-from .serializers import JoinRecordSerializer, LogicModuleModelSerializer, RelationshipSerializer
+from .parsers import NDJSONParser
+from .serializers import (JoinRecordBulkSerializer, JoinRecordSerializer, LogicModuleModelSerializer,
+                          RelationshipSerializer)
 from workflow.permissions import IsSuperUserOrReadOnly
 
+# relationship pk, record_id, record_uuid, related_record_id, related_record_uuid
+JoinRecordKey = Tuple
+KEY_FIELDS = ('relationship_id', 'record_id', 'record_uuid', 'related_record_id', 'related_record_uuid')
+
 
 class LogicModuleModelViewSet(viewsets.ModelViewSet):
     queryset = LogicModuleModel.objects.all()
@@ -32,3 +49,136 @@ class JoinRecordViewSet(OrganizationQuerySetMixin,
                      'record_uuid',
                      'related_record_id',
                      'related_record_uuid',)
+
+    @action(methods=['POST'], detail=False, parser_classes=(JSONParser, NDJSONParser))
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create many JoinRecords at once. It's expected a list of JoinRecords with the same fields like for
+        creating one, or one JoinRecord per line with the content type application/x-ndjson. The relationships
+        of the models have to exist. Each item gets a result with its status, already existing JoinRecords
+        are returned with status 200, for example:
+        [
+            {'index': 0, 'status': 201, 'join_record_uuid': '...'},
+            {'index': 1, 'status': 400, 'errors': {...}}
+        ]
+        """
+        return self._bulk_write(request, self._bulk_create)
+
+    @action(methods=['POST'], detail=False, url_path='bulk/delete', parser_classes=(JSONParser, NDJSONParser))
+    def bulk_delete(self, request, *args, **kwargs):
+        """
+        Delete many JoinRecords at once. It's expected the same payload like for bulk creating JoinRecords,
+        each item gets a result with status 204 if it was deleted or 404 if it wasn't found.
+        """
+        return self._bulk_write(request, self._bulk_delete)
+
+    def _bulk_write(self, request, write: Callable[[List[Tuple[dict, JoinRecordKey]], Optional[str]], None]):
+        """ Validate the items, resolve their relationships with one query and write them in batches """
+        data = request.data
+        # JSON payloads are parsed into a list, NDJSON payloads into an iterator
+        if not isinstance(data, (list, Iterator)):
+            return Response({'detail': 'Expected a list of JoinRecords.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        organization_uuid = request.session.get('jwt_organization_uuid', None)
+        model_pks = {f'{endpoint_name}{model}': pk for endpoint_name, model, pk in
+                     LogicModuleModel.objects.values_list('logic_module_endpoint_name', 'model', 'pk')}
+        relationship_pks = {(origin_pk, related_pk): pk for pk, origin_pk, related_pk in
+                            Relationship.objects.values_list('pk', 'origin_model_id', 'related_model_id')}
+
+        results = []
+        batch = []
+        try:
+            for index, item in enumerate(data):
+                result = {'index': index}
+                results.append(result)
+                serializer = JoinRecordBulkSerializer(data=item)
+                if not serializer.is_valid():
+                    result.update(status=status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+                    continue
+                fields = serializer.validated_data
+                relationship_pk = relationship_pks.get((model_pks.get(fields['origin_model_name']),
+                                                        model_pks.get(fields['related_model_name'])))
+                if relationship_pk is None:
+                    result.update(status=status.HTTP_400_BAD_REQUEST, errors={'non_field_errors': [
+                        f'No relationship from {fields["origin_model_name"]} to {fields["related_model_name"]}.']})
+                    continue
+                key = (relationship_pk,) + tuple(fields.get(field) for field in KEY_FIELDS[1:])
+                batch.append((result, key))
+                if len(batch) >= settings.DATAMESH_BULK_WRITE_BATCH_SIZE:
+                    write(batch, organization_uuid)
+                    batch = []
+        except ParseError as e:
+            # items before the malformed line are processed anyway
+            results.append({'index': len(results), 'status': status.HTTP_400_BAD_REQUEST, 'errors': e.detail})
+        if batch:
+            write(batch, organization_uuid)
+        return Response(results)
+
+    @staticmethod
+    def _get_join_records(queryset: QuerySet, keys: List[JoinRecordKey]) -> Dict[JoinRecordKey, Tuple]:
+        """ Get pk and organization of the JoinRecords of the keys with one query """
+        lookups = defaultdict(set)
+        for relationship_pk, record_id, record_uuid, *_ in keys:
+            if record_id is not None:
+                lookups[(relationship_pk, 'record_id__in')].add(record_id)
+            else:
+                lookups[(relationship_pk, 'record_uuid__in')].add(record_uuid)
+        query = Q()
+        for (relationship_pk, lookup), values in lookups.items():
+            query |= Q(relationship_id=relationship_pk, **{lookup: values})
+
+        rows = queryset.filter(query).values_list('pk', 'organization_id', *KEY_FIELDS)
+        return {tuple(key): (pk, organization_id) for pk, organization_id, *key in rows}
+
+    @staticmethod
+    def _set_existing_result(result: dict, join_record: Optional[Tuple], organization_uuid: Optional[str]) -> None:
+        """ Result of an item whose JoinRecord already exists, the stored pk is reported """
+        # results of new JoinRecords which turned out to exist are reset
+        index = result['index']
+        result.clear()
+        result['index'] = index
+        if join_record is None:
+            result.update(status=status.HTTP_409_CONFLICT,
+                          errors={'non_field_errors': ['JoinRecord was deleted concurrently.']})
+        elif str(join_record[1]) != str(organization_uuid):
+            result.update(status=status.HTTP_409_CONFLICT,
+                          errors={'non_field_errors': ['JoinRecord exists in another organization.']})
+        else:
+            result.update(status=status.HTTP_200_OK, join_record_uuid=str(join_record[0]))
+
+    def _bulk_create(self, batch: List[Tuple[dict, JoinRecordKey]], organization_uuid: Optional[str]) -> None:
+        # JoinRecords are unique regardless of their organization
+        existing = self._get_join_records(JoinRecord.objects.all(), [key for _, key in batch])
+        join_records = {}
+        for result, key in batch:
+            if key in join_records:
+                # duplicate in the payload
+                result.update(status=status.HTTP_200_OK, join_record_uuid=str(join_records[key].pk))
+            elif key in existing:
+                self._set_existing_result(result, existing[key], organization_uuid)
+            else:
+                join_records[key] = JoinRecord(organization_id=organization_uuid, **dict(zip(KEY_FIELDS, key)))
+                result.update(status=status.HTTP_201_CREATED, join_record_uuid=str(join_records[key].pk))
+        if not join_records:
+            return
+        with transaction.atomic():
+            JoinRecord.objects.bulk_create(join_records.values(), ignore_conflicts=True)
+
+        # conflicting JoinRecords inserted by concurrent requests were kept, their pks are reported instead
+        stored = self._get_join_records(JoinRecord.objects.all(), list(join_records))
+        for result, key in batch:
+            if key in join_records and str(stored.get(key, (None,))[0]) != str(join_records[key].pk):
+                self._set_existing_result(result, stored.get(key), organization_uuid)
+
+    def _bulk_delete(self, batch: List[Tuple[dict, JoinRecordKey]], organization_uuid: Optional[str]) -> None:
+        # the query returns all JoinRecords of the origin records, only the ones of the batch's keys are deleted
+        existing = self._get_join_records(self.get_queryset(), [key for _, key in batch])
+        pks = set()
+        for result, key in batch:
+            if key in existing:
+                pks.add(existing[key][0])
+                result.update(status=status.HTTP_204_NO_CONTENT, join_record_uuid=str(existing[key][0]))
+            else:
+                result.update(status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            JoinRecord.objects.filter(pk__in=pks).delete()
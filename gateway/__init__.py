@@ -5,6 +5,8 @@ from __future__ import absolute_import, unicode_literals
 from .celery import app as celery_app
 
 __all__ = ['celery_app']
+
+default_app_config = 'gateway.apps.GatewayConfig'
 API_GATEWAY_RESERVED_NAMES = [
     'admin',
     'oauth',
@@ -1,65 +1,91 @@
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
 
-from . import utils
+import requests
+
+from .sessions import session_pool
 
 logger = logging.getLogger(__name__)
 
+DEFINITIONS_REF = '#/definitions/'
+
+
+def rewrite_refs(node: Any, api_name: str) -> Any:
+    """
+    Return a copy of the specification with references to its definitions renamed like the definitions
+    in the aggregated specification, other values (p.e. descriptions) are kept as they are.
+    """
+    if isinstance(node, dict):
+        result = {}
+        for key, value in node.items():
+            if key == '$ref' and isinstance(value, str) and value.startswith(DEFINITIONS_REF):
+                result[key] = f'{DEFINITIONS_REF}{api_name}{value[len(DEFINITIONS_REF):]}'
+            else:
+                result[key] = rewrite_refs(value, api_name)
+        return result
+    if isinstance(node, list):
+        return [rewrite_refs(item, api_name) for item in node]
+    return node
+
 
 class SwaggerAggregator(object):
     """
     Create an API from an aggregation of APIs
     """
 
-    def __init__(self, configuration: dict):
+    def __init__(self, configuration: dict, timeout: Optional[float] = None, max_workers: int = 10):
         self.configuration = configuration
-
-    def get_aggregate_swagger(self) -> dict:
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def fetch_spec(self, api_url: str) -> Optional[dict]:
+        """ Get the swagger spec of a service, None if it can't be retrieved within the timeout """
+        try:
+            response = session_pool.get_session(api_url).get(api_url, timeout=self.timeout)
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f'Cannot get swagger from {api_url}: {e}')
+        except ValueError:
+            logger.warning(f'Cannot parse swagger from {api_url}')
+        return None
+
+    def get_aggregate_swagger(self, apis: Optional[Dict[str, str]] = None) -> dict:
         """
-        Get swagger files associated with the aggregates.
+        Get swagger files associated with the aggregates (or only the given ones), they are fetched concurrently.
 
         :return: a dict of swagger spec
         """
-        swagger_apis = {}
-        if 'apis' in self.configuration:  # Check if apis is in the config file
-            for api_name, api_url in self.configuration['apis'].items():
-                if api_name not in swagger_apis:
-                    # Get the swagger.json
-                    try:
-                        swagger_apis[api_name] = {
-                            'spec': utils.get_swagger_from_url(api_url),
-                            'url': api_url
-                        }
-                    except ConnectionError:
-                        logger.warning(
-                            'Cannot get swagger from {}'.format(api_url))
-                    except ValueError:
-                        logger.info(
-                            'Cannot remove {} from errors'.format(api_url))
-        return swagger_apis
-
-    def _update_specification(self, name: str, api_name: str,
-                              api_spec: dict) -> dict:
+        if apis is None:
+            apis = self.configuration.get('apis', {})
+        if not apis:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(apis), self.max_workers)) as executor:
+            specs = executor.map(self.fetch_spec, apis.values())
+        return {api_name: {'spec': spec, 'url': apis[api_name]}
+                for api_name, spec in zip(apis, specs) if spec is not None}
+
+    def build_fragment(self, api_name: str, spec: dict) -> dict:
         """
-        Update names of the specification of a service's API
+        Definitions and paths of a service's API renamed to avoid collisions with other services
 
-        :param name: of the specification that should be updated
         :param api_name: name of the service
-        :param api_spec: specification of the service's API
-        :return: a dict with the updated specification
+        :param spec: specification of the service's API
+        :return: a dict with the renamed definitions and paths
         """
-        result = {}
-        if name in api_spec['spec']:
-            specification = api_spec['spec'][name]
-            for spec_name, spec_def in specification.items():
-                spec_name = '{}{}'.format(api_name, spec_name)
-                result[spec_name] = spec_def
-
-        return result
+        spec = rewrite_refs(spec, api_name)
+        path_prefix = '' if api_name == 'bifrost' else f'/{api_name}'
+        fragment = {
+            'definitions': {f'{api_name}{name}': definition
+                            for name, definition in (spec.get('definitions') or {}).items()},
+            'paths': {f'{path_prefix}{path}': path_spec for path, path_spec in (spec.get('paths') or {}).items()},
+        }
+        self.generate_operation_id(fragment)
+        return fragment
 
-    def merge_aggregates(self) -> dict:
+    def merge_fragments(self, fragments: Iterable[dict]) -> dict:
         """
-        Merge aggregates
+        Merge fragments of the services
 
         :return: aggregate of all apis
         """
@@ -73,28 +99,20 @@ class SwaggerAggregator(object):
             'definitions': {},
             'paths': {}
         }
+        for fragment in fragments:
+            basic_swagger['definitions'].update(fragment['definitions'])
+            basic_swagger['paths'].update(fragment['paths'])
+        return basic_swagger
 
-        swagger_apis = self.get_aggregate_swagger()
-        for api, api_spec in swagger_apis.items():
-            # Rename definition to avoid collision.
-            api_spec['spec'] = json.loads(json.dumps(api_spec['spec']).replace(
-                '#/definitions/', u'#/definitions/{}'.format(api)))
-
-            # update the definitions
-            if 'definitions' in api_spec['spec']:
-                basic_swagger['definitions'].update(self._update_specification(
-                    'definitions', api, api_spec))
-
-            # update the paths to match with the gateway
-            if 'paths' in api_spec['spec']:
-                if api == 'bifrost':
-                    basic_swagger['paths'].update(api_spec['spec']['paths'])
-                else:
-                    api_name = '/{}'.format(api)
-                    basic_swagger['paths'].update(self._update_specification(
-                        'paths', api_name, api_spec))
+    def merge_aggregates(self) -> dict:
+        """
+        Merge aggregates
 
-        return basic_swagger
+        :return: aggregate of all apis
+        """
+        swagger_apis = self.get_aggregate_swagger()
+        return self.merge_fragments(self.build_fragment(api, api_spec['spec'])
+                                    for api, api_spec in swagger_apis.items())
 
     def generate_operation_id(self, swagger):
         """
@@ -117,7 +135,4 @@ class SwaggerAggregator(object):
 
         :return: a dict with all the apis swagger aggregated
         """
-        merged_apis = self.merge_aggregates()
-        self.generate_operation_id(merged_apis)
-
-        return merged_apis
+        return self.merge_aggregates()
@@ -0,0 +1,399 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+from urllib.error import URLError
+from urllib.parse import urlencode
+
+import aiohttp
+from bravado_core.spec import Spec
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import get_authorization_header
+from rest_framework.request import Request
+
+from . import exceptions
+from .aggregator import SwaggerAggregator
+from . import utils
+from .routing import get_operation_router
+from .sessions import session_pool
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TIMEOUT = object()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache. Entries expire after `ttl` seconds (unless another timeout is given on
+    setting them) and the least recently used entry is evicted once `maxsize` is reached.
+    Hits and misses are counted for monitoring.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get_with_age(key, count=False) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.get_with_age(key)
+        return default if item is None else item[0]
+
+    def get_with_age(self, key: Hashable, count: bool = True) -> Optional[Tuple[Any, float]]:
+        """ Return a tuple of the cached value and its age in seconds or None if there is no valid entry """
+        with self._lock:
+            try:
+                value, stored_at, timeout = self._data[key]
+            except KeyError:
+                if count:
+                    self.misses += 1
+                return None
+            age = time.monotonic() - stored_at
+            if timeout is not None and age > timeout:
+                del self._data[key]
+                if count:
+                    self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return value, age
+
+    def set(self, key: Hashable, value: Any, timeout: Optional[float] = DEFAULT_TIMEOUT) -> None:
+        """ Same like in Django's cache API timeout None means that the entry never expires """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic(), timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+class SwaggerSpecCache:
+    """
+    Process-wide registry of parsed Swagger specs of the logic modules.
+    Specs are kept for `ttl` seconds or until the edit date of their logic module changes, p.e. when it's updated by
+    the `update_module` task in another process. Once a spec is older than `refresh_after` seconds it's still served,
+    but reloaded in a background thread, so requests don't wait for the service's schema.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, refresh_after: float):
+        self.refresh_after = refresh_after
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(logic_module) -> str:
+        return str(logic_module.module_uuid)
+
+    def _lookup(self, logic_module, schema_url: str, config: dict) -> Optional[Spec]:
+        """ Return a valid cached spec and schedule its refresh if needed """
+        key = self._key(logic_module)
+        item = self._cache.get_with_age(key)
+        if item is None:
+            return None
+        (cached_url, edit_date, spec), age = item
+        if cached_url != schema_url or edit_date != logic_module.edit_date:
+            # logic module changed (p.e. its endpoint), cached spec belongs to the old one
+            self._cache.delete(key)
+            return None
+        if age > self.refresh_after:
+            self._schedule_refresh(key, logic_module.edit_date, schema_url, config)
+        return spec
+
+    def _schedule_refresh(self, key: str, edit_date: Optional[datetime], schema_url: str, config: dict) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        thread = threading.Thread(target=self._refresh, args=(key, edit_date, schema_url, config), daemon=True)
+        thread.start()
+
+    def _refresh(self, key: str, edit_date: Optional[datetime], schema_url: str, config: dict) -> None:
+        try:
+            self._cache.set(key, (schema_url, edit_date, self.load(schema_url, config)))
+        except Exception as e:
+            logger.warning(f'Failed to refresh swagger spec from {schema_url}: {e}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    @staticmethod
+    def compile(spec: Spec) -> Spec:
+        """ Build the operation router while loading the spec, so requests only look up their operations """
+        get_operation_router(spec)
+        return spec
+
+    @staticmethod
+    def load(schema_url: str, config: dict) -> Spec:
+        """ Fetch and parse swagger spec synchronously """
+        try:
+            response = session_pool.get_session(schema_url).get(schema_url, timeout=session_pool.timeout)
+            spec_dict = response.json()
+        except URLError:
+            raise URLError(f'Make sure that {schema_url} is accessible.')
+        return SwaggerSpecCache.compile(Spec.from_dict(spec_dict, config=config))
+
+    @staticmethod
+    async def async_load(schema_url: str, config: dict) -> Spec:
+        """ Fetch and parse swagger spec asynchronously """
+        session = session_pool.get_async_session(schema_url)
+        async with session.get(schema_url) as response:
+            try:
+                spec_dict = await response.json()
+            except aiohttp.ContentTypeError:
+                raise exceptions.GatewayError(
+                    f'Failed to parse swagger schema from {schema_url}. Should be JSON.'
+                )
+        return SwaggerSpecCache.compile(Spec.from_dict(spec_dict, config=config))
+
+    def get(self, logic_module, config: dict) -> Spec:
+        schema_url = utils.get_swagger_url_by_logic_module(logic_module)
+        spec = self._lookup(logic_module, schema_url, config)
+        if spec is None:
+            spec = self.load(schema_url, config)
+            self._cache.set(self._key(logic_module), (schema_url, logic_module.edit_date, spec))
+        return spec
+
+    async def async_get(self, logic_module, config: dict) -> Spec:
+        schema_url = utils.get_swagger_url_by_logic_module(logic_module)
+        spec = self._lookup(logic_module, schema_url, config)
+        if spec is None:
+            spec = await self.async_load(schema_url, config)
+            self._cache.set(self._key(logic_module), (schema_url, logic_module.edit_date, spec))
+        return spec
+
+    def invalidate(self, logic_module) -> None:
+        self._cache.delete(self._key(logic_module))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats['refresh_after'] = self.refresh_after
+        return stats
+
+
+class CachedResponse:
+    """
+    Response of a service in the shared cache. It's fresh for the cache timeout of its model, after that a response
+    with an ETag is revalidated by the service with a conditional request instead of being requested again
+    """
+
+    def __init__(self, content: Any, status: int, headers: dict, etag: Optional[str], timeout: float):
+        self.content = content
+        self.status = status
+        self.headers = headers
+        self.etag = etag
+        self.refresh(timeout)
+
+    @property
+    def data(self) -> Tuple[Any, int, dict]:
+        return self.content, self.status, self.headers
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def refresh(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.expires_at = time.time() + timeout
+
+
+class ResponseCache:
+    """
+    Cache of the services' responses shared between requests, and between processes if a Django cache backend
+    is configured. Keys are scoped by the organization of the requesting user.
+    Cached responses of a record are invalidated by changing the version of the record (and of its model's lists),
+    which is done when it's changed through the gateway.
+    """
+
+    def __init__(self, backend: Optional[str] = None, maxsize: int = 1024, revalidate_timeout: float = 3600):
+        self.hits = 0
+        self.misses = 0
+        self.revalidate_timeout = revalidate_timeout
+        self._backend_alias = backend
+        self._local = TTLCache(maxsize=maxsize)
+
+    @property
+    def backend(self):
+        """ Django cache backend or local memory cache, both support get, set and delete """
+        if self._backend_alias:
+            return caches[self._backend_alias]
+        return self._local
+
+    @staticmethod
+    def get_scope(request: Request) -> str:
+        """ Responses differ per organization, fall back to the credentials if there is no organization """
+        session = getattr(request, 'session', None) or {}
+        organization_uuid = session.get('jwt_organization_uuid') or getattr(request.user, 'organization_id', None)
+        if organization_uuid:
+            return f'org:{organization_uuid}'
+        return f'auth:{hashlib.sha256(get_authorization_header(request)).hexdigest()}'
+
+    def _get_version(self, *parts: str) -> str:
+        """ Versions are random, so a lost version never makes outdated responses valid again """
+        key = 'gateway:version:' + ':'.join(parts)
+        version = self.backend.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            self.backend.set(key, version, None)
+        return version
+
+    def make_key(self, request: Request, service: str, model: str, pk: Any = None, query_params: dict = None) -> str:
+        model = model.lower()
+        if pk is None:
+            version = self._get_version(service, model)
+            params = urlencode(sorted((query_params or {}).items()))
+            resource = f'{model}:{version}:{hashlib.md5(params.encode()).hexdigest()}'
+        else:
+            version = self._get_version(service, model, str(pk))
+            resource = f'{model}:{pk}:{version}'
+        return f'gateway:response:{self.get_scope(request)}:{service}:{resource}'
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """ Get cached response, it can be stale and has to be revalidated then """
+        response = self.backend.get(key)
+        if response is not None and response.is_fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return response
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        """ Responses with an ETag are kept after they become stale to be revalidated """
+        timeout = response.timeout
+        if response.etag:
+            timeout += self.revalidate_timeout
+        self.backend.set(key, response, timeout)
+
+    def invalidate(self, service: str, model: str, pk: Any = None) -> None:
+        """ Invalidate cached lists of the model and, if pk is given, the cached record """
+        model = model.lower()
+        self.backend.delete(f'gateway:version:{service}:{model}')
+        if pk is not None:
+            self.backend.delete(f'gateway:version:{service}:{model}:{pk}')
+
+    def clear(self) -> None:
+        self._local.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'backend': self._backend_alias or 'local',
+            'revalidate_timeout': self.revalidate_timeout,
+        }
+
+
+class SwaggerDocsCache:
+    """
+    Aggregated Swagger document of the services. Their specs are fetched concurrently and the renamed definitions
+    and paths of each service are cached separately for `ttl` seconds, so after a logic module is changed only
+    its spec is fetched again. Services which couldn't be reached are retried after `retry_after` seconds.
+    """
+
+    def __init__(self, ttl: float, retry_after: float, timeout: float, max_workers: int):
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._fragments = TTLCache(maxsize=1024, ttl=ttl)
+        self._version = 0
+        self._document = None
+        self._lock = threading.Lock()
+
+    def _get_fragment(self, api_name: str, api_url: str) -> Tuple[bool, Optional[dict]]:
+        """ Return if a valid entry was found and the fragment of the service, which is None if it failed """
+        item = self._fragments.get(api_name)
+        if item is None or item[0] != api_url:
+            return False, None
+        return True, item[1]
+
+    def get(self, configuration: dict) -> dict:
+        apis = configuration.get('apis', {})
+        aggregator = SwaggerAggregator(configuration, timeout=self.timeout, max_workers=self.max_workers)
+        with self._lock:
+            missing = {api_name: api_url for api_name, api_url in apis.items()
+                       if not self._get_fragment(api_name, api_url)[0]}
+            if missing:
+                fetched = aggregator.get_aggregate_swagger(missing)
+                for api_name, api_url in missing.items():
+                    if api_name in fetched:
+                        fragment = aggregator.build_fragment(api_name, fetched[api_name]['spec'])
+                        self._fragments.set(api_name, (api_url, fragment))
+                    else:
+                        self._fragments.set(api_name, (api_url, None), self.retry_after)
+                self._version += 1
+
+            key = (self._version, tuple(sorted(apis.items())))
+            if self._document is None or self._document[0] != key:
+                fragments = [self._get_fragment(api_name, apis[api_name])[1] for api_name in sorted(apis)]
+                self._document = (key, aggregator.merge_fragments(fragment for fragment in fragments if fragment))
+            return self._document[1]
+
+    def invalidate(self, api_name: str) -> None:
+        with self._lock:
+            self._fragments.delete(api_name)
+            self._version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self._document = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._fragments.stats()
+        stats['retry_after'] = self.retry_after
+        return stats
+
+
+spec_cache = SwaggerSpecCache(maxsize=settings.GATEWAY_SPEC_CACHE_MAXSIZE,
+                              ttl=settings.GATEWAY_SPEC_CACHE_TTL,
+                              refresh_after=settings.GATEWAY_SPEC_CACHE_REFRESH_AFTER)
+
+response_cache = ResponseCache(backend=settings.GATEWAY_RESPONSE_CACHE_BACKEND,
+                               maxsize=settings.GATEWAY_RESPONSE_CACHE_MAXSIZE,
+                               revalidate_timeout=settings.GATEWAY_RESPONSE_CACHE_REVALIDATE_TIMEOUT)
+
+docs_cache = SwaggerDocsCache(ttl=settings.GATEWAY_DOCS_CACHE_TTL,
+                              retry_after=settings.GATEWAY_DOCS_RETRY_AFTER,
+                              timeout=settings.GATEWAY_DOCS_FETCH_TIMEOUT,
+                              max_workers=settings.GATEWAY_DOCS_FETCH_WORKERS)
@@ -1,20 +1,62 @@
+import asyncio
 import logging
-import json
-from typing import Any, Dict, Tuple
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlencode
 
 import requests
-import aiohttp
-from django.http.request import QueryDict
+from django.conf import settings
+from django.http.request import HttpRequest, QueryDict
 from bravado_core.spec import Spec
 from rest_framework.request import Request
 from rest_framework.authentication import get_authorization_header
 
 from . import exceptions
-from . import utils
+from . import tracing
+from .cache import CachedResponse, response_cache
+from .health import circuit_breakers
+from .json_backends import get_json_backend
+from .routing import get_operation_router
+from .sessions import session_pool
 
 logger = logging.getLogger(__name__)
 
 
+class StreamedContent:
+    """
+    Body of the service's response which is read from the socket chunk by chunk while it's sent to the client.
+    Closing it releases the connection, Django closes it after the streaming response is sent.
+    """
+
+    def __init__(self, response: requests.Response, chunk_size: int):
+        self._response = response
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self._response.iter_content(self.chunk_size)
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class UploadStream:
+    """
+    File-like view of the incoming request body, which is read from the client's socket while it's sent to the
+    service, so uploads aren't spooled by Django first. Reading blocks until the client sends more data and
+    the client isn't read faster than the service accepts the data (back-pressure).
+    """
+
+    def __init__(self, request: HttpRequest):
+        self._request = request
+        self._length = int(request.META['CONTENT_LENGTH'])
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        return self._request.read(size)
+
+
 class BaseSwaggerClient:
     """ Base for client class that is responsible for retrieving data from the service with Swagger spec"""
 
@@ -30,33 +72,83 @@ class BaseSwaggerClient:
         """ Checks if request is valid for caching operations """
         return self._in_request.method.lower() == 'get' and not self._in_request.query_params
 
+    @staticmethod
+    def get_cache_key(url: str, query_params: dict = None) -> str:
+        """ Cache key of the outgoing request, query params are passed p.e. by DataMesh list requests """
+        if not query_params:
+            return url
+        return f'{url}?{urlencode(sorted(query_params.items()))}'
+
+    def get_shared_cache_key(self, method: str, **kwargs) -> Optional[str]:
+        """
+        Key of the response in the cache shared between requests. Only responses of GET requests with
+        `cache_timeout` (p.e. related records requested by DataMesh) are cached there
+        """
+        if method != 'get' or not kwargs.get('cache_timeout'):
+            return None
+        return response_cache.make_key(self._in_request, kwargs['service'], kwargs['model'],
+                                       kwargs.get('pk'), kwargs.get('query_params'))
+
+    def get_shared_response(self, key: Optional[str], headers: dict) -> Optional[CachedResponse]:
+        """ Get response from the shared cache, adds the validator to headers if a stale one can be revalidated """
+        cached_response = response_cache.get(key) if key else None
+        if cached_response is not None and not cached_response.is_fresh:
+            if not cached_response.etag:
+                return None
+            headers['If-None-Match'] = cached_response.etag
+        return cached_response
+
+    @staticmethod
+    def set_shared_response(key: Optional[str], content: Any, status: int, headers: Any, timeout: int) -> None:
+        if key and status == 200:
+            response_cache.set(key, CachedResponse(content, status, dict(headers), headers.get('ETag'), timeout))
+
+    @staticmethod
+    def revalidate_shared_response(key: str, cached_response: CachedResponse, timeout: int) -> Tuple[Any, int, dict]:
+        """ Service confirmed (with 304 Not Modified) that the cached response is still valid """
+        cached_response.refresh(timeout)
+        response_cache.set(key, cached_response)
+        return cached_response.data
+
+    @staticmethod
+    def is_streamable(status: int, headers: Any) -> bool:
+        """ Successful responses are streamed if they are big or of unknown size (p.e. file downloads and exports) """
+        content_length = headers.get('Content-Length')
+        return 200 <= status < 300 and (content_length is None
+                                        or int(content_length) > settings.GATEWAY_STREAMING_MIN_SIZE)
+
+    @staticmethod
+    def decode_content(body: bytes) -> Any:
+        """ Decoded JSON body of the service's response, other bodies are returned as they are """
+        try:
+            return get_json_backend().loads(body)
+        except ValueError:
+            return body
+
+    @staticmethod
+    def reject_request(service: str, cached_response: Optional[CachedResponse]) -> Tuple[Any, int, dict]:
+        """ Circuit of the service is open, a stale cached response is served if there is one """
+        if cached_response is None:
+            raise exceptions.ServiceUnavailable(f'Service "{service}" is unavailable, try again later.')
+        logger.warning(f'Service "{service}" is unavailable, serving a stale cached response')
+        return cached_response.data
+
     def prepare_data(self, spec: Spec, **kwargs) -> Tuple[str, str]:
-        """ Parse request URL, validates operation, and returns method and URL for outgoing request"""
-
-        # Parse URL kwargs
-        pk = kwargs.get('pk')
-        model = kwargs.get('model', '').lower()
-        path_kwargs = {}
-        if kwargs.get('pk') is None:
-            path = f'/{model}/'
-        else:
-            pk_name = 'uuid' if utils.valid_uuid4(pk) else 'id'
-            path_kwargs = {pk_name: pk}
-            path = f'/{model}/{{{pk_name}}}/'
-
-        # Check that operation is valid according to spec
-        operation = spec.get_op_for_request(self._in_request.method, path)
-        if not operation:
-            raise exceptions.EndpointNotFound(f'Endpoint not found: {self._in_request.method} {path}')
-        method = operation.http_method.lower()
-        path_name = operation.path_name
-
-        # Build URL for the operation to request data from the service
-        url = spec.api_url.rstrip('/') + path_name
-        for k, v in path_kwargs.items():
-            url = url.replace(f'{{{k}}}', v)
-
-        return method, url
+        """ Validates operation according to spec, and returns method and URL for outgoing request"""
+        return get_operation_router(spec).route(self._in_request.method, kwargs.get('model', ''), kwargs.get('pk'))
+
+    def get_upload_stream(self) -> Optional[UploadStream]:
+        """
+        Multipart uploads of known size are streamed to the service, unless the body was already read
+        (p.e. for CSRF validation of session authentication) or parsed
+        """
+        request = self._in_request
+        if (request.method in ('POST', 'PUT', 'PATCH')
+                and request.content_type.startswith('multipart/form-data')
+                and request.META.get('CONTENT_LENGTH')
+                and not getattr(request._request, '_read_started', True)):
+            return UploadStream(request._request)
+        return None
 
     def get_request_data(self) -> dict:
         """
@@ -65,7 +157,7 @@ class BaseSwaggerClient:
         query parameters if passed to swagger request.
         """
         if self._in_request.content_type == 'application/json':
-            return json.dumps(self._in_request.data)
+            return get_json_backend().dumps(self._in_request.data)
 
         method = self._in_request.META['REQUEST_METHOD'].lower()
         data = self._in_request.query_params.dict()
@@ -96,6 +188,9 @@ class BaseSwaggerClient:
         headers = {
             'Authorization': get_authorization_header(self._in_request).decode('utf-8'),
         }
+        trace = tracing.get_current_trace()
+        if trace is not None:
+            headers[settings.GATEWAY_TRACE_HEADER] = trace.trace_id
         if self._in_request.content_type == 'application/json':
             headers['content-type'] = 'application/json'
         return headers
@@ -106,39 +201,77 @@ class SwaggerClient(BaseSwaggerClient):
 
     def request(self, **kwargs) -> Tuple[Any, int, Dict[str, str]]:
         """
-        Perform request to the service, use Swagger spec for validating operation
+        Perform request to the service, use Swagger spec for validating operation.
+        With `stream=True` big responses aren't read, their content is returned as StreamedContent.
+        With `raw=True` the body isn't decoded, so it can be passed through without encoding it again
         """
 
         method, url = self.prepare_data(self._spec, **kwargs)
+        query_params = kwargs.get('query_params')
+        cache_key = self.get_cache_key(url, query_params)
 
         # Check request cache if applicable
-        if self.is_valid_for_cache() and url in self._data:
-            logger.debug(f'Taking data from cache: {url}')
-            return self._data[url]
+        if self.is_valid_for_cache() and cache_key in self._data:
+            logger.debug(f'Taking data from cache: {cache_key}')
+            return self._data[cache_key]
+
+        headers = self.get_headers()
+        headers.update(kwargs.get('headers') or {})
+
+        # Check cache shared between requests, stale responses are revalidated with a conditional request
+        shared_cache_key = self.get_shared_cache_key(method, **kwargs)
+        cached_response = self.get_shared_response(shared_cache_key, headers)
+        if cached_response is not None and cached_response.is_fresh:
+            return cached_response.data
+
+        # Fail fast if the service is unhealthy
+        breaker = circuit_breakers.get(kwargs.get('service'))
+        if not breaker.allow_request():
+            return self.reject_request(kwargs.get('service'), cached_response)
+
+        # Forward uploads as they arrive, the multipart body is passed as is (incl. its boundary)
+        upload_stream = self.get_upload_stream()
+        if upload_stream is not None:
+            headers['Content-Type'] = self._in_request.META['CONTENT_TYPE']
 
         # Make request to the service
-        method = getattr(requests, method)
+        method = getattr(session_pool.get_session(url), method)
+        start = time.perf_counter()
         try:
             response = method(url,
-                              headers=self.get_headers(),
-                              params=self._in_request.query_params,
-                              data=self.get_request_data(),
-                              files=self._in_request.FILES)
+                              headers=headers,
+                              params=self._in_request.query_params if query_params is None else query_params,
+                              data=self.get_request_data() if upload_stream is None else upload_stream,
+                              files=self._in_request.FILES if upload_stream is None else None,
+                              timeout=session_pool.timeout,
+                              stream=kwargs.get('stream', False))
         except Exception as e:
+            duration = time.perf_counter() - start
+            tracing.record_upstream(kwargs.get('service'), duration, None)
+            breaker.record(False, duration)
             error_msg = (f'An error occurred when redirecting the request to '
                          f'or receiving the response from the service.\n'
                          f'Origin: ({e.__class__.__name__}: {e})')
             raise exceptions.GatewayError(error_msg)
+        duration = time.perf_counter() - start
+        tracing.record_upstream(kwargs.get('service'), duration, response.status_code)
+        breaker.record(response.status_code < 500, duration)
 
-        try:
-            content = response.json()
-        except ValueError:
-            content = response.content
+        if cached_response is not None and response.status_code == 304:
+            return self.revalidate_shared_response(shared_cache_key, cached_response, kwargs['cache_timeout'])
+
+        if kwargs.get('stream') and self.is_streamable(response.status_code, response.headers):
+            content = StreamedContent(response, settings.GATEWAY_STREAMING_CHUNK_SIZE)
+            return content, response.status_code, response.headers
+
+        content = response.content if kwargs.get('raw') else self.decode_content(response.content)
         return_data = (content, response.status_code, response.headers)
+        self.set_shared_response(shared_cache_key, content, response.status_code, response.headers,
+                                 kwargs.get('cache_timeout'))
 
         # Cache data if request is cache-valid
         if self.is_valid_for_cache():
-            self._data[url] = return_data
+            self._data[cache_key] = return_data
 
         return return_data
 
@@ -148,24 +281,59 @@ class AsyncSwaggerClient(BaseSwaggerClient):
 
     async def request(self, **kwargs) -> Tuple[Any, int, Dict[str, str]]:
         method, url = self.prepare_data(self._spec, **kwargs)
+        query_params = kwargs.get('query_params')
+        cache_key = self.get_cache_key(url, query_params)
 
         # Check request cache if applicable
-        if self.is_valid_for_cache() and url in self._data:
-            logger.debug(f'Taking data from cache: {url}')
-            return self._data[url]
+        if self.is_valid_for_cache() and cache_key in self._data:
+            logger.debug(f'Taking data from cache: {cache_key}')
+            return self._data[cache_key]
+
+        headers = self.get_headers()
+        headers.update(kwargs.get('headers') or {})
+
+        # Check cache shared between requests, stale responses are revalidated with a conditional request
+        shared_cache_key = self.get_shared_cache_key(method, **kwargs)
+        cached_response = self.get_shared_response(shared_cache_key, headers)
+        if cached_response is not None and cached_response.is_fresh:
+            return cached_response.data
+
+        # Fail fast if the service is unhealthy
+        breaker = circuit_breakers.get(kwargs.get('service'))
+        if not breaker.allow_request():
+            return self.reject_request(kwargs.get('service'), cached_response)
 
         # Make request to the service
-        async with aiohttp.ClientSession() as session:
-            method = getattr(session, method)
-            async with method(url, data=self.get_request_data(), headers=self.get_headers()) as response:
-                try:
-                    content = await response.json()
-                except json.JSONDecodeError:
-                    content = await response.content.read()
-            return_data = (content, response.status, response.headers)
+        method = getattr(session_pool.get_async_session(url), method)
+        start = time.perf_counter()
+        try:
+            async with method(url, params=query_params, data=self.get_request_data(), headers=headers) as response:
+                is_not_modified = cached_response is not None and response.status == 304
+                content = None if is_not_modified else await response.content.read()
+        except asyncio.CancelledError:
+            # cancelled p.e. by the DataMesh deadline, it's only a failure of the service if it was slow
+            duration = time.perf_counter() - start
+            tracing.record_upstream(kwargs.get('service'), duration, None)
+            breaker.record_cancelled(duration)
+            raise
+        except Exception:
+            duration = time.perf_counter() - start
+            tracing.record_upstream(kwargs.get('service'), duration, None)
+            breaker.record(False, duration)
+            raise
+        duration = time.perf_counter() - start
+        tracing.record_upstream(kwargs.get('service'), duration, response.status)
+        breaker.record(response.status < 500, duration)
+        if is_not_modified:
+            return self.revalidate_shared_response(shared_cache_key, cached_response, kwargs['cache_timeout'])
+        if not kwargs.get('raw'):
+            content = self.decode_content(content)
+        return_data = (content, response.status, response.headers)
+        self.set_shared_response(shared_cache_key, content, response.status, response.headers,
+                                 kwargs.get('cache_timeout'))
 
         # Cache data if request is cache-valid
         if self.is_valid_for_cache():
-            self._data[url] = return_data
+            self._data[cache_key] = return_data
 
         return return_data
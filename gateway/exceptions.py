@@ -33,3 +33,7 @@ class PermissionDenied(GatewayError):
 
 class DataMeshError(GatewayError):
     pass
+
+
+class ServiceUnavailable(GatewayError):
+    default_status_code = 503
@@ -1,13 +1,13 @@
 from drf_yasg import generators as drf_gen
 from drf_yasg import openapi
 
-from . import aggregator
-from . import utils
+from .cache import docs_cache
+from .routing import routing_table
 
 
 class OpenAPISchemaGenerator(drf_gen.OpenAPISchemaGenerator):
     def get_schema(self, request=None, public=False):
-        schema_urls = utils.get_swagger_urls()
+        schema_urls = {endpoint_name: route.swagger_url for endpoint_name, route in routing_table.all().items()}
         config_aggregator = {
             'info': {
                 'title': 'API Gateway',
@@ -22,8 +22,7 @@ class OpenAPISchemaGenerator(drf_gen.OpenAPISchemaGenerator):
                          'application/x-www-form-urlencoded',
                          'multipart/form-data'],
         }
-        sw_aggregator = aggregator.SwaggerAggregator(config_aggregator)
-        swagger_spec = sw_aggregator.generate_swagger()
+        swagger_spec = docs_cache.get(config_aggregator)
 
         endpoints = self.get_endpoints(request)
         components = openapi.ReferenceResolver(openapi.SCHEMA_DEFINITIONS)
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Health of a service based on its last `window` requests. The circuit opens when at least `min_calls` requests
+    were made and the share of failed requests (errors and 5xx responses) or of requests slower than
+    `slow_call_duration` seconds reaches its rate. While it's open requests fail fast, after `open_duration`
+    seconds it's half-open and one probe request is let through, which closes or opens the circuit again.
+    """
+
+    def __init__(self, name: str, window: int, min_calls: int, error_rate: float, slow_call_duration: float,
+                 slow_call_rate: float, open_duration: float):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.state = CLOSED
+        self.cancelled = 0
+        self._calls = deque(maxlen=window)
+        self._opened_at = None
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """ Whether a request may be sent to the service, in the half-open state it's the probe request """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_duration:
+                self.state = HALF_OPEN
+                self._probe_started_at = None
+            if self.state == CLOSED:
+                return True
+            # a probe which didn't finish in time (p.e. its request was never sent) is replaced
+            if self.state == HALF_OPEN and (self._probe_started_at is None
+                                            or now - self._probe_started_at >= self.open_duration):
+                self._probe_started_at = now
+                return True
+            return False
+
+    def record(self, success: bool, duration: float) -> None:
+        """ Record the outcome of a request to the service """
+        is_slow = duration >= self.slow_call_duration
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if success and not is_slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            if self.state == OPEN:
+                # requests sent before the circuit opened
+                return
+            self._calls.append((success, is_slow))
+            if len(self._calls) >= self.min_calls and (self.failure_rate >= self.error_rate
+                                                       or self.slow_rate >= self.slow_call_rate):
+                self._open()
+
+    def record_cancelled(self, duration: float) -> None:
+        """
+        Record a request cancelled by the gateway (p.e. by the DataMesh deadline). It's a slow request if it ran
+        for `slow_call_duration`, p.e. the service hangs, short ones (p.e. cancelled because another request
+        failed) are only counted.
+        """
+        if duration >= self.slow_call_duration:
+            self.record(True, duration)
+            return
+        with self._lock:
+            self.cancelled += 1
+            if self.state == HALF_OPEN:
+                # the next request is the probe
+                self._probe_started_at = None
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started_at = None
+
+    @property
+    def failure_rate(self) -> float:
+        return sum(not success for success, _ in self._calls) / len(self._calls) if self._calls else 0.0
+
+    @property
+    def slow_rate(self) -> float:
+        return sum(is_slow for _, is_slow in self._calls) / len(self._calls) if self._calls else 0.0
+
+    @property
+    def retry_in(self) -> Optional[float]:
+        """ Seconds until the next probe request if the circuit is open """
+        if self.state != OPEN:
+            return None
+        return max(self.open_duration - (time.monotonic() - self._opened_at), 0.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'service': self.name,
+                'state': self.state,
+                'calls': len(self._calls),
+                'failure_rate': round(self.failure_rate, 3),
+                'slow_rate': round(self.slow_rate, 3),
+                'cancelled': self.cancelled,
+                'retry_in': self.retry_in,
+            }
+
+
+class CircuitBreakerRegistry:
+    """ Circuit breakers of the services (by endpoint name) in this process """
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(
+                    name,
+                    window=settings.GATEWAY_CIRCUIT_WINDOW,
+                    min_calls=settings.GATEWAY_CIRCUIT_MIN_CALLS,
+                    error_rate=settings.GATEWAY_CIRCUIT_ERROR_RATE,
+                    slow_call_duration=settings.GATEWAY_CIRCUIT_SLOW_CALL_DURATION,
+                    slow_call_rate=settings.GATEWAY_CIRCUIT_SLOW_CALL_RATE,
+                    open_duration=settings.GATEWAY_CIRCUIT_OPEN_DURATION,
+                ))
+        return breaker
+
+    def all(self) -> Dict[str, CircuitBreaker]:
+        return dict(self._breakers)
+
+    def stats(self, names: List[str]) -> List[dict]:
+        """ Health of the given services and of all services which were requested """
+        breakers = self.all()
+        return [breakers[name].stats() if name in breakers else {'service': name, 'state': CLOSED, 'calls': 0}
+                for name in sorted(set(names) | set(breakers))]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers = {}
+
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,61 @@
+import functools
+import json
+from typing import Any, Union
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import utils
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONBackend:
+    """
+    Serializer of the gateway's JSON payloads. Backends encode datetimes, UUIDs, model instances and objects
+    with `to_json` like GatewayJSONEncoder and raise ValueError for invalid JSON.
+    """
+
+    def dumps(self, obj: Any) -> Union[str, bytes]:
+        raise NotImplementedError()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        raise NotImplementedError()
+
+
+class StdlibJSONBackend(JSONBackend):
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, cls=utils.GatewayJSONEncoder)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonJSONBackend(JSONBackend):
+    """ Several times faster backend, requires `orjson` to be installed """
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('Install orjson to use OrjsonJSONBackend.')
+        # datetimes are passed to json_default to be formatted with isoformat() like by GatewayJSONEncoder
+        self.options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=utils.json_default, option=self.options)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_backend(path: str) -> JSONBackend:
+    return import_string(path)()
+
+
+def get_json_backend() -> JSONBackend:
+    """ Backend configured by GATEWAY_JSON_BACKEND """
+    return _load_backend(settings.GATEWAY_JSON_BACKEND)
@@ -0,0 +1,327 @@
+import asyncio
+import datetime
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from datamesh.graph import relationship_graph
+from datamesh.models import JoinRecord, LogicModuleModel, Relationship
+from gateway.cache import docs_cache, response_cache, spec_cache
+from gateway.models import LogicModule
+from gateway.routing import routing_table
+from gateway.sessions import session_pool
+from workflow.models import CoreUser
+
+BATCH_SIZE = 10000
+ROUTES = {'old': 'old/', 'sync': '', 'async': 'async/'}
+
+
+class Rollback(Exception):
+    pass
+
+
+class StubService:
+    """
+    Logic module with one model served by aiohttp, its responses are delayed by `latency` seconds.
+    Records of the list endpoint can be filtered by `id__in` like by DataMesh batch requests.
+    """
+
+    def __init__(self, name: str, model: str, records: int, record_size: int, latency: float):
+        self.name = name
+        self.model = model
+        self.latency = latency
+        self.records = {
+            str(i): {'id': i, 'uuid': str(uuid.UUID(int=i, version=4)), 'name': f'{model} {i}',
+                     'payload': 'x' * record_size}
+            for i in range(1, records + 1)
+        }
+        self._list_body = json.dumps(list(self.records.values())).encode()
+        self.url = None
+
+    def make_spec(self) -> dict:
+        responses = {'200': {'description': 'OK'}}
+        return {
+            'swagger': '2.0',
+            'info': {'title': f'{self.name} stub', 'version': 'latest'},
+            'host': self.url.split('://')[1],
+            'schemes': ['http'],
+            'basePath': '/',
+            'consumes': ['application/json'],
+            'produces': ['application/json'],
+            'paths': {
+                f'/{self.model}/': {
+                    'get': {
+                        'operationId': f'{self.model}_list',
+                        'parameters': [{'name': 'id__in', 'in': 'query', 'required': False, 'type': 'string'}],
+                        'responses': responses,
+                    },
+                },
+                f'/{self.model}/{{id}}/': {
+                    'parameters': [{'name': 'id', 'in': 'path', 'required': True, 'type': 'string'}],
+                    'get': {'operationId': f'{self.model}_read', 'responses': responses},
+                },
+            },
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/docs/swagger.json', self.get_spec)
+        app.router.add_get(f'/{self.model}/', self.list_records)
+        app.router.add_get(f'/{self.model}/{{pk}}/', self.retrieve_record)
+        return app
+
+    async def get_spec(self, request: web.Request) -> web.Response:
+        return web.json_response(self.make_spec())
+
+    async def list_records(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        if 'id__in' in request.query:
+            records = [self.records[pk] for pk in request.query['id__in'].split(',') if pk in self.records]
+            return web.json_response(records)
+        return web.Response(body=self._list_body, content_type='application/json')
+
+    async def retrieve_record(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        record = self.records.get(request.match_info['pk'])
+        if record is None:
+            return web.json_response({'detail': 'Not found.'}, status=404)
+        return web.json_response(record)
+
+
+class StubServer:
+    """ Serves the stub services on local ports from an event loop in a background thread """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._runners = []
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self, services: List[StubService]) -> None:
+        self._thread.start()
+        for service in services:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('127.0.0.1', 0))
+            service.url = 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+            asyncio.run_coroutine_threadsafe(self._serve(service.make_app(), sock), self.loop).result()
+
+    async def _serve(self, app: web.Application, sock: socket.socket) -> None:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.SockSite(runner, sock).start()
+        self._runners.append(runner)
+
+    def stop(self) -> None:
+        async def cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+        asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the gateway routes (old/, sync and async/) against local stub services.
+
+    Two stub logic modules are served by aiohttp with the given latency and payload sizes, the gateway's
+    configuration (LogicModules, LogicModuleModels, a Relationship and JoinRecords) is created in a transaction,
+    which is rolled back at the end. Requests are sent sequentially in-process, so the throughput is the one of
+    a single worker. Results are appended to the --output file and compared with its previous run of the same
+    parameters to show regressions.
+
+    Example:
+    python manage.py benchmarkgateway --records=1000 --join-records=1000000 --output=benchmarks/gateway.jsonl
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=100, help='Number of records in the list responses.')
+        parser.add_argument('--record-size', type=int, default=200, help='Size of the payload of each record.')
+        parser.add_argument('--related', type=int, default=2, help='Number of related records per record.')
+        parser.add_argument('--join-records', type=int, default=100000,
+                            help='Number of JoinRecords of other records to simulate a big JoinRecord table.')
+        parser.add_argument('--latency', type=float, default=10, help='Latency of the stub services in ms.')
+        parser.add_argument('--requests', type=int, default=50, help='Number of measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3, help='Number of requests before measuring.')
+        parser.add_argument('--memory-requests', type=int, default=3,
+                            help='Number of requests measured with tracemalloc for the peak memory.')
+        parser.add_argument('--routes', nargs='+', choices=ROUTES.keys(), default=list(ROUTES.keys()))
+        parser.add_argument('--output', default=None, help='JSON lines file the results are appended to.')
+        parser.add_argument('--label', default='', help='Label of the run in the output, p.e. a commit hash.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Relative slowdown of the p50 latency that is reported as regression.')
+
+    def handle(self, *args, **options):
+        origin = StubService('benchmarkorigin', 'records', options['records'], options['record_size'],
+                             options['latency'] / 1000)
+        related = StubService('benchmarkrelated', 'documents', options['records'] * options['related'], 100,
+                              options['latency'] / 1000)
+        server = StubServer()
+        server.start([origin, related])
+        try:
+            with transaction.atomic():
+                client = self._seed(origin, related, options)
+                results = self._run(client, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Generated configuration rolled back.')
+        finally:
+            server.stop()
+            self._clear_caches()
+
+        if options['output']:
+            self._store(results, options)
+
+    def _seed(self, origin: StubService, related: StubService, options: dict) -> APIClient:
+        """ Create the configuration of the stub services and a client of a superuser """
+        models = {}
+        for service, lookup_filter in ((origin, None), (related, 'id__in')):
+            LogicModule.objects.create(name=service.name, endpoint_name=service.name, endpoint=service.url)
+            models[service.name] = LogicModuleModel.objects.create(
+                logic_module_endpoint_name=service.name, model=service.model.capitalize(),
+                endpoint=f'/{service.model}/', lookup_field_name='id', bulk_lookup_filter=lookup_filter)
+        relationship = Relationship.objects.create(origin_model=models[origin.name],
+                                                   related_model=models[related.name], key='documents')
+
+        join_records = [JoinRecord(relationship=relationship, record_id=record_id,
+                                   related_record_id=(record_id - 1) * options['related'] + i + 1)
+                        for record_id in range(1, options['records'] + 1) for i in range(options['related'])]
+        # records which aren't in the responses of the stub service
+        offset = options['records'] + 1
+        join_records.extend(JoinRecord(relationship=relationship, record_id=offset + i, related_record_id=i + 1)
+                            for i in range(options['join_records']))
+        for i in range(0, len(join_records), BATCH_SIZE):
+            JoinRecord.objects.bulk_create(join_records[i:i + BATCH_SIZE])
+        self.stdout.write(f'Generated {len(join_records)} JoinRecords')
+
+        user = CoreUser.objects.create(username=f'benchmark-{uuid.uuid4().hex[:8]}', is_superuser=True,
+                                       is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def _request(self, client: APIClient, url: str, params: dict) -> int:
+        """ Status code of the fully read response, 500 if the view raised an exception """
+        try:
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        except Exception as e:
+            self.stderr.write(f'{url}: {e.__class__.__name__}: {e}')
+            return 500
+        return response.status_code
+
+    def _run(self, client: APIClient, options: dict) -> Dict[str, dict]:
+        scenarios = {
+            'list': ('records/', {}),
+            'detail': ('records/1/', {}),
+            'join list': ('records/', {'join': 'true'}),
+            'join detail': ('records/1/', {'join': 'true'}),
+        }
+        results = {}
+        for route in options['routes']:
+            for name, (path, params) in scenarios.items():
+                url = f'/{ROUTES[route]}benchmarkorigin/{path}'
+                result = self._measure(lambda: self._request(client, url, params), options)
+                results[f'{route} {name}'] = result
+                self.stdout.write(f'{route} {name}: {result["throughput"]:.1f} req/s, p50 {result["p50"]:.1f}ms, '
+                                  f'p99 {result["p99"]:.1f}ms, peak memory {result["memory"] / 1024:.0f}KiB, '
+                                  f'{result["errors"]} error(s)')
+        return results
+
+    @staticmethod
+    def _measure(request: Callable[[], int], options: dict) -> dict:
+        for _ in range(options['warmup']):
+            request()
+
+        timings = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            request_start = time.perf_counter()
+            if request() >= 400:
+                errors += 1
+            timings.append((time.perf_counter() - request_start) * 1000)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            for _ in range(options['memory_requests']):
+                request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'throughput': len(timings) / elapsed,
+            'p50': statistics.median(timings),
+            'p99': timings[min(int(len(timings) * 0.99), len(timings) - 1)],
+            'memory': peak,
+            'errors': errors,
+        }
+
+    @staticmethod
+    def _clear_caches() -> None:
+        """ Process-wide caches aren't invalidated by the rollback """
+        routing_table.clear()
+        spec_cache.clear()
+        docs_cache.clear()
+        response_cache.clear()
+        relationship_graph.clear()
+        session_pool.close()
+
+    @staticmethod
+    def _get_parameters(options: dict) -> dict:
+        return {key: options[key] for key in ('records', 'record_size', 'related', 'join_records', 'latency',
+                                              'requests')}
+
+    def _load_previous_run(self, options: dict) -> Optional[dict]:
+        """ Last stored run with the same parameters """
+        if not os.path.exists(options['output']):
+            return None
+        previous = None
+        with open(options['output']) as output:
+            for line in output:
+                try:
+                    run = json.loads(line)
+                except ValueError:
+                    raise CommandError(f'{options["output"]} isn\'t a JSON lines file.')
+                if run.get('parameters') == self._get_parameters(options):
+                    previous = run
+        return previous
+
+    def _store(self, results: Dict[str, dict], options: dict) -> None:
+        previous = self._load_previous_run(options)
+        if previous is not None:
+            self.stdout.write(f'Compared with the run of {previous["date"]} {previous.get("label", "")}:')
+            for scenario, result in results.items():
+                previous_result = previous['results'].get(scenario)
+                if not previous_result:
+                    continue
+                change = result['p50'] / previous_result['p50'] - 1
+                flag = ' REGRESSION' if change > options['tolerance'] else ''
+                self.stdout.write(f'  {scenario}: p50 {change:+.0%}, '
+                                  f'peak memory {result["memory"] - previous_result["memory"]:+d}B{flag}')
+
+        directory = os.path.dirname(options['output'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options['output'], 'a') as output:
+            output.write(json.dumps({
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'label': options['label'],
+                'parameters': self._get_parameters(options),
+                'results': results,
+            }) + '\n')
+        self.stdout.write(f'Results appended to {options["output"]}')
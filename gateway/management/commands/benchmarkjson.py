@@ -0,0 +1,57 @@
+import datetime
+import timeit
+import uuid
+
+from django.core.management import BaseCommand
+
+from gateway.json_backends import OrjsonJSONBackend, StdlibJSONBackend, orjson
+
+
+def make_payload(size: int) -> bytes:
+    """ JSON list of records like a service's list response of about the given size in bytes """
+    backend = StdlibJSONBackend()
+    record = {
+        'id': 0,
+        'uuid': str(uuid.uuid4()),
+        'name': 'Benchmark record',
+        'description': 'Record of a list response ' * 4,
+        'create_date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'organization_uuid': str(uuid.uuid4()),
+        'tags': ['first', 'second', 'third'],
+        'amount': 1234.5,
+        'active': True,
+    }
+    count = max(size // len(backend.dumps(record)), 1)
+    return backend.dumps([{**record, 'id': i} for i in range(count)]).encode()
+
+
+class Command(BaseCommand):
+    help = """
+    Compare serialization of gateway responses by the JSON backends against passing the body through as is.
+
+    Example:
+    python manage.py benchmarkjson --sizes 1 2 5 --number=10
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 5], help='Sizes of the payloads in MB.')
+        parser.add_argument('--number', type=int, default=10, help='Number of round trips per payload and backend.')
+
+    def handle(self, *args, **options):
+        backends = [('stdlib', StdlibJSONBackend())]
+        if orjson is not None:
+            backends.append(('orjson', OrjsonJSONBackend()))
+        else:
+            self.stdout.write('orjson is not installed, skipping OrjsonJSONBackend')
+
+        number = options['number']
+        for size in options['sizes']:
+            body = make_payload(size * 1024 * 1024)
+            self.stdout.write(f'{len(body) / 1024 / 1024:.1f}MB payload')
+            for name, backend in backends:
+                loads = timeit.timeit(lambda: backend.loads(body), number=number) / number
+                content = backend.loads(body)
+                dumps = timeit.timeit(lambda: backend.dumps(content), number=number) / number
+                self.stdout.write(f'  {name}: decode {loads * 1000:.1f}ms, encode {dumps * 1000:.1f}ms, '
+                                  f'round trip {(loads + dumps) * 1000:.1f}ms')
+            self.stdout.write('  passthrough: body is returned as is, no round trip')
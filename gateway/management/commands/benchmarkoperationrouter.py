@@ -0,0 +1,80 @@
+import timeit
+from types import SimpleNamespace
+
+from bravado_core.spec import Spec
+from django.core.management import BaseCommand
+
+from gateway import utils
+from gateway.request import BaseGatewayRequest
+from gateway.routing import OperationRouter
+
+
+def make_spec_dict(models: int) -> dict:
+    """ Swagger spec of a service with list and detail operations for each model """
+    paths = {}
+    for i in range(models):
+        responses = {'200': {'description': 'OK'}}
+        paths[f'/model{i}/'] = {method: {'responses': responses} for method in ('get', 'post')}
+        paths[f'/model{i}/{{id}}/'] = {
+            'parameters': [{'name': 'id', 'in': 'path', 'required': True, 'type': 'integer'}],
+            **{method: {'responses': responses} for method in ('get', 'put', 'patch', 'delete')},
+        }
+    return {
+        'swagger': '2.0',
+        'info': {'title': 'Benchmark', 'version': '1'},
+        'host': 'benchmarkservice:8080',
+        'schemes': ['http'],
+        'basePath': '/',
+        'paths': paths,
+    }
+
+
+def route_with_spec(spec: Spec, http_method: str, model: str, pk: str = None):
+    """ Routing like before the operation router: path from the request, operation from the spec, URL rebuilt """
+    path_kwargs = {}
+    if pk is None:
+        path = f'/{model.lower()}/'
+    else:
+        pk_name = 'uuid' if utils.valid_uuid4(pk) else 'id'
+        path_kwargs = {pk_name: pk}
+        path = f'/{model.lower()}/{{{pk_name}}}/'
+    operation = spec.get_op_for_request(http_method, path)
+    url = spec.api_url.rstrip('/') + operation.path_name
+    for k, v in path_kwargs.items():
+        url = url.replace(f'{{{k}}}', v)
+    return operation.http_method.lower(), url
+
+
+class Command(BaseCommand):
+    help = """
+    Compare routing of gateway requests with the operation router against looking up operations in the spec.
+
+    Example:
+    python manage.py benchmarkoperationrouter --models=100 --number=100000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', type=int, default=100,
+                            help='Number of models in the spec, each model has 6 operations.')
+        parser.add_argument('--number', type=int, default=100000, help='Number of routed requests per scenario.')
+
+    def handle(self, *args, **options):
+        models, number = options['models'], options['number']
+        spec = Spec.from_dict(make_spec_dict(models), config=BaseGatewayRequest.SWAGGER_CONFIG)
+        router = OperationRouter(spec)
+        self.stdout.write(f'{len(router)} operations')
+
+        requests = [SimpleNamespace(method=method, model=f'model{i}', pk=pk)
+                    for i in range(0, models, max(models // 10, 1))
+                    for method, pk in (('GET', None), ('GET', '42'), ('PATCH', '42'))]
+        for request in requests:
+            assert router.route(request.method, request.model, request.pk) == \
+                route_with_spec(spec, request.method, request.model, request.pk)
+
+        build_time = timeit.timeit(lambda: OperationRouter(spec), number=10) / 10
+        self.stdout.write(f'router built in {build_time * 1000:.2f}ms')
+        for name, route in (('spec lookup', lambda r: route_with_spec(spec, r.method, r.model, r.pk)),
+                            ('operation router', lambda r: router.route(r.method, r.model, r.pk))):
+            rounds = max(number // len(requests), 1)
+            elapsed = timeit.timeit(lambda: [route(request) for request in requests], number=rounds)
+            self.stdout.write(f'{name}: {elapsed / (rounds * len(requests)) * 1e6:.2f}us per request')
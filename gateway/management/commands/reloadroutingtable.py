@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from gateway.routing import routing_table
+
+
+class Command(BaseCommand):
+    help = """
+    Reload the routing table of the logic modules from the database and print it to check how requests are routed.
+
+    Running processes apply changes of the logic modules by signals, or after GATEWAY_ROUTING_TABLE_TTL seconds
+    if the changes were made in another process.
+    """
+
+    def handle(self, *args, **options):
+        routes = routing_table.load()
+        for endpoint_name, route in sorted(routes.items()):
+            self.stdout.write(f'{endpoint_name}: {route.base_url} (schema: {route.swagger_url})')
+        self.stdout.write(f'{len(routes)} route(s) loaded.')
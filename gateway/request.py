@@ -1,36 +1,60 @@
 import logging
-import json
 import uuid
 import asyncio
-from urllib.error import URLError
-from typing import Any, Dict, Union
+import threading
+from types import GeneratorType
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-import requests
-import aiohttp
 from bravado_core.spec import Spec
+from django.conf import settings
 from django.http.request import QueryDict
 from django.forms.models import model_to_dict
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.request import Request
 
 from . import exceptions
+from . import tracing
 from . import utils
+from .cache import response_cache, spec_cache
+from .json_backends import get_json_backend
 from .models import LogicModule
-from .clients import SwaggerClient, AsyncSwaggerClient
+from .routing import routing_table
+from .clients import SwaggerClient, AsyncSwaggerClient, StreamedContent
 from datamesh.services import DataMesh
+from datamesh.splicing import JSONItem, JSONItems
 from workflow import models as wfm
 
 logger = logging.getLogger(__name__)
 
+_worker = threading.local()
+
+
+def get_worker_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the long-lived event loop of the current worker thread. Reusing it keeps aiohttp sessions and their
+    connections alive between requests, while ORM queries stay in the thread (and DB connection) of the request.
+    """
+    loop = getattr(_worker, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _worker.loop = loop
+    return loop
+
 
 class GatewayResponse(object):
     """
     Response object used with GatewayRequest
     """
 
-    def __init__(self, content: Any, status_code: int, headers: Dict[str, str]):
+    def __init__(self, content: Any, status_code: int, headers: Dict[str, str], etag: Optional[str] = None):
         self.content = content
         self.status_code = status_code
         self.headers = headers
+        self.etag = etag
+
+    @property
+    def is_streamed(self) -> bool:
+        return isinstance(self.content, (StreamedContent, GeneratorType))
 
 
 class BaseGatewayRequest(object):
@@ -50,21 +74,55 @@ class BaseGatewayRequest(object):
     def __init__(self, request: Request, **kwargs):
         self.request = request
         self.url_kwargs = kwargs
-        self._logic_modules = dict()
-        self._specs = dict()
         self._data = dict()
 
     def perform(self):
         raise NotImplementedError('You need to implement this method')
 
     def _get_logic_module(self, service_name: str) -> LogicModule:
-        """ Retrieve LogicModule by service name. """
-        if service_name not in self._logic_modules:
-            try:
-                self._logic_modules[service_name] = LogicModule.objects.get(endpoint_name=service_name)
-            except LogicModule.DoesNotExist:
-                raise exceptions.ServiceDoesNotExist(f'Service "{service_name}" not found.')
-        return self._logic_modules[service_name]
+        """ Retrieve LogicModule by service name from the routing table. """
+        return routing_table.get_logic_module(service_name)
+
+    @property
+    def is_passthrough(self) -> bool:
+        """ Response of the service is returned as is, without joining or aggregating data of other services """
+        query_params = self.request.query_params
+        return 'join' not in query_params and query_params.get('aggregate', '_none').lower() != 'true'
+
+    @property
+    def is_spliced_join(self) -> bool:
+        """ Related records are spliced into the raw body of the service's response instead of decoding it """
+        query_params = self.request.query_params
+        return (settings.DATAMESH_JOIN_SPLICING and self.request.method == 'GET' and 'join' in query_params
+                and query_params.get('aggregate', '_none').lower() != 'true')
+
+    @staticmethod
+    def get_spliced_headers(headers: Dict[str, str]) -> Dict[str, str]:
+        """ Length and validators of the service's body don't apply to the joined body """
+        return {'Content-Type': headers.get('Content-Type', 'application/json')}
+
+    def get_conditional_headers(self) -> dict:
+        """ Validators of the client are checked by the service itself if its response is passed through """
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and self.request.method in ('GET', 'HEAD') and self.is_passthrough:
+            return {'If-None-Match': if_none_match}
+        return {}
+
+    def get_etag(self, content: Any, status_code: int, headers: Dict[str, str]) -> Optional[str]:
+        """
+        ETag of the gateway response. ETag of the service is passed through if its response isn't changed,
+        otherwise (p.e. with joined data) it's computed from the whole payload
+        """
+        if self.is_passthrough and headers.get('ETag'):
+            return headers['ETag']
+        if status_code == 200 and self.request.method == 'GET' and isinstance(content, (str, bytes)):
+            return utils.get_etag(content)
+        return None
+
+    def invalidate_cached_responses(self, status_code: int) -> None:
+        """ Drop responses cached for other requests after the record was changed through the gateway """
+        if self.request.method not in SAFE_METHODS and status_code < 400:
+            response_cache.invalidate(self.url_kwargs['service'], self.url_kwargs['model'], self.url_kwargs.get('pk'))
 
     def get_datamesh(self) -> DataMesh:
         """ Get DataMesh object for the top level model """
@@ -98,8 +156,31 @@ class GatewayRequest(BaseGatewayRequest):
         # create a client for performing data requests
         client = SwaggerClient(spec, self.request)
 
-        # perform a service data request
-        content, status_code, headers = client.request(**self.url_kwargs)
+        # perform a service data request, response is streamed if it's passed through as is
+        is_spliced_join = self.is_spliced_join
+        try:
+            with tracing.stage('upstream'):
+                content, status_code, headers = client.request(
+                    headers=self.get_conditional_headers(),
+                    stream=self.is_passthrough and self.request.method == 'GET',
+                    raw=self.is_passthrough or is_spliced_join,
+                    **self.url_kwargs)
+        except exceptions.ServiceUnavailable as e:
+            return GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+        self.invalidate_cached_responses(status_code)
+
+        # join with the JoinRecord-models by splicing related records into the raw body
+        if is_spliced_join and status_code == 200 and isinstance(content, bytes):
+            try:
+                items = JSONItems(content)
+            except ValueError:
+                content = client.decode_content(content)
+            else:
+                try:
+                    content = self._splice_response_data(items)
+                    headers = self.get_spliced_headers(headers)
+                except exceptions.ServiceDoesNotExist as e:
+                    logger.error(e.content)
 
         # aggregate/join with the JoinRecord-models
         if 'join' in self.request.query_params and status_code == 200 and type(content) in [dict, list]:
@@ -116,45 +197,75 @@ class GatewayRequest(BaseGatewayRequest):
                 logger.error(e.content)
 
         if type(content) in [dict, list]:
-            content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+            with tracing.stage('serialize'):
+                content = get_json_backend().dumps(content)
 
-        return GatewayResponse(content, status_code, headers)
+        etag = self.get_etag(content, status_code, headers)
+        return GatewayResponse(content, status_code, headers, etag)
 
     def _get_swagger_spec(self, endpoint_name: str) -> Spec:
-        """Get Swagger spec of specified service."""
+        """Get Swagger spec of specified service from the process-wide specs cache."""
         logic_module = self._get_logic_module(endpoint_name)
-        schema_url = utils.get_swagger_url_by_logic_module(logic_module)
-
-        if schema_url not in self._specs:
-            try:
-                response = requests.get(schema_url)
-                spec_dict = response.json()
-            except URLError:
-                raise URLError(f'Make sure that {schema_url} is accessible.')
+        with tracing.stage('spec'):
+            return spec_cache.get(logic_module, self.SWAGGER_CONFIG)
 
-            swagger_spec = Spec.from_dict(spec_dict, config=self.SWAGGER_CONFIG)
-            self._specs[schema_url] = swagger_spec
+    def _get_join_clients(self) -> Tuple[DataMesh, Dict[str, SwaggerClient]]:
+        """ DataMesh of the requested model and clients of its related services """
+        self.request._request.GET = QueryDict(mutable=True)
 
-        return self._specs[schema_url]
+        datamesh = self.get_datamesh()
+        client_map = {}
+        for service in datamesh.related_logic_modules:
+            spec = self._get_swagger_spec(service)
+            client_map[service] = SwaggerClient(spec, self.request)
+        return datamesh, client_map
 
     def _join_response_data(self, resp_data: Union[dict, list]) -> None:
         """
         Aggregates data from the requested service and from related services.
         Uses DataMesh relationship model for this.
         """
-        self.request._request.GET = QueryDict(mutable=True)
-
         if isinstance(resp_data, dict):
             if 'results' in resp_data:
                 # In case of pagination take 'results' as a items data
                 resp_data = resp_data.get('results', None)
 
-        datamesh = self.get_datamesh()
-        client_map = {}
-        for service in datamesh.related_logic_modules:
-            spec = self._get_swagger_spec(service)
-            client_map[service] = SwaggerClient(spec, self.request)
-        datamesh.extend_data(resp_data, client_map)
+        datamesh, client_map = self._get_join_clients()
+        with tracing.stage('fanout'):
+            datamesh.extend_data(resp_data, client_map)
+
+    def _splice_response_data(self, items: JSONItems) -> Union[bytes, Iterator[bytes]]:
+        """
+        Joins related records into the raw body of the service's response. Big bodies are joined chunk by chunk
+        while they are streamed to the client.
+        """
+        datamesh, client_map = self._get_join_clients()
+        if len(items.body) > settings.GATEWAY_STREAMING_MIN_SIZE:
+            return self._iter_spliced_data(datamesh, client_map, items, settings.DATAMESH_JOIN_CHUNK_SIZE,
+                                           is_streamed=True)
+        return b''.join(self._iter_spliced_data(datamesh, client_map, items))
+
+    @staticmethod
+    def _iter_spliced_data(datamesh: DataMesh, client_map: Dict[str, SwaggerClient], items: JSONItems,
+                           chunk_size: Optional[int] = None, is_streamed: bool = False) -> Iterator[bytes]:
+        """
+        Spliced chunks of the body. Once the body is streamed the status can't be changed anymore, so chunks whose
+        related records can't be retrieved are spliced without them instead of breaking the body
+        """
+        for chunk in items.chunks(chunk_size):
+            stubs = datamesh.get_origin_stubs(items, chunk)
+            try:
+                with tracing.stage('fanout'):
+                    datamesh.extend_data(stubs, client_map)
+            except Exception:
+                if not is_streamed:
+                    raise
+                logger.exception('Joining a chunk of a streamed response failed')
+                datamesh.set_partial_data(stubs)
+            with tracing.stage('serialize'):
+                spliced = datamesh.splice_data(items, chunk, stubs)
+            yield spliced
+        yield items.tail
 
     # ===================================================================
     # OLD DATAMESH METHODS (TODO: remove after migrating to new DataMesh)
@@ -268,7 +379,7 @@ class AsyncGatewayRequest(BaseGatewayRequest):
         Override base class's method for asynchronous execution. Wraps async method.
         """
         result = {}
-        asyncio.run(self.async_perform(result))
+        get_worker_event_loop().run_until_complete(self.async_perform(result))
         if 'response' not in result:
             raise exceptions.GatewayError('Error performing asynchronous gateway request')
         return result['response']
@@ -282,8 +393,30 @@ class AsyncGatewayRequest(BaseGatewayRequest):
         # create a client for performing data requests
         client = AsyncSwaggerClient(spec, self.request)
 
-        # perform a service data request
-        content, status_code, headers = await client.request(**self.url_kwargs)
+        # perform a service data request, response is passed through without decoding if it isn't changed
+        is_spliced_join = self.is_spliced_join
+        try:
+            with tracing.stage('upstream'):
+                content, status_code, headers = await client.request(headers=self.get_conditional_headers(),
+                                                                     raw=self.is_passthrough or is_spliced_join,
+                                                                     **self.url_kwargs)
+        except exceptions.ServiceUnavailable as e:
+            result['response'] = GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+            return
+        self.invalidate_cached_responses(status_code)
+
+        # join with the JoinRecord-models by splicing related records into the raw body
+        if is_spliced_join and status_code == 200 and isinstance(content, bytes):
+            try:
+                items = JSONItems(content)
+            except ValueError:
+                content = client.decode_content(content)
+            else:
+                try:
+                    content = await self._splice_response_data(items)
+                    headers = self.get_spliced_headers(headers)
+                except exceptions.ServiceDoesNotExist as e:
+                    logger.error(e.content)
 
         # aggregate/join with the JoinRecord-models
         if 'join' in self.request.query_params and status_code == 200 and type(content) in [dict, list]:
@@ -293,45 +426,77 @@ class AsyncGatewayRequest(BaseGatewayRequest):
                 logger.error(e.content)
 
         if type(content) in [dict, list]:
-            content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+            with tracing.stage('serialize'):
+                content = get_json_backend().dumps(content)
 
-        result['response'] = GatewayResponse(content, status_code, headers)
+        etag = self.get_etag(content, status_code, headers)
+        result['response'] = GatewayResponse(content, status_code, headers, etag)
 
     async def _get_swagger_spec(self, endpoint_name: str) -> Spec:
-        """ Gets swagger spec asynchronously and adds it to specs cache """
+        """ Gets swagger spec asynchronously from the process-wide specs cache """
         logic_module = self._get_logic_module(endpoint_name)
-        schema_url = utils.get_swagger_url_by_logic_module(logic_module)
-
-        if schema_url not in self._specs:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(schema_url) as response:
-                    try:
-                        spec_dict = await response.json()
-                    except aiohttp.ContentTypeError:
-                        raise exceptions.GatewayError(
-                            f'Failed to parse swagger schema from {schema_url}. Should be JSON.'
-                        )
-                swagger_spec = Spec.from_dict(spec_dict, config=self.SWAGGER_CONFIG)
-                self._specs[schema_url] = swagger_spec
-        return self._specs[schema_url]
+        with tracing.stage('spec'):
+            return await spec_cache.async_get(logic_module, self.SWAGGER_CONFIG)
 
     async def _join_response_data(self, resp_data: Union[dict, list]) -> None:
         """
         Aggregates data from the requested service and from related services asynchronously.
         Uses DataMesh relationship model for this.
         """
-        self.request._request.GET = QueryDict(mutable=True)
-
         if isinstance(resp_data, dict):
             if 'results' in resp_data:
                 # In case of pagination take 'results' as a items data
                 resp_data = resp_data.get('results', None)
 
+        datamesh, client_map = await self._get_join_clients()
+        with tracing.stage('fanout'):
+            await datamesh.async_extend_data(resp_data, client_map)
+
+    async def _get_join_clients(self) -> Tuple[DataMesh, Dict[str, AsyncSwaggerClient]]:
+        """ DataMesh of the requested model and clients of its related services """
+        self.request._request.GET = QueryDict(mutable=True)
+
         datamesh = self.get_datamesh()
         tasks = []
         for service in datamesh.related_logic_modules:
             tasks.append(self._get_swagger_spec(service))
         specs = await asyncio.gather(*tasks)
         clients = map(lambda x: AsyncSwaggerClient(x, self.request), specs)
-        client_map = dict(zip(datamesh.related_logic_modules, clients))
-        await datamesh.async_extend_data(resp_data, client_map)
+        return datamesh, dict(zip(datamesh.related_logic_modules, clients))
+
+    async def _splice_response_data(self, items: JSONItems) -> Union[bytes, Iterator[bytes]]:
+        """
+        Joins related records into the raw body of the service's response. Big bodies are joined chunk by chunk
+        while they are streamed to the client, the worker's event loop runs the requests of each chunk then.
+        """
+        datamesh, client_map = await self._get_join_clients()
+        if len(items.body) > settings.GATEWAY_STREAMING_MIN_SIZE:
+            return self._iter_spliced_data(datamesh, client_map, items)
+        return await self._splice_chunk(datamesh, client_map, items, items.items) + items.tail
+
+    @staticmethod
+    async def _splice_chunk(datamesh: DataMesh, client_map: Dict[str, AsyncSwaggerClient], items: JSONItems,
+                            chunk: List[JSONItem]) -> bytes:
+        stubs = datamesh.get_origin_stubs(items, chunk)
+        with tracing.stage('fanout'):
+            await datamesh.async_extend_data(stubs, client_map)
+        with tracing.stage('serialize'):
+            return datamesh.splice_data(items, chunk, stubs)
+
+    def _iter_spliced_data(self, datamesh: DataMesh, client_map: Dict[str, AsyncSwaggerClient],
+                           items: JSONItems) -> Iterator[bytes]:
+        """
+        Spliced chunks of the streamed body, the status can't be changed anymore, so chunks whose related records
+        can't be retrieved are spliced without them instead of breaking the body
+        """
+        loop = get_worker_event_loop()
+        for chunk in items.chunks(settings.DATAMESH_JOIN_CHUNK_SIZE):
+            try:
+                spliced = loop.run_until_complete(self._splice_chunk(datamesh, client_map, items, chunk))
+            except Exception:
+                logger.exception('Joining a chunk of a streamed response failed')
+                stubs = datamesh.get_origin_stubs(items, chunk)
+                datamesh.set_partial_data(stubs)
+                spliced = datamesh.splice_data(items, chunk, stubs)
+            yield spliced
+        yield items.tail
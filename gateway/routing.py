@@ -0,0 +1,221 @@
+import logging
+import re
+import threading
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from bravado_core.operation import Operation
+from bravado_core.spec import Spec
+from django.conf import settings
+from django.core.cache import caches
+
+from . import exceptions
+from . import utils
+from .models import LogicModule
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'gateway:routing_table:version'
+
+
+class Route(NamedTuple):
+    logic_module: LogicModule
+    base_url: str
+    swagger_url: str
+
+
+class RoutingTable:
+    """
+    Process-wide map of the logic modules' endpoint names to their routes, so routing a request doesn't query
+    the database. It's updated by signals when logic modules are changed in this process, which also change
+    the version in the shared cache, so other processes reload it. Without a shared cache it's reloaded
+    after `ttl` seconds. Unknown endpoint names are remembered for `missing_ttl` seconds.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, missing_ttl: float = 0, missing_maxsize: int = 1024):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.missing_maxsize = missing_maxsize
+        self._routes = None
+        self._version = None
+        self._missing = {}
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_cache():
+        return caches[settings.GATEWAY_ROUTING_TABLE_CACHE]
+
+    def _get_version(self) -> str:
+        """ Version of the logic modules in the shared cache, it changes with every change of them """
+        cache = self._get_cache()
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _change_version(self) -> Optional[str]:
+        """ Make other processes reload the routes, the new version is returned if the routes were up to date """
+        is_current = self._get_version() == self._version
+        version = uuid.uuid4().hex
+        self._get_cache().set(VERSION_KEY, version, None)
+        return version if is_current else None
+
+    @staticmethod
+    def _make_route(logic_module: LogicModule) -> Route:
+        return Route(logic_module=logic_module,
+                     base_url=(logic_module.endpoint or '').rstrip('/'),
+                     swagger_url=utils.get_swagger_url_by_logic_module(logic_module))
+
+    def load(self) -> Dict[str, Route]:
+        """ (Re)load routes of all logic modules """
+        version = self._get_version()
+        routes = {logic_module.endpoint_name: self._make_route(logic_module)
+                  for logic_module in LogicModule.objects.all() if logic_module.endpoint_name}
+        with self._lock:
+            self._routes = routes
+            self._version = version
+            self._missing = {}
+            self._loaded_at = time.monotonic()
+        return routes
+
+    def _get_routes(self) -> Dict[str, Route]:
+        routes = self._routes
+        if (routes is None or self._get_version() != self._version
+                or (self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl)):
+            routes = self.load()
+        return routes
+
+    def get(self, endpoint_name: str) -> Route:
+        route = self._get_routes().get(endpoint_name)
+        if route is None:
+            if time.monotonic() < self._missing.get(endpoint_name, 0):
+                raise exceptions.ServiceDoesNotExist(f'Service "{endpoint_name}" not found.')
+            # the logic module could be just created by another process
+            logic_module = LogicModule.objects.filter(endpoint_name=endpoint_name).first()
+            if logic_module is None:
+                self._add_missing(endpoint_name)
+                raise exceptions.ServiceDoesNotExist(f'Service "{endpoint_name}" not found.')
+            route = self.update(logic_module, is_local=False)
+        return route
+
+    def _add_missing(self, endpoint_name: str) -> None:
+        if not self.missing_ttl:
+            return
+        with self._lock:
+            # copy on write like the routes, random names of bad requests can't grow it without limit
+            missing = {} if len(self._missing) >= self.missing_maxsize else dict(self._missing)
+            missing[endpoint_name] = time.monotonic() + self.missing_ttl
+            self._missing = missing
+
+    def all(self) -> Dict[str, Route]:
+        return self._get_routes()
+
+    def get_logic_module(self, endpoint_name: str) -> LogicModule:
+        return self.get(endpoint_name).logic_module
+
+    def update(self, logic_module: LogicModule, is_local: bool = True) -> Route:
+        """ Route of a logic module changed in this process, or found in the database if it isn't local """
+        route = self._make_route(logic_module)
+        version = self._change_version() if is_local else None
+        with self._lock:
+            if self._routes is not None:
+                # copy on write, readers keep a consistent version without locking
+                routes = {name: existing for name, existing in self._routes.items()
+                          if str(existing.logic_module.module_uuid) != str(logic_module.module_uuid)}
+                if logic_module.endpoint_name:
+                    routes[logic_module.endpoint_name] = route
+                self._routes = routes
+                if version is not None:
+                    self._version = version
+            self._missing = {name: expires_at for name, expires_at in self._missing.items()
+                             if name != logic_module.endpoint_name}
+        return route
+
+    def remove(self, logic_module: LogicModule) -> None:
+        version = self._change_version()
+        with self._lock:
+            if self._routes is not None:
+                self._routes = {name: route for name, route in self._routes.items()
+                                if str(route.logic_module.module_uuid) != str(logic_module.module_uuid)}
+                if version is not None:
+                    self._version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes = None
+            self._version = None
+            self._missing = {}
+
+    def stats(self) -> dict:
+        routes = self._routes
+        return {
+            'size': len(routes) if routes is not None else 0,
+            'missing': len(self._missing),
+            'ttl': self.ttl,
+        }
+
+
+# paths of the operations the gateway routes to: /<model>/ and /<model>/{id}/ or /<model>/{uuid}/
+OPERATION_PATH = re.compile(r'^/(?P<model>[^/{}]+)/(?:\{(?P<pk_name>id|uuid)\}/)?$')
+
+
+class OperationRoute(NamedTuple):
+    operation: Operation
+    url_prefix: str
+    url_suffix: str
+
+
+class OperationRouter:
+    """
+    Operations of a spec indexed by (HTTP method, model, pk name) with their URLs split around the pk,
+    so a request is routed with one dict lookup. It's built once per spec, see `get_operation_router`.
+    """
+
+    def __init__(self, spec: Spec):
+        self._routes = {}
+        base_path = spec.spec_dict.get('basePath', '').rstrip('/')
+        api_url = spec.api_url.rstrip('/')
+        for resource in spec.resources.values():
+            for operation in resource.operations.values():
+                # same like spec.get_op_for_request, which matches paths including the base path
+                match = OPERATION_PATH.match(base_path + operation.path_name)
+                if match is None:
+                    continue
+                pk_name = match.group('pk_name')
+                url = api_url + operation.path_name
+                url_prefix, _, url_suffix = url.partition(f'{{{pk_name}}}') if pk_name else (url, '', '')
+                key = (operation.http_method.lower(), match.group('model'), pk_name)
+                self._routes[key] = OperationRoute(operation, url_prefix, url_suffix)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def route(self, http_method: str, model: str, pk: Optional[str] = None) -> Tuple[str, str]:
+        """ Get method and URL of the operation for the request """
+        if pk is None:
+            pk_name = None
+        else:
+            pk = str(pk)
+            pk_name = 'uuid' if utils.valid_uuid4(pk) else 'id'
+        try:
+            operation, url_prefix, url_suffix = self._routes[(http_method.lower(), model.lower(), pk_name)]
+        except KeyError:
+            path = f'/{model.lower()}/' if pk_name is None else f'/{model.lower()}/{{{pk_name}}}/'
+            raise exceptions.EndpointNotFound(f'Endpoint not found: {http_method} {path}')
+        url = url_prefix if pk is None else url_prefix + pk + url_suffix
+        return operation.http_method.lower(), url
+
+
+def get_operation_router(spec: Spec) -> OperationRouter:
+    """ Operation router of the spec, built on the first call and kept with the spec """
+    router = getattr(spec, '_gateway_operation_router', None)
+    if router is None:
+        router = spec._gateway_operation_router = OperationRouter(spec)
+    return router
+
+
+routing_table = RoutingTable(ttl=settings.GATEWAY_ROUTING_TABLE_TTL,
+                             missing_ttl=settings.GATEWAY_ROUTING_TABLE_MISSING_TTL)
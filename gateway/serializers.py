@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from . import API_GATEWAY_RESERVED_NAMES
 from . import models as gtm
 
 
@@ -10,3 +11,11 @@ class LogicModuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = gtm.LogicModule
         fields = '__all__'
+
+    def validate_endpoint_name(self, value):
+        """ Gateway URLs starting with a reserved name aren't routed to the logic modules """
+        if value:
+            reserved_name = next((name for name in API_GATEWAY_RESERVED_NAMES if value.startswith(name)), None)
+            if reserved_name is not None:
+                raise serializers.ValidationError(f'Endpoint names starting with "{reserved_name}" are reserved.')
+        return value
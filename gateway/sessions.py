@@ -0,0 +1,104 @@
+import asyncio
+import atexit
+import threading
+import weakref
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class HTTPSessionPool:
+    """
+    Keeps HTTP sessions to the logic modules alive for the life of the worker process, so TCP and TLS
+    connections are reused between requests instead of being opened for every call.
+    Every logic module (host) gets its own connection pool limited to `maxsize` connections.
+    """
+
+    def __init__(self, maxsize: int, connect_timeout: float, read_timeout: float,
+                 keepalive_timeout: float, dns_cache_ttl: int):
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._sessions = {}
+        # aiohttp sessions are bound to the event loop they were created in
+        self._async_sessions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f'{parts.scheme}://{parts.netloc}'
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """ Connect and read timeouts in the format of requests lib """
+        return self.connect_timeout, self.read_timeout
+
+    @property
+    def async_timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+
+    def get_session(self, url: str) -> requests.Session:
+        """ Get a keep-alive session for the host of the URL """
+        origin = self.get_origin(url)
+        with self._lock:
+            if origin not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[origin] = session
+            return self._sessions[origin]
+
+    def get_async_session(self, url: str) -> aiohttp.ClientSession:
+        """ Get a keep-alive aiohttp session for the host of the URL in the running event loop """
+        origin = self.get_origin(url)
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            sessions: Dict[str, aiohttp.ClientSession] = self._async_sessions.setdefault(loop, {})
+            session = sessions.get(origin)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(limit_per_host=self.maxsize,
+                                                 keepalive_timeout=self.keepalive_timeout,
+                                                 use_dns_cache=True,
+                                                 ttl_dns_cache=self.dns_cache_ttl)
+                session = aiohttp.ClientSession(connector=connector, timeout=self.async_timeout)
+                sessions[origin] = session
+            return session
+
+    async def close_async_sessions(self) -> None:
+        """ Close aiohttp sessions of the running event loop, has to be called before the loop is closed """
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            sessions = self._async_sessions.pop(loop, {})
+        for session in sessions.values():
+            await session.close()
+
+    def close(self) -> None:
+        """ Close all sessions, aiohttp sessions are closed in their event loops if these aren't running """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+            async_sessions = list(self._async_sessions.items())
+            self._async_sessions.clear()
+        for session in sessions.values():
+            session.close()
+        for loop, loop_sessions in async_sessions:
+            if loop.is_closed() or loop.is_running():
+                continue
+            for session in loop_sessions.values():
+                loop.run_until_complete(session.close())
+
+
+session_pool = HTTPSessionPool(maxsize=settings.GATEWAY_HTTP_POOL_MAXSIZE,
+                               connect_timeout=settings.GATEWAY_HTTP_CONNECT_TIMEOUT,
+                               read_timeout=settings.GATEWAY_HTTP_READ_TIMEOUT,
+                               keepalive_timeout=settings.GATEWAY_HTTP_KEEPALIVE_TIMEOUT,
+                               dns_cache_ttl=settings.GATEWAY_HTTP_DNS_CACHE_TTL)
+
+atexit.register(session_pool.close)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import docs_cache, spec_cache
+from .models import LogicModule
+from .routing import routing_table
+
+
+@receiver([post_save, post_delete], sender=LogicModule)
+def invalidate_logic_module_caches(sender, instance: LogicModule, **kwargs):
+    """
+    Drop cached data of a logic module in this process when it's changed, p.e. through the API. Other processes
+    reload its spec once they see its new edit date.
+    """
+    spec_cache.invalidate(instance)
+    docs_cache.invalidate(instance.endpoint_name)
+
+
+@receiver(post_save, sender=LogicModule)
+def update_route(sender, instance: LogicModule, **kwargs):
+    """
+    Route requests to the changed logic module, p.e. created or updated by the `create_module` or `update_module` tasks
+    """
+    routing_table.update(instance)
+
+
+@receiver(post_delete, sender=LogicModule)
+def remove_route(sender, instance: LogicModule, **kwargs):
+    routing_table.remove(instance)
@@ -0,0 +1,81 @@
+import os
+
+import httpretty
+import pytest
+
+from gateway.aggregator import SwaggerAggregator, rewrite_refs
+from gateway.cache import docs_cache
+from .fixtures import datamesh
+
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def register_swagger_uris():
+    for service, host in (('location', 'locationservice'), ('documents', 'documentservice')):
+        with open(os.path.join(CURRENT_PATH, f'fixtures/swagger_{service}.json')) as swagger_file:
+            httpretty.register_uri(
+                httpretty.GET,
+                f'http://{host}:8080/docs/swagger.json',
+                body=swagger_file.read(),
+                adding_headers={'Content-Type': 'application/json'}
+            )
+
+
+def get_configuration():
+    return {'apis': {
+        'location': 'http://locationservice:8080/docs/swagger.json',
+        'documents': 'http://documentservice:8080/docs/swagger.json',
+    }}
+
+
+def test_rewrite_refs_changes_only_references():
+    spec = {
+        'paths': {'/a/': {'get': {'responses': {'200': {'schema': {'$ref': '#/definitions/A'}}},
+                                  'description': 'Returns #/definitions/A'}}},
+        'definitions': {'A': {'properties': {'b': {'type': 'array', 'items': {'$ref': '#/definitions/B'}}}}},
+    }
+    result = rewrite_refs(spec, 'service')
+
+    assert result['paths']['/a/']['get']['responses']['200']['schema']['$ref'] == '#/definitions/serviceA'
+    assert result['paths']['/a/']['get']['description'] == 'Returns #/definitions/A'
+    assert result['definitions']['A']['properties']['b']['items']['$ref'] == '#/definitions/serviceB'
+    assert spec['paths']['/a/']['get']['responses']['200']['schema']['$ref'] == '#/definitions/A'
+
+
+@httpretty.activate
+def test_aggregator_merges_services():
+    register_swagger_uris()
+    swagger = SwaggerAggregator(get_configuration()).generate_swagger()
+
+    assert '/location/siteprofiles/{uuid}/' in swagger['paths']
+    assert '/documents/documents/' in swagger['paths']
+    assert {'locationSiteProfile', 'locationProfileType'} <= set(swagger['definitions'])
+
+
+@httpretty.activate
+def test_aggregator_skips_unavailable_service():
+    register_swagger_uris()
+    configuration = get_configuration()
+    configuration['apis']['products'] = 'http://productservice:8080/docs/swagger.json'
+    httpretty.register_uri(httpretty.GET, configuration['apis']['products'], status=502, body='Bad Gateway')
+
+    swagger_apis = SwaggerAggregator(configuration).get_aggregate_swagger()
+    assert set(swagger_apis) == {'location', 'documents'}
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_docs_cache_refetches_only_changed_service(datamesh):
+    register_swagger_uris()
+    location, documents, _ = datamesh
+
+    swagger1 = docs_cache.get(get_configuration())
+    assert docs_cache.get(get_configuration()) is swagger1
+    assert len(httpretty.latest_requests()) == 2
+
+    documents.save()
+    swagger2 = docs_cache.get(get_configuration())
+    assert swagger2 == swagger1
+    assert len(httpretty.latest_requests()) == 3
+    assert httpretty.last_request().headers['Host'] == 'documentservice:8080'
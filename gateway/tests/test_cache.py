@@ -0,0 +1,151 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpretty
+import pytest
+from bravado_core.spec import Spec
+
+from gateway.cache import CachedResponse, ResponseCache, TTLCache, spec_cache
+from gateway.request import BaseGatewayRequest
+from gateway.tasks import update_module
+from .fixtures import logic_module
+
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def register_swagger_uri(logic_module):
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+
+
+def make_request(organization_uuid=None, authorization=b'JWT token'):
+    return SimpleNamespace(session={'jwt_organization_uuid': organization_uuid},
+                           user=SimpleNamespace(organization_id=None),
+                           META={'HTTP_AUTHORIZATION': authorization})
+
+
+def test_ttl_cache_counts_hits_and_misses():
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+
+
+@patch('gateway.cache.time.monotonic')
+def test_ttl_cache_expires_entries(monotonic_mock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    monotonic_mock.return_value = 100
+    cache.set('a', 1)
+    monotonic_mock.return_value = 161
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_spec_cache_fetches_spec_once(logic_module):
+    register_swagger_uri(logic_module)
+
+    spec1 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+    spec2 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+
+    assert isinstance(spec1, Spec)
+    assert spec1 is spec2
+    assert len(httpretty.latest_requests()) == 1
+    assert spec_cache.stats()['hits'] == 1
+    assert spec_cache.stats()['misses'] == 1
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_spec_cache_invalidated_on_logic_module_save(logic_module):
+    register_swagger_uri(logic_module)
+
+    spec1 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+    logic_module.save()
+    spec2 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+
+    assert spec1 is not spec2
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_spec_cache_reloads_spec_updated_by_update_module_task(logic_module):
+    register_swagger_uri(logic_module)
+
+    spec1 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+    # the task runs in a worker, its signals don't reach the cache of this process
+    with patch.object(spec_cache, 'invalidate'):
+        update_module({
+            'module_uuid': logic_module.module_uuid,
+            'name': logic_module.name,
+            'endpoint': logic_module.endpoint,
+            'endpoint_name': logic_module.endpoint_name,
+        })
+    assert spec_cache.stats()['size'] == 1
+
+    logic_module.refresh_from_db()
+    spec2 = spec_cache.get(logic_module, BaseGatewayRequest.SWAGGER_CONFIG)
+
+    assert spec1 is not spec2
+    assert len(httpretty.latest_requests()) == 2
+
+
+def test_response_cache_is_scoped_by_organization():
+    cache = ResponseCache()
+    key1 = cache.make_key(make_request('org-1'), 'products', 'product', 1)
+    key2 = cache.make_key(make_request('org-2'), 'products', 'product', 1)
+    key3 = cache.make_key(make_request(authorization=b'JWT other'), 'products', 'product', 1)
+
+    assert key1 == cache.make_key(make_request('org-1', b'JWT other'), 'products', 'product', 1)
+    assert len({key1, key2, key3}) == 3
+
+
+def test_response_cache_invalidates_record_and_lists():
+    cache = ResponseCache()
+    request = make_request('org-1')
+    detail_key = cache.make_key(request, 'products', 'Product', 1)
+    other_key = cache.make_key(request, 'products', 'product', 2)
+    list_key = cache.make_key(request, 'products', 'product', query_params={'id__in': '1,2'})
+    for key in (detail_key, other_key, list_key):
+        cache.set(key, CachedResponse({}, 200, {}, None, 60))
+
+    cache.invalidate('products', 'product', 1)
+
+    assert cache.get(cache.make_key(request, 'products', 'product', 1)) is None
+    assert cache.get(cache.make_key(request, 'products', 'product', query_params={'id__in': '1,2'})) is None
+    assert cache.get(cache.make_key(request, 'products', 'product', 2)).data == ({}, 200, {})
+
+
+@patch('gateway.cache.time.time')
+def test_response_cache_keeps_stale_responses_with_etag(time_mock):
+    cache = ResponseCache(revalidate_timeout=600)
+    time_mock.return_value = 100
+    cache.set('with-etag', CachedResponse({}, 200, {}, '"v1"', 60))
+
+    time_mock.return_value = 200
+    stale_response = cache.get('with-etag')
+    assert not stale_response.is_fresh
+    stale_response.refresh(60)
+    assert stale_response.is_fresh
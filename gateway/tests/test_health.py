@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+
+import aiohttp
+import httpretty
+import pytest
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+import factories
+from datamesh.scheduler import FanOutScheduler
+from gateway.clients import AsyncSwaggerClient
+from gateway.health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, circuit_breakers
+from gateway.sessions import session_pool
+from workflow.tests.fixtures import auth_api_client
+from .fixtures import logic_module
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = dict(window=4, min_calls=2, error_rate=0.5, slow_call_duration=1, slow_call_rate=0.5,
+                   open_duration=60)
+    options.update(kwargs)
+    return CircuitBreaker('documents', **options)
+
+
+def test_circuit_opens_on_error_rate():
+    breaker = make_breaker()
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert 0 < breaker.stats()['retry_in'] <= 60
+
+
+def test_circuit_opens_on_slow_calls():
+    breaker = make_breaker(min_calls=3)
+    breaker.record(True, 0.1)
+    breaker.record(True, 5)
+    assert breaker.state == CLOSED
+
+    breaker.record(True, 5)
+    assert breaker.state == OPEN
+
+
+def test_circuit_stays_closed_below_rates():
+    breaker = make_breaker(window=4, min_calls=4)
+    for success in [True, True, False, True, True]:
+        breaker.record(success, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+    assert breaker.stats()['failure_rate'] == 0.25
+
+
+@pytest.mark.parametrize('success, duration, state', [(True, 0.1, CLOSED), (False, 0.1, OPEN), (True, 5, OPEN)])
+def test_half_open_probe(success, duration, state):
+    breaker = make_breaker(open_duration=0)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    breaker.open_duration = 60
+    # only one probe request is let through
+    assert not breaker.allow_request()
+
+    breaker.record(success, duration)
+    assert breaker.state == state
+    assert breaker.allow_request() is (state == CLOSED)
+
+
+def test_short_cancelled_requests_are_no_failures():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_cancelled(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['calls'] == 0
+    assert breaker.stats()['cancelled'] == 3
+
+
+def test_slow_cancelled_requests_are_slow_calls():
+    breaker = make_breaker()
+    breaker.record_cancelled(5)
+    breaker.record_cancelled(5)
+    assert breaker.state == OPEN
+    assert breaker.stats()['cancelled'] == 0
+
+
+def test_hung_service_opens_circuit_by_datamesh_deadline(request_factory, settings, monkeypatch):
+    settings.GATEWAY_CIRCUIT_MIN_CALLS = 3
+    settings.GATEWAY_CIRCUIT_SLOW_CALL_DURATION = 0.05
+
+    async def hang(reader, writer):
+        await asyncio.sleep(60)
+
+    async def run():
+        server = await asyncio.start_server(hang, '127.0.0.1', 0)
+        url = 'http://127.0.0.1:{}/documents/1/'.format(server.sockets[0].getsockname()[1])
+        async with aiohttp.ClientSession() as session:
+            monkeypatch.setattr(session_pool, 'get_async_session', lambda _: session)
+            client = AsyncSwaggerClient(None, Request(request_factory.get('/')))
+            monkeypatch.setattr(client, 'prepare_data', lambda spec, **kwargs: ('get', url))
+            for _ in range(settings.GATEWAY_CIRCUIT_MIN_CALLS):
+                # the service outlives the deadline, its request is cancelled
+                scheduler = FanOutScheduler(global_limit=10, service_limit=10, timeout=0.1)
+                request = client.request(service='documents', model='documents', pk=1)
+                assert await scheduler.run([(request, ['documents'])]) == ['documents']
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+    assert circuit_breakers.get('documents').state == OPEN
+
+
+def test_cancelled_probe_is_replaced():
+    breaker = make_breaker(open_duration=0)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.allow_request()
+    breaker.open_duration = 60
+
+    breaker.record_cancelled(0.1)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_open_circuit_fails_fast(auth_api_client, logic_module, settings):
+    settings.GATEWAY_CIRCUIT_MIN_CALLS = 2
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/docs/swagger.json', body=r.read(),
+                               adding_headers={'Content-Type': 'application/json'})
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/thumbnail/1/', status=502,
+                           body='{"detail": "Bad Gateway"}', adding_headers={'Content-Type': 'application/json'})
+    url = f'/{logic_module.endpoint_name}/thumbnail/1/'
+
+    assert [auth_api_client.get(url).status_code for _ in range(2)] == [502, 502]
+    requests_count = len(httpretty.latest_requests())
+
+    response = auth_api_client.get(url)
+    assert response.status_code == 503
+    assert json.loads(response.content)['detail'] == f'Service "{logic_module.endpoint_name}" is unavailable, ' \
+                                                     f'try again later.'
+    assert len(httpretty.latest_requests()) == requests_count
+    assert circuit_breakers.get(logic_module.endpoint_name).state == OPEN
+
+
+@pytest.mark.django_db()
+def test_health_endpoint(auth_api_client, logic_module):
+    for _ in range(10):
+        circuit_breakers.get('location').record(False, 0.1)
+    assert auth_api_client.get('/health_check/services/').status_code == 403
+
+    client = APIClient()
+    client.force_authenticate(user=factories.CoreUser(is_superuser=True))
+    response = client.get('/health_check/services/')
+    assert response.status_code == 200
+    services = {service['service']: service for service in response.json()}
+    assert services[logic_module.endpoint_name]['state'] == CLOSED
+    assert services['location']['state'] == OPEN
+    assert services['location']['failure_rate'] == 1.0
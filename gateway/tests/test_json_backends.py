@@ -0,0 +1,56 @@
+import datetime
+import json
+import uuid
+
+import pytest
+
+import factories
+from gateway.json_backends import OrjsonJSONBackend, StdlibJSONBackend, get_json_backend, orjson
+
+
+@pytest.fixture
+def payload():
+    return {
+        'id': 1,
+        'uuid': uuid.UUID('d0a1ba0c-6c61-4d8a-a8d5-3fd43d5a8d3e'),
+        'create_date': datetime.datetime(2019, 7, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        'names': ['a', 'b'],
+    }
+
+
+@pytest.fixture
+def expected(payload):
+    return {**payload, 'uuid': str(payload['uuid']), 'create_date': '2019-07-01T12:30:00+00:00'}
+
+
+def test_get_json_backend(settings):
+    settings.GATEWAY_JSON_BACKEND = 'gateway.json_backends.StdlibJSONBackend'
+    assert isinstance(get_json_backend(), StdlibJSONBackend)
+    assert get_json_backend() is get_json_backend()
+
+
+@pytest.mark.parametrize('backend_class', [
+    StdlibJSONBackend,
+    pytest.param(OrjsonJSONBackend, marks=pytest.mark.skipif(orjson is None, reason='orjson is not installed')),
+])
+def test_json_backend(backend_class, payload, expected):
+    backend = backend_class()
+    data = backend.dumps(payload)
+    assert json.loads(data) == expected
+    assert backend.loads(data) == expected
+    with pytest.raises(ValueError):
+        backend.loads(b'IT IS A TEST')
+    with pytest.raises(TypeError):
+        backend.dumps({'value': object()})
+
+
+@pytest.mark.parametrize('backend_class', [
+    StdlibJSONBackend,
+    pytest.param(OrjsonJSONBackend, marks=pytest.mark.skipif(orjson is None, reason='orjson is not installed')),
+])
+@pytest.mark.django_db()
+def test_json_backend_model(backend_class):
+    organization = factories.Organization()
+    assert json.loads(backend_class().dumps({'organization': organization})) == {
+        'organization': str(organization.pk)
+    }
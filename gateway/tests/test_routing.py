@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+from bravado_core.spec import Spec
+from django.core.cache import caches
+
+from gateway.exceptions import EndpointNotFound, ServiceDoesNotExist
+from gateway.request import BaseGatewayRequest
+from gateway.models import LogicModule
+from gateway.routing import VERSION_KEY, get_operation_router, routing_table
+from gateway.tasks import create_module, update_module
+from .fixtures import logic_module
+
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def documents_spec():
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as spec_file:
+        return Spec.from_dict(json.load(spec_file), config=BaseGatewayRequest.SWAGGER_CONFIG)
+
+
+@pytest.mark.django_db()
+def test_routing_table_does_not_query_loaded_routes(logic_module, django_assert_num_queries):
+    routing_table.load()
+
+    with django_assert_num_queries(0):
+        route = routing_table.get('documents')
+
+    assert route.logic_module == logic_module
+    assert route.base_url == 'http://documentservice:8080'
+    assert route.swagger_url == 'http://documentservice:8080/docs/swagger.json'
+
+
+@pytest.mark.django_db()
+def test_routing_table_updated_on_logic_module_changes(logic_module):
+    routing_table.load()
+
+    logic_module.endpoint_name = 'files'
+    logic_module.save()
+    assert routing_table.get('files').logic_module == logic_module
+    with pytest.raises(ServiceDoesNotExist):
+        routing_table.get('documents')
+
+    logic_module.delete()
+    with pytest.raises(ServiceDoesNotExist):
+        routing_table.get('files')
+
+
+@pytest.mark.django_db()
+def test_routing_table_updated_by_tasks(logic_module, django_assert_num_queries):
+    routing_table.load()
+    create_module({'name': 'products', 'endpoint_name': 'products', 'endpoint': 'http://productservice:8080'})
+    update_module({
+        'module_uuid': logic_module.module_uuid,
+        'name': logic_module.name,
+        'endpoint': 'http://documentservice:8081/',
+        'endpoint_name': logic_module.endpoint_name,
+    })
+
+    with django_assert_num_queries(0):
+        assert routing_table.get('products').base_url == 'http://productservice:8080'
+        assert routing_table.get('documents').base_url == 'http://documentservice:8081'
+
+
+@pytest.mark.django_db()
+def test_routing_table_remembers_unknown_endpoint_names(logic_module, django_assert_num_queries):
+    routing_table.load()
+    with django_assert_num_queries(1):
+        with pytest.raises(ServiceDoesNotExist):
+            routing_table.get('products')
+    with django_assert_num_queries(0):
+        with pytest.raises(ServiceDoesNotExist):
+            routing_table.get('products')
+
+    create_module({'name': 'products', 'endpoint_name': 'products', 'endpoint': 'http://productservice:8080'})
+    assert routing_table.get('products').base_url == 'http://productservice:8080'
+
+
+@pytest.mark.django_db()
+def test_routing_table_reloaded_on_changes_of_other_processes(logic_module, settings):
+    routing_table.load()
+    # another process changes the logic module, its signals only change the version in the shared cache
+    LogicModule.objects.filter(pk=logic_module.pk).update(endpoint_name='files')
+    caches[settings.GATEWAY_ROUTING_TABLE_CACHE].set(VERSION_KEY, 'changed', None)
+
+    with pytest.raises(ServiceDoesNotExist):
+        routing_table.get('documents')
+    assert routing_table.get('files').logic_module == logic_module
+
+
+def test_operation_router_matches_spec(documents_spec):
+    router = get_operation_router(documents_spec)
+    assert get_operation_router(documents_spec) is router
+
+    assert router.route('GET', 'Documents') == ('get', 'http://documentservice:8080/documents/')
+    assert router.route('PUT', 'documents', '12') == ('put', 'http://documentservice:8080/documents/12/')
+    requests = (
+        ('GET', 'file', '3', '/file/{id}/'),
+        ('DELETE', 'documents', '5', '/documents/{id}/'),
+        ('POST', 'documents', None, '/documents/'),
+    )
+    for method, model, pk, path in requests:
+        operation = documents_spec.get_op_for_request(method, path)
+        url = documents_spec.api_url.rstrip('/') + path.replace('{id}', pk or '')
+        assert router.route(method, model, pk) == (operation.http_method, url)
+
+
+def test_operation_router_endpoint_not_found(documents_spec):
+    router = get_operation_router(documents_spec)
+    with pytest.raises(EndpointNotFound, match='GET /nowhere/'):
+        router.route('GET', 'nowhere')
+    with pytest.raises(EndpointNotFound, match='Endpoint not found: GET /documents/{uuid}/'):
+        router.route('GET', 'documents', '8aeb8d06-0e43-4e54-9d1d-5b1f8b1b0a6f')
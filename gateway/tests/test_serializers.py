@@ -0,0 +1,19 @@
+import pytest
+
+from gateway.serializers import LogicModuleSerializer
+
+
+@pytest.mark.django_db()
+@pytest.mark.parametrize('endpoint_name, is_valid', [
+    ('documents', True),
+    ('metrics', True),
+    ('metricsservice', True),
+    ('health_check', False),
+    ('datamesh', False),
+])
+def test_logic_module_reserved_endpoint_name(endpoint_name, is_valid):
+    serializer = LogicModuleSerializer(data={'name': 'Service', 'endpoint': 'http://service:8080',
+                                             'endpoint_name': endpoint_name})
+    assert serializer.is_valid() is is_valid
+    if not is_valid:
+        assert 'endpoint_name' in serializer.errors
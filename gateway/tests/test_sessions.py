@@ -0,0 +1,42 @@
+import asyncio
+
+import aiohttp
+import requests
+
+from gateway.sessions import HTTPSessionPool
+
+
+def create_pool():
+    return HTTPSessionPool(maxsize=5, connect_timeout=1, read_timeout=2, keepalive_timeout=3, dns_cache_ttl=4)
+
+
+def test_session_reused_per_host():
+    pool = create_pool()
+    session1 = pool.get_session('http://documentservice:8080/documents/')
+    session2 = pool.get_session('http://documentservice:8080/docs/swagger.json')
+    session3 = pool.get_session('http://locationservice:8080/siteprofiles/')
+
+    assert isinstance(session1, requests.Session)
+    assert session1 is session2
+    assert session1 is not session3
+    assert session1.get_adapter('http://documentservice:8080/')._pool_maxsize == 5
+    assert pool.timeout == (1, 2)
+    pool.close()
+
+
+def test_async_session_reused_per_host_within_loop():
+    pool = create_pool()
+
+    async def get_sessions():
+        session1 = pool.get_async_session('http://documentservice:8080/documents/')
+        session2 = pool.get_async_session('http://documentservice:8080/documents/1/')
+        session3 = pool.get_async_session('http://locationservice:8080/siteprofiles/')
+        await pool.close_async_sessions()
+        return session1, session2, session3
+
+    session1, session2, session3 = asyncio.run(get_sessions())
+
+    assert isinstance(session1, aiohttp.ClientSession)
+    assert session1 is session2
+    assert session1 is not session3
+    assert session1.closed and session3.closed
@@ -0,0 +1,118 @@
+import os
+
+import httpretty
+import pytest
+from rest_framework.test import APIClient
+
+import factories
+from gateway import tracing
+from gateway.tracing import LogExporter, MetricsRegistry, RequestTrace
+from workflow.tests.fixtures import auth_api_client
+from .fixtures import logic_module
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_request_trace_server_timing():
+    trace = RequestTrace('abc')
+    with trace.stage('spec'):
+        pass
+    with trace.stage('upstream'):
+        pass
+    trace.stages['upstream'] = 0.0125
+    trace.duration = 0.02
+
+    assert trace.server_timing.startswith('spec;dur=')
+    assert trace.server_timing.endswith(', upstream;dur=12.5, total;dur=20.0')
+
+
+def test_stage_outside_of_trace():
+    with tracing.stage('spec'):
+        tracing.record_upstream('documents', 0.1, 200)
+    assert tracing.get_current_trace() is None
+
+
+def test_start_trace_exports(settings):
+    settings.GATEWAY_TRACE_EXPORTERS = ['gateway.tracing.MetricsExporter']
+    with tracing.start_trace('abc') as trace:
+        assert tracing.get_current_trace() is trace
+        with tracing.stage('spec'):
+            tracing.record_upstream('documents', 0.1, 200)
+        tracing.record_upstream('documents', 0.2, None)
+
+    assert tracing.get_current_trace() is None
+    assert trace.duration is not None
+    assert tracing.metrics.get('gateway_stage_duration_seconds', stage='spec').count == 1
+    assert tracing.metrics.get('gateway_upstream_duration_seconds', service='documents', status='2xx').count == 1
+    assert tracing.metrics.get('gateway_upstream_duration_seconds', service='documents', status='error').sum == 0.2
+
+
+def test_metrics_registry_render():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.observe('gateway_upstream_duration_seconds', {'service': 'documents', 'status': '2xx'}, 0.05)
+    registry.observe('gateway_upstream_duration_seconds', {'service': 'documents', 'status': '2xx'}, 0.5)
+    registry.observe('gateway_upstream_duration_seconds', {'service': 'documents', 'status': '2xx'}, 5)
+
+    labels = 'service="documents",status="2xx"'
+    assert registry.render().splitlines() == [
+        '# HELP gateway_upstream_duration_seconds Duration of requests to the services by their status class.',
+        '# TYPE gateway_upstream_duration_seconds histogram',
+        f'gateway_upstream_duration_seconds_bucket{{{labels},le="0.1"}} 1',
+        f'gateway_upstream_duration_seconds_bucket{{{labels},le="1.0"}} 2',
+        f'gateway_upstream_duration_seconds_bucket{{{labels},le="+Inf"}} 3',
+        f'gateway_upstream_duration_seconds_sum{{{labels}}} 5.55',
+        f'gateway_upstream_duration_seconds_count{{{labels}}} 3',
+    ]
+
+
+def test_log_exporter(caplog):
+    trace = RequestTrace('abc')
+    trace.add_upstream('documents', 0.01, 404)
+    trace.finish()
+
+    with caplog.at_level('INFO', logger='gateway.tracing'):
+        LogExporter().export(trace)
+    assert 'Gateway request abc: total;dur=' in caplog.text
+    assert 'upstream: documents:4xx=10.0ms' in caplog.text
+
+
+@pytest.mark.parametrize('incoming_id, is_reused', [('abc-123', True), ('invalid id', False), (None, False)])
+def test_get_trace_id(request_factory, incoming_id, is_reused):
+    headers = {'HTTP_X_REQUEST_ID': incoming_id} if incoming_id else {}
+    trace_id = tracing.get_trace_id(request_factory.get('/', **headers))
+    assert (trace_id == incoming_id) is is_reused
+    assert trace_id
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_gateway_request_is_traced(auth_api_client, logic_module):
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/docs/swagger.json', body=r.read(),
+                               adding_headers={'Content-Type': 'application/json'})
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/thumbnail/1/', body='{"id": 1}',
+                           adding_headers={'Content-Type': 'application/json'})
+
+    response = auth_api_client.get(f'/{logic_module.endpoint_name}/thumbnail/1/', HTTP_X_REQUEST_ID='abc-123')
+
+    assert response.status_code == 200
+    assert response.get('X-Request-ID') == 'abc-123'
+    assert httpretty.last_request().headers['X-Request-ID'] == 'abc-123'
+    assert [timing.split(';')[0] for timing in response.get('Server-Timing').split(', ')] == [
+        'spec', 'upstream', 'total']
+    histogram = tracing.metrics.get('gateway_upstream_duration_seconds',
+                                    service=logic_module.endpoint_name, status='2xx')
+    assert histogram.count == 1
+
+
+@pytest.mark.django_db()
+def test_metrics_endpoint(auth_api_client):
+    tracing.metrics.observe('gateway_stage_duration_seconds', {'stage': 'spec'}, 0.01)
+    assert auth_api_client.get('/metrics/').status_code == 403
+
+    client = APIClient()
+    client.force_authenticate(user=factories.CoreUser(is_superuser=True))
+    response = client.get('/metrics/')
+    assert response.status_code == 200
+    assert response.get('Content-Type').startswith('text/plain')
+    assert b'gateway_stage_duration_seconds_count{stage="spec"} 1' in response.content
@@ -65,3 +65,17 @@ class URLPatternsTest(TestCase):
     def test_docs_swagger_json(self):
         match = resolve('/docs/swagger.json')
         self.assertEqual(match.url_name, 'schema-swagger-json')
+
+    def test_gateway_metrics_url(self):
+        match = resolve('/metrics/')
+        self.assertEqual(match.url_name, 'gateway-metrics')
+
+    def test_gateway_url_of_service_named_like_metrics(self):
+        # the metrics endpoint has no model, so services named like it aren't shadowed
+        for path in ('/metrics/counters/', '/metricsservice/counters/1/'):
+            match = resolve(path)
+            self.assertEqual(match.url_name, 'api-gateway')
+
+    def test_gateway_health_url(self):
+        match = resolve('/health_check/services/')
+        self.assertEqual(match.url_name, 'gateway-health')
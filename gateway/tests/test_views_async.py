@@ -6,6 +6,7 @@ import pytest
 
 import factories
 from workflow.tests.fixtures import auth_api_client
+from gateway.request import get_worker_event_loop
 from .fixtures import logic_module, datamesh
 from .utils import AiohttpResponseMock, create_aiohttp_session_mock
 
@@ -17,7 +18,7 @@ CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
 @pytest.mark.parametrize("content,content_type", [(b'{"details": "IT IS A TEST"}', 'application/json'),
                                                   (b'IT IS A TEST', 'text/html; charset=utf-8')])
 @pytest.mark.django_db()
-@patch('gateway.request.aiohttp.ClientSession')
+@patch('aiohttp.ClientSession')
 def test_make_service_request_data_and_raw(client_session_mock, auth_api_client, logic_module, content, content_type,
                                            event_loop):
     url = f'/async/{logic_module.endpoint_name}/thumbnail/1/'
@@ -44,7 +45,7 @@ def test_make_service_request_data_and_raw(client_session_mock, auth_api_client,
 
 
 @pytest.mark.django_db()
-@patch('gateway.request.aiohttp.ClientSession')
+@patch('aiohttp.ClientSession')
 def test_make_service_request_to_unexisting_list_endpoint(client_session_mock, auth_api_client, logic_module,
                                                           event_loop):
 
@@ -70,7 +71,7 @@ def test_make_service_request_to_unexisting_list_endpoint(client_session_mock, a
 
 
 @pytest.mark.django_db()
-@patch('gateway.request.aiohttp.ClientSession')
+@patch('aiohttp.ClientSession')
 def test_make_service_request_to_unexisting_detail_endpoint(client_session_mock, auth_api_client, logic_module,
                                                             event_loop):
 
@@ -96,7 +97,7 @@ def test_make_service_request_to_unexisting_detail_endpoint(client_session_mock,
 
 
 @pytest.mark.django_db()
-@patch('gateway.request.aiohttp.ClientSession')
+@patch('aiohttp.ClientSession')
 def test_make_service_request_with_datamesh_detailed(client_session_mock, auth_api_client, datamesh, event_loop):
     lm1, lm2, relationship = datamesh
     factories.JoinRecord(relationship=relationship,
@@ -140,7 +141,7 @@ def test_make_service_request_with_datamesh_detailed(client_session_mock, auth_a
 
 
 @pytest.mark.django_db()
-@patch('gateway.request.aiohttp.ClientSession')
+@patch('aiohttp.ClientSession')
 def test_make_service_request_with_datamesh_list(client_session_mock, auth_api_client, datamesh, event_loop):
     lm1, lm2, relationship = datamesh
     factories.JoinRecord(relationship=relationship,
@@ -188,3 +189,13 @@ def test_make_service_request_with_datamesh_list(client_session_mock, auth_api_c
     item2 = data["results"][1]
     assert relationship.key in item2
     assert len(item2[relationship.key]) == 0
+
+
+def test_worker_event_loop_is_reused():
+    loop = get_worker_event_loop()
+
+    assert get_worker_event_loop() is loop
+    assert not loop.is_closed()
+
+    loop.close()
+    assert get_worker_event_loop() is not loop
@@ -1,10 +1,14 @@
+import gzip
 import os
 import json
 
 import pytest
 import httpretty
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 import factories
+from datamesh.services import DataMesh, PARTIAL_RELATIONSHIPS_KEY
+from gateway.exceptions import GatewayError
 from workflow.tests.fixtures import auth_api_client
 from .fixtures import logic_module, datamesh
 
@@ -270,3 +274,203 @@ def test_make_service_request_with_datamesh_list(auth_api_client, datamesh):
     item2 = data["results"][1]
     assert relationship.key in item2
     assert len(item2[relationship.key]) == 0
+
+
+def register_thumbnail_uris(logic_module, **thumbnail_kwargs):
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/thumbnail/1/', **thumbnail_kwargs)
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_passes_etag_through(auth_api_client, logic_module):
+    register_thumbnail_uris(logic_module, status=304, body='', adding_headers={'ETag': '"v1"'})
+
+    response = auth_api_client.get(f'/{logic_module.endpoint_name}/thumbnail/1/', HTTP_IF_NONE_MATCH='"v1"')
+
+    assert response.status_code == 304
+    assert response.get('ETag') == '"v1"'
+    assert httpretty.last_request().headers['If-None-Match'] == '"v1"'
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_answers_not_modified_with_generated_etag(auth_api_client, logic_module):
+    register_thumbnail_uris(logic_module, body='{"id": 1}', adding_headers={'Content-Type': 'application/json'})
+    url = f'/{logic_module.endpoint_name}/thumbnail/1/'
+
+    response = auth_api_client.get(url)
+    assert response.status_code == 200
+    assert response.has_header('ETag')
+
+    response = auth_api_client.get(url, HTTP_IF_NONE_MATCH=response.get('ETag'))
+    assert response.status_code == 304
+    assert response.content == b''
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_streams_big_response(auth_api_client, logic_module, settings):
+    settings.GATEWAY_STREAMING_MIN_SIZE = 10
+    settings.GATEWAY_STREAMING_CHUNK_SIZE = 4
+    content = b'%PDF' + b'0' * 20
+    register_thumbnail_uris(logic_module, body=content, adding_headers={
+        'Content-Type': 'application/pdf',
+        'Content-Disposition': 'attachment; filename="thumbnail.pdf"',
+    })
+
+    response = auth_api_client.get(f'/{logic_module.endpoint_name}/thumbnail/1/')
+
+    assert response.status_code == 200
+    assert response.streaming
+    assert b''.join(response.streaming_content) == content
+    assert response.get('Content-Length') == str(len(content))
+    assert response.get('Content-Disposition') == 'attachment; filename="thumbnail.pdf"'
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_streams_gzip_encoded_response(auth_api_client, logic_module, settings):
+    settings.GATEWAY_STREAMING_MIN_SIZE = 10
+    settings.GATEWAY_STREAMING_CHUNK_SIZE = 4
+    content = b'%PDF' + b'0' * 200
+    encoded_content = gzip.compress(content)
+    register_thumbnail_uris(logic_module, body=encoded_content, adding_headers={
+        'Content-Type': 'application/pdf',
+        'Content-Encoding': 'gzip',
+        'Content-Length': str(len(encoded_content)),
+    })
+
+    response = auth_api_client.get(f'/{logic_module.endpoint_name}/thumbnail/1/')
+
+    assert response.status_code == 200
+    assert response.streaming
+    # the body is decoded while it's streamed, so neither the encoding nor the encoded length is forwarded
+    assert b''.join(response.streaming_content) == content
+    assert not response.has_header('Content-Length')
+    assert not response.has_header('Content-Encoding')
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_streams_upload(auth_api_client, logic_module):
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    httpretty.register_uri(
+        httpretty.POST,
+        f'{logic_module.endpoint}/documents/',
+        status=201,
+        body='{"id": 1}',
+        adding_headers={'Content-Type': 'application/json'}
+    )
+
+    response = auth_api_client.post(f'/{logic_module.endpoint_name}/documents/',
+                                    {'file': SimpleUploadedFile('report.txt', b'IT IS A TEST')},
+                                    format='multipart')
+
+    assert response.status_code == 201
+    service_request = httpretty.last_request()
+    assert service_request.headers['Content-Type'].startswith('multipart/form-data; boundary=')
+    assert b'IT IS A TEST' in service_request.body
+
+
+@pytest.mark.django_db()
+def test_make_service_request_rejects_too_large_upload(auth_api_client, logic_module, settings):
+    settings.GATEWAY_MAX_UPLOAD_SIZE = 10
+
+    response = auth_api_client.post(f'/{logic_module.endpoint_name}/documents/',
+                                    {'file': SimpleUploadedFile('report.txt', b'IT IS A TEST')},
+                                    format='multipart')
+
+    assert response.status_code == 413
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_with_datamesh_list_streamed(auth_api_client, datamesh, settings):
+    settings.DATAMESH_JOIN_SPLICING = True
+    settings.GATEWAY_STREAMING_MIN_SIZE = 10
+    settings.DATAMESH_JOIN_CHUNK_SIZE = 1
+    lm1, lm2, relationship = datamesh
+    factories.JoinRecord(relationship=relationship,
+                         record_id=None, record_uuid='19a7f600-74a0-4123-9be5-dfa69aa172cc',
+                         related_record_id=1, related_record_uuid=None)
+
+    # mock requests
+    for url, fixture in ((f'{lm1.endpoint}/docs/swagger.json', 'swagger_location.json'),
+                         (f'{lm2.endpoint}/docs/swagger.json', 'swagger_documents.json'),
+                         (f'{lm1.endpoint}/siteprofiles/', 'data_list_siteprofile.json'),
+                         (f'{lm2.endpoint}/documents/1/', 'data_detail_document.json')):
+        with open(os.path.join(CURRENT_PATH, 'fixtures', fixture)) as r:
+            httpretty.register_uri(httpretty.GET, url, body=r.read(),
+                                   adding_headers={'Content-Type': 'application/json'})
+    with open(os.path.join(CURRENT_PATH, 'fixtures/data_list_siteprofile.json')) as r:
+        expected_data = json.load(r)
+
+    # make api request
+    response = auth_api_client.get(f'/{lm1.endpoint_name}/siteprofiles/', {'join': 'true'})
+
+    assert response.status_code == 200
+    assert response.streaming
+    assert response.get('Content-Type') == 'application/json'
+    assert not response.has_header('Content-Length')
+    data = json.loads(b''.join(response.streaming_content))
+
+    # the items are spliced into the body as they are, the first one has a joined record
+    assert data['count'] == expected_data['count']
+    assert [item['uuid'] for item in data['results']] == [item['uuid'] for item in expected_data['results']]
+    assert [len(item[relationship.key]) for item in data['results']] == [1] + [0] * (len(data['results']) - 1)
+    assert data['results'][0][relationship.key][0]['id'] == 1
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_with_datamesh_list_streamed_partial(auth_api_client, datamesh, settings, monkeypatch):
+    settings.DATAMESH_JOIN_SPLICING = True
+    settings.GATEWAY_STREAMING_MIN_SIZE = 10
+    settings.DATAMESH_JOIN_CHUNK_SIZE = 1
+    lm1, lm2, relationship = datamesh
+    factories.JoinRecord(relationship=relationship,
+                         record_id=None, record_uuid='19a7f600-74a0-4123-9be5-dfa69aa172cc',
+                         related_record_id=1, related_record_uuid=None)
+
+    def fail(*args, **kwargs):
+        raise GatewayError('Connection refused')
+
+    monkeypatch.setattr(DataMesh, '_extend_with_batch', fail)
+
+    # mock requests
+    for url, fixture in ((f'{lm1.endpoint}/docs/swagger.json', 'swagger_location.json'),
+                         (f'{lm2.endpoint}/docs/swagger.json', 'swagger_documents.json'),
+                         (f'{lm1.endpoint}/siteprofiles/', 'data_list_siteprofile.json')):
+        with open(os.path.join(CURRENT_PATH, 'fixtures', fixture)) as r:
+            httpretty.register_uri(httpretty.GET, url, body=r.read(),
+                                   adding_headers={'Content-Type': 'application/json'})
+    with open(os.path.join(CURRENT_PATH, 'fixtures/data_list_siteprofile.json')) as r:
+        expected_data = json.load(r)
+
+    # make api request
+    response = auth_api_client.get(f'/{lm1.endpoint_name}/siteprofiles/', {'join': 'true'})
+
+    assert response.status_code == 200
+    assert response.streaming
+    data = json.loads(b''.join(response.streaming_content))
+
+    # the related record of the failed chunk is missing and listed as partial, the body is still complete
+    assert [item['uuid'] for item in data['results']] == [item['uuid'] for item in expected_data['results']]
+    assert all(item[relationship.key] == [] for item in data['results'])
+    assert data['results'][0][PARTIAL_RELATIONSHIPS_KEY] == [relationship.key]
+    assert all(PARTIAL_RELATIONSHIPS_KEY not in item for item in data['results'][1:])
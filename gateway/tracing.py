@@ -0,0 +1,235 @@
+import bisect
+import contextvars
+import functools
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.http.request import HttpRequest
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS = {
+    'gateway_request_duration_seconds': 'Duration of gateway requests until the response is created.',
+    'gateway_stage_duration_seconds': 'Duration of the stages of gateway requests.',
+    'gateway_upstream_duration_seconds': 'Duration of requests to the services by their status class.',
+}
+
+_TRACE_ID = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+_current_trace = contextvars.ContextVar('gateway_trace', default=None)
+
+
+class RequestTrace:
+    """
+    Timings of one gateway request: the summed duration of each stage (stages can be nested, p.e. `joinrecords`
+    in `fanout`) and the requests to the services. Parts of streamed responses which are produced after the
+    response is returned aren't included.
+    """
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.stages = {}
+        self.upstream = []
+        self._start = time.perf_counter()
+        self.duration = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+    def add_upstream(self, service: str, duration: float, status: Optional[int]) -> None:
+        self.upstream.append((service, duration, status))
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+
+    @property
+    def server_timing(self) -> str:
+        """ Value of the Server-Timing header with the durations in milliseconds """
+        timings = [f'{name};dur={duration * 1000:.1f}' for name, duration in self.stages.items()]
+        if self.duration is not None:
+            timings.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(timings)
+
+
+def get_current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """ Measure a stage of the current gateway request, nothing is measured outside of gateway requests """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+    else:
+        with trace.stage(name):
+            yield
+
+
+def record_upstream(service: str, duration: float, status: Optional[int]) -> None:
+    """ Record a request to a service, status is None if no response was received """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_upstream(service, duration, status)
+
+
+def get_trace_id(request: HttpRequest) -> str:
+    """ ID of the client's request (p.e. set by a load balancer) if it's valid, otherwise a new one """
+    header = 'HTTP_' + settings.GATEWAY_TRACE_HEADER.upper().replace('-', '_')
+    trace_id = request.META.get(header, '')
+    return trace_id if _TRACE_ID.match(trace_id) else uuid.uuid4().hex
+
+
+@contextmanager
+def start_trace(trace_id: str) -> Iterator[RequestTrace]:
+    """ Trace a gateway request, the trace is passed to the exporters when it's finished """
+    trace = RequestTrace(trace_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if trace.duration is None:
+            trace.finish()
+        export(trace)
+
+
+class Histogram:
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative_counts(self) -> Iterator[Tuple[str, int]]:
+        total = 0
+        for bucket, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield ('+Inf' if bucket == float('inf') else repr(bucket)), total
+
+
+class MetricsRegistry:
+    """
+    Latency histograms of the gateway requests, their stages and the services. They are kept in the process,
+    so each worker process exposes its own metrics.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric: str, labels: Dict[str, str], value: float) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get(self, metric: str, **labels: str) -> Optional[Histogram]:
+        return self._histograms.get((metric, tuple(sorted(labels.items()))))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms = {}
+
+    @staticmethod
+    def _format_labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+        items = list(labels) + list(extra.items())
+        if not items:
+            return ''
+        escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in items)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+    def render(self) -> str:
+        """ Metrics in the Prometheus text format """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        lines = []
+        for metric, help_text in METRICS.items():
+            metric_histograms = [(labels, histogram) for (name, labels), histogram in histograms if name == metric]
+            if not metric_histograms:
+                continue
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for labels, histogram in metric_histograms:
+                for le, count in histogram.cumulative_counts():
+                    lines.append(f'{metric}_bucket{self._format_labels(labels, le=le)} {count}')
+                lines.append(f'{metric}_sum{self._format_labels(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{self._format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+class TraceExporter:
+    """ Receives the trace of each finished gateway request """
+
+    def export(self, trace: RequestTrace) -> None:
+        raise NotImplementedError()
+
+
+def _get_status_class(status: Optional[int]) -> str:
+    return 'error' if status is None else f'{status // 100}xx'
+
+
+class MetricsExporter(TraceExporter):
+    """ Adds the timings to the histograms exposed by the metrics endpoint """
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+
+    def export(self, trace: RequestTrace) -> None:
+        self.registry.observe('gateway_request_duration_seconds', {}, trace.duration)
+        for name, duration in trace.stages.items():
+            self.registry.observe('gateway_stage_duration_seconds', {'stage': name}, duration)
+        for service, duration, status in trace.upstream:
+            self.registry.observe('gateway_upstream_duration_seconds',
+                                  {'service': service, 'status': _get_status_class(status)}, duration)
+
+
+class LogExporter(TraceExporter):
+    """ Logs one line with the timings per gateway request """
+
+    def export(self, trace: RequestTrace) -> None:
+        upstream = ' '.join(f'{service}:{_get_status_class(status)}={duration * 1000:.1f}ms'
+                            for service, duration, status in trace.upstream)
+        logger.info(f'Gateway request {trace.trace_id}: {trace.server_timing}; upstream: {upstream or "-"}')
+
+
+@functools.lru_cache(maxsize=None)
+def _load_exporters(paths: Tuple[str, ...]) -> List[TraceExporter]:
+    return [import_string(path)() for path in paths if path]
+
+
+def export(trace: RequestTrace) -> None:
+    """ Pass the trace to the exporters of GATEWAY_TRACE_EXPORTERS, their failures don't fail the request """
+    for exporter in _load_exporters(tuple(settings.GATEWAY_TRACE_EXPORTERS)):
+        try:
+            exporter.export(trace)
+        except Exception:
+            logger.exception(f'Trace export by {exporter.__class__.__name__} failed')
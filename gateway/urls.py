@@ -27,6 +27,7 @@ router = routers.SimpleRouter()
 router.register(r'logicmodule', views.LogicModuleViewSet)
 
 urlpatterns = [
+    path('metrics/', views.GatewayMetricsView.as_view(), name='gateway-metrics'),
     re_path(
         rf"^(?!{'|'.join(API_GATEWAY_RESERVED_NAMES)})"  # Reject any of these
         r"old/"
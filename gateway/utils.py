@@ -1,5 +1,6 @@
+import hashlib
 import re
-from typing import Dict
+from typing import Dict, Union
 from uuid import UUID
 
 import datetime
@@ -107,30 +108,42 @@ class ObjectAccessValidator:
         return validate_object_access(self._request, obj)
 
 
+def json_default(obj):
+    """
+    JSON doesn't have a default datetime and UUID type, so this is why
+    Python can't handle it automatically. So you need to make the
+    datetime and/or UUID into a string.
+    """
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, models.Model):  # for handling objects in M2M-fields
+        return obj.pk
+    # for handling pyswagger.primitives
+    if hasattr(obj, 'to_json'):
+        return obj.to_json()
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
 class GatewayJSONEncoder(json.JSONEncoder):
     """
     JSON encoder for API Gateway
     """
     def default(self, obj):
-        """
-        JSON doesn't have a default datetime and UUID type, so this is why
-        Python can't handle it automatically. So you need to make the
-        datetime and/or UUID into a string.
-        """
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat()
-        if isinstance(obj, UUID):
-            return str(obj)
-        if isinstance(obj, models.Model):  # for handling objects in M2M-fields
-            return obj.pk
-        # for handling pyswagger.primitives
-        if hasattr(obj, 'to_json'):
-            return obj.to_json()
-        return json.JSONEncoder.default(self, obj)
+        return json_default(obj)
+
+
+UUID4_HEX = re.compile('^[a-f0-9]{8}-?[a-f0-9]{4}-?4[a-f0-9]{3}-?[89ab][a-f0-9]{3}-?[a-f0-9]{12}\Z', re.I)  # noqa
 
 
 def valid_uuid4(uuid_string):
-    uuid4hex = re.compile('^[a-f0-9]{8}-?[a-f0-9]{4}-?4[a-f0-9]{3}-?[89ab][a-f0-9]{3}-?[a-f0-9]{12}\Z',  # noqa
-                          re.I)
-    match = uuid4hex.match(uuid_string)
+    match = UUID4_HEX.match(uuid_string)
     return bool(match)
+
+
+def get_etag(content: Union[str, bytes]) -> str:
+    """ Weak ETag of a response body, equal bodies are semantically equivalent responses """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return f'W/"{hashlib.sha1(content).hexdigest()}"'
@@ -1,4 +1,3 @@
-import json
 import logging
 import uuid
 from urllib.error import URLError
@@ -9,6 +8,7 @@ from django.forms.models import model_to_dict
 from django.http import HttpResponse
 from django.http.request import QueryDict
 from rest_framework import permissions, views, viewsets
+from rest_framework.response import Response
 from rest_framework.authentication import get_authorization_header
 from rest_framework.request import Request
 
@@ -26,6 +26,11 @@ from . import exceptions
 from . import models as gtm
 from . import serializers
 from . import utils
+from .cache import response_cache
+from .health import circuit_breakers
+from .json_backends import get_json_backend
+from .routing import routing_table
+from .tracing import metrics
 
 from workflow import models as wfm
 
@@ -62,6 +67,32 @@ class LogicModuleViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.LogicModuleSerializer
 
 
+class GatewayMetricsView(views.APIView):
+    """
+    Latency histograms of the gateway requests, their stages and the services in the Prometheus text format.
+    Each worker process exposes its own metrics.
+    """
+
+    permission_classes = (IsSuperUser,)
+    schema = None
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(content=metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class GatewayHealthView(views.APIView):
+    """
+    Health of the services by their circuit breakers: `closed` services are healthy, requests to `open` ones
+    fail fast and `half_open` ones are probed. Each worker process tracks the health on its own.
+    """
+
+    permission_classes = (IsSuperUser,)
+    schema = None
+
+    def get(self, request, *args, **kwargs):
+        return Response(circuit_breakers.stats(list(routing_table.all())))
+
+
 class APIGatewayView(views.APIView):
     """
     API gateway receives API requests, enforces throttling and security
@@ -71,11 +102,9 @@ class APIGatewayView(views.APIView):
 
     permission_classes = (permissions.IsAuthenticated,)
     schema = None
-    _logic_modules = None
     _data = None
 
     def __init__(self, *args, **kwargs):
-        self._logic_modules = dict()
         self._data = dict()
         self.client = Client()
         super().__init__(*args, **kwargs)
@@ -122,6 +151,8 @@ class APIGatewayView(views.APIView):
             request=request,
             **kwargs
         )
+        if request.method not in permissions.SAFE_METHODS and response.status < 400:
+            response_cache.invalidate(kwargs['service'], kwargs['model'], kwargs.get('pk'))
 
         # aggregate data if requested
         if request.query_params.get('aggregate', '_none').lower() == 'true':
@@ -146,7 +177,7 @@ class APIGatewayView(views.APIView):
                 logger.error(e.content)
 
         if response.data is not None:
-            content = json.dumps(response.data, cls=utils.GatewayJSONEncoder)
+            content = get_json_backend().dumps(response.data)
         else:
             content = response.raw
 
@@ -154,12 +185,7 @@ class APIGatewayView(views.APIView):
         return HttpResponse(content=content, status=response.status, content_type=content_type)
 
     def _get_logic_module(self, service_name: str) -> gtm.LogicModule:
-        if service_name not in self._logic_modules:
-            try:
-                self._logic_modules[service_name] = gtm.LogicModule.objects.get(endpoint_name=service_name)
-            except gtm.LogicModule.DoesNotExist:
-                raise exceptions.ServiceDoesNotExist(f'Service "{service_name}" not found.')
-        return self._logic_modules[service_name]
+        return routing_table.get_logic_module(service_name)
 
     def _join_response_data(self, request: Request, response: PySwaggerResponse, **kwargs) -> None:
         """
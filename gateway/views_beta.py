@@ -1,11 +1,14 @@
 import logging
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from rest_framework import permissions, views
 from rest_framework.request import Request
 
 from . import exceptions
-from . request import GatewayRequest, AsyncGatewayRequest
+from . import tracing
+from . request import GatewayRequest, AsyncGatewayRequest, GatewayResponse
 
 
 logger = logging.getLogger(__name__)
@@ -21,9 +24,9 @@ class APIGatewayView(views.APIView):
     permission_classes = (permissions.IsAuthenticated,)
     schema = None
     gateway_request_class = GatewayRequest
+    forwarded_headers = ('Content-Disposition',)
 
     def __init__(self, *args, **kwargs):
-        self._logic_modules = dict()
         self._specs = dict()
         self._data = dict()
         super().__init__(*args, **kwargs)
@@ -53,12 +56,41 @@ class APIGatewayView(views.APIView):
         except exceptions.RequestValidationError as e:
             return HttpResponse(content=e.content, status=e.status, content_type=e.content_type)
 
-        gw_request = self.gateway_request_class(request, **kwargs)
-        gw_response = gw_request.perform()
-
-        return HttpResponse(content=gw_response.content,
-                            status=gw_response.status_code,
-                            content_type=gw_response.headers.get('Content-Type'))
+        with tracing.start_trace(tracing.get_trace_id(request)) as trace:
+            gw_request = self.gateway_request_class(request, **kwargs)
+            gw_response = gw_request.perform()
+
+            response = self._create_response(gw_response)
+            trace.finish()
+            response['Server-Timing'] = trace.server_timing
+            response[settings.GATEWAY_TRACE_HEADER] = trace.trace_id
+        if gw_response.etag:
+            response['ETag'] = gw_response.etag
+            if request.method in ('GET', 'HEAD'):
+                # answer If-None-Match with 304 Not Modified if the client's version is still valid
+                conditional_response = get_conditional_response(request, etag=gw_response.etag, response=response)
+                if conditional_response is not response:
+                    response.close()
+                return conditional_response
+        return response
+
+    def _create_response(self, gw_response: GatewayResponse) -> HttpResponse:
+        """ Big responses of services are streamed to the client without buffering them in memory """
+        if gw_response.is_streamed:
+            response = StreamingHttpResponse(streaming_content=gw_response.content,
+                                             status=gw_response.status_code,
+                                             content_type=gw_response.headers.get('Content-Type'))
+            # encoded bodies are decoded while they are streamed, their length isn't known then
+            if gw_response.headers.get('Content-Length') and not gw_response.headers.get('Content-Encoding'):
+                response['Content-Length'] = gw_response.headers['Content-Length']
+        else:
+            response = HttpResponse(content=gw_response.content,
+                                    status=gw_response.status_code,
+                                    content_type=gw_response.headers.get('Content-Type'))
+        for header in self.forwarded_headers:
+            if gw_response.headers.get(header):
+                response[header] = gw_response.headers[header]
+        return response
 
     def _validate_incoming_request(self, request: Request, **kwargs: dict) -> None:
         """
@@ -66,11 +98,13 @@ class APIGatewayView(views.APIView):
         """
         if request.META['REQUEST_METHOD'] in ['PUT', 'PATCH', 'DELETE'] and kwargs['pk'] is None:
             raise exceptions.RequestValidationError('The object ID is missing.', 400)
+        if int(request.META.get('CONTENT_LENGTH') or 0) > settings.GATEWAY_MAX_UPLOAD_SIZE:
+            raise exceptions.RequestValidationError('The request body is too large.', 413)
 
 
 class APIAsyncGatewayView(APIGatewayView):
     """
-    Async version of APIGatewayView
+    Async version of APIGatewayView, requests of a worker thread are performed in its long-lived event loop
     """
 
     gateway_request_class = AsyncGatewayRequest
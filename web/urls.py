@@ -1,5 +1,6 @@
 from django.urls import include, path, re_path
 from .views import IndexView, OAuthUserEndpoint, oauth_complete
+from gateway.views import GatewayHealthView
 from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
@@ -10,6 +11,7 @@ urlpatterns = [
     path('', IndexView.as_view(), name='index'),
     path('admin/', admin.site.urls),
     path('oauthuser/', OAuthUserEndpoint.as_view()),
+    path('health_check/services/', GatewayHealthView.as_view(), name='gateway-health'),
     path('health_check/', include('health_check.urls')),
     path('datamesh/', include('datamesh.urls')),
     path('', include('gateway.urls')),
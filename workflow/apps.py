@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class WorkflowAppConfig(AppConfig):
     name = 'workflow'
+
+    def ready(self):
+        from . import signals  # noqa
@@ -0,0 +1,37 @@
+from collections.abc import Mapping
+
+from oauth2_provider_jwt.authentication import JWTAuthentication
+
+from workflow.models import CoreUser, PERMISSIONS_ADMIN
+
+
+def get_role_claims(user: CoreUser) -> dict:
+    """ Role claims of the user for the JWT, they are valid until core groups of the user change """
+    core_groups_version = user.core_groups_version
+    return {
+        'is_org_admin': user.is_org_admin,
+        # superusers are global admins regardless of the claim, it's checked on every request
+        'is_global_admin': user.core_groups.filter(permissions=PERMISSIONS_ADMIN, is_global=True).exists(),
+        'core_groups_version': core_groups_version,
+    }
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication which trusts the role claims of the token (signed in by `jwt_utils.payload_enricher`),
+    so `CoreUser.is_org_admin` and `CoreUser.is_global_admin` don't query the core groups on every request.
+    Claims are read from the payload of the validated token, not from the session which can hold claims of
+    another token, and are ignored once the core groups version of the user changed.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            claims = token if isinstance(token, Mapping) else {}
+            if (isinstance(user, CoreUser)
+                    and claims.get('core_groups_version') == user.core_groups_version
+                    and 'is_org_admin' in claims and 'is_global_admin' in claims):
+                user._is_org_admin = bool(claims['is_org_admin'])
+                user._is_global_admin = bool(claims['is_global_admin'])
+        return result
@@ -1,7 +1,10 @@
 from django import forms
+from django.db.models import Exists, OuterRef, Q
 import django_filters
+from rest_framework.filters import BaseFilterBackend
 
-from .models import WorkflowLevel2
+from .models import CoreGroup, WorkflowLevel1, WorkflowLevel2
+from .permission_matrix import ACTION_BITS, PermissionMatrix, get_permission_matrix
 
 
 class DateRangeWidget(django_filters.widgets.SuffixedMultiWidget):
@@ -27,3 +30,38 @@ class WorkflowLevel2Filter(django_filters.FilterSet):
             'status__short_name',
             'status__uuid',
         ]
+
+
+class CoreGroupsFilterBackend(BaseFilterBackend):
+    """
+    Filters lists of WorkflowLevel1 and WorkflowLevel2 by the CoreGroup read permissions of the user in the database,
+    with the same rules like CoreGroupsPermissions.has_object_permission: WorkflowLevel1s are readable with
+    organization level permissions, WorkflowLevel2s with permissions of the groups of their WorkflowLevel1.
+    Other actions aren't filtered, access to single objects is checked by CoreGroupsPermissions.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) != 'list' or request.user.is_superuser:
+            return queryset
+
+        matrix = get_permission_matrix(request.user)
+        if matrix.is_global_admin:
+            return queryset
+
+        if queryset.model is WorkflowLevel1:
+            queryset = queryset.filter(organization_id=request.user.organization_id)
+            if matrix.is_org_admin or PermissionMatrix.allows(matrix.org_mask, 'list'):
+                return queryset
+            return queryset.none()
+
+        queryset = queryset.filter(workflowlevel1__organization_id=request.user.organization_id)
+        if matrix.is_org_admin:
+            return queryset
+        # values of CoreGroup.permissions with the read bit, values bigger than 15 grant all permissions
+        read_permissions = [i for i in range(16) if i & ACTION_BITS['list']]
+        readable_groups = CoreGroup.objects.filter(
+            Q(permissions__in=read_permissions) | Q(permissions__gte=16),
+            user=request.user,
+            workflowlevel1s=OuterRef('workflowlevel1_id'),
+        )
+        return queryset.annotate(is_readable=Exists(readable_groups)).filter(is_readable=True)
@@ -5,6 +5,7 @@ import jwt
 from django.conf import settings
 from oauth2_provider.models import RefreshToken
 
+from workflow.authentication import get_role_claims
 from workflow.models import CoreUser, Organization
 from gateway.exceptions import PermissionDenied
 
@@ -15,14 +16,14 @@ def payload_enricher(request):
     if request.POST.get('username'):
         username = request.POST.get('username')
         try:
-            user = CoreUser.objects.values(
-                'core_user_uuid', 'organization__organization_uuid').get(username=username)
+            user = CoreUser.objects.get(username=username)
         except CoreUser.DoesNotExist:
             logger.error('No matching CoreUser found.')
             raise PermissionDenied('No matching CoreUser found.')
         return {
-            'core_user_uuid': user['core_user_uuid'],
-            'organization_uuid': str(user['organization__organization_uuid']),
+            'core_user_uuid': user.core_user_uuid,
+            'organization_uuid': str(user.organization_id),
+            **get_role_claims(user),
         }
     elif request.POST.get('refresh_token'):
         try:
@@ -32,6 +33,7 @@ def payload_enricher(request):
                 'core_user_uuid': user.core_user_uuid,
                 'organization_uuid': str(user.organization.organization_uuid),
                 'username': user.username,
+                **get_role_claims(user),
             }
         except RefreshToken.DoesNotExist:
             logger.warning('RefreshToken not found.')
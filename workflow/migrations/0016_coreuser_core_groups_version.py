@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0015_auto_20190731_1419'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coreuser',
+            name='core_groups_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented whenever core groups of the user or their permissions change, role claims of JWTs with another version are outdated'),
+        ),
+    ]
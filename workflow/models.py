@@ -183,6 +183,7 @@ class CoreUser(AbstractUser):
     organization = models.ForeignKey(Organization, blank=True, null=True, on_delete=models.CASCADE, help_text='Related Org to associate with')
     core_groups = models.ManyToManyField(CoreGroup, verbose_name='User groups', blank=True, related_name='user_set', related_query_name='user')
     privacy_disclaimer_accepted = models.BooleanField(default=False)
+    core_groups_version = models.PositiveIntegerField(default=0, editable=False, help_text='Incremented whenever core groups of the user or their permissions change, role claims of JWTs with another version are outdated')
     create_date = models.DateTimeField(default=timezone.now)
     edit_date = models.DateTimeField(null=True, blank=True)
 
@@ -193,11 +194,16 @@ class CoreUser(AbstractUser):
         return self.username
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
+        is_new = self._state.adding
         if self.create_date is None:
             self.create_date = timezone.now()
         self.edit_date = timezone.now()
-        super(CoreUser, self).save()
+        if is_new:
+            super(CoreUser, self).save()
+        else:
+            # core_groups_version is only incremented in the database, a stale instance mustn't overwrite it
+            super(CoreUser, self).save(update_fields=[field.name for field in self._meta.concrete_fields
+                                                      if not field.primary_key and field.name != 'core_groups_version'])
         if is_new:
             # Add default groups
             self.core_groups.add(*CoreGroup.objects.filter(organization=self.organization, is_default=True))
@@ -0,0 +1,112 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from workflow.models import CoreUser, WorkflowLevel1, WorkflowLevel2, PERMISSIONS_ADMIN, PERMISSIONS_ORG_ADMIN
+
+
+logger = logging.getLogger(__name__)
+
+# bits of the CRUD permissions of a view action, same order like in CoreGroup.permissions
+ACTION_BITS = {'create': 0b1000,
+               'list': 0b0100,
+               'retrieve': 0b0100,
+               'update': 0b0010,
+               'partial_update': 0b0010,
+               'destroy': 0b0001,
+               }
+
+VERSION_KEY = 'workflow:permission_matrix:version'
+
+
+def to_mask(permissions: int) -> int:
+    """ Same like in CoreGroup.display_permissions values bigger than 15 grant all permissions """
+    return permissions if permissions < 16 else 0b1111
+
+
+class PermissionMatrix:
+    """
+    CRUD permissions of a user compiled from all of their core groups into integer bitmasks:
+    global, organization level and per WorkflowLevel1/WorkflowLevel2 (keyed by pk).
+    """
+
+    def __init__(self):
+        self.global_mask = 0
+        self.org_mask = 0
+        self.wl1_masks = {}
+        self.wl2_masks = {}
+        self.is_global_admin = False
+        self.is_org_admin = False
+
+    @staticmethod
+    def allows(mask: int, action: str) -> bool:
+        """ Check if CRUD action corresponds to permissions """
+        try:
+            return bool(mask & ACTION_BITS[action])
+        except KeyError:
+            logger.warning(f'No view action with such name: {action}')
+            return False
+
+    @classmethod
+    def build(cls, user: CoreUser) -> 'PermissionMatrix':
+        matrix = cls()
+        if user.pk is None:
+            return matrix
+
+        groups = user.core_groups.values_list('pk', 'permissions', 'is_global', 'is_org_level')
+        masks = {}
+        for pk, permissions, is_global, is_org_level in groups:
+            masks[pk] = to_mask(permissions)
+            if is_global:
+                matrix.global_mask |= masks[pk]
+                matrix.is_global_admin |= permissions == PERMISSIONS_ADMIN
+            if is_org_level:
+                matrix.org_mask |= masks[pk]
+                matrix.is_org_admin |= permissions == PERMISSIONS_ORG_ADMIN
+
+        for model, model_masks in ((WorkflowLevel1, matrix.wl1_masks), (WorkflowLevel2, matrix.wl2_masks)):
+            through = model.core_groups.through
+            field_name = f'{model._meta.model_name}_id'
+            for pk, group_pk in through.objects.filter(coregroup_id__in=masks).values_list(field_name, 'coregroup_id'):
+                model_masks[pk] = model_masks.get(pk, 0) | masks[group_pk]
+        return matrix
+
+
+def _get_cache():
+    return caches[settings.WORKFLOW_PERMISSIONS_CACHE]
+
+
+def _get_version() -> str:
+    cache = _get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_permission_matrix(user: CoreUser) -> PermissionMatrix:
+    """
+    Get compiled permissions of the user, they are built once and cached until the user's groups change.
+    The key contains the user's core_groups_version, which is incremented in the database by every change of
+    the groups, so processes which don't share the cache don't use outdated permissions either.
+    """
+    if user.pk is None:
+        return PermissionMatrix.build(user)
+    cache = _get_cache()
+    key = f'workflow:permission_matrix:{_get_version()}:{user.core_user_uuid}:{user.core_groups_version}'
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = PermissionMatrix.build(user)
+        cache.set(key, matrix, settings.WORKFLOW_PERMISSIONS_CACHE_TIMEOUT)
+    return matrix
+
+
+def invalidate_permission_matrix() -> None:
+    """
+    Drop cached permissions of all users. Instances of users loaded before their core_groups_version was
+    incremented (p.e. the user of the current request) would get outdated permissions otherwise
+    """
+    _get_cache().delete(VERSION_KEY)
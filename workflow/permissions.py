@@ -1,38 +1,16 @@
 import logging
-from collections import defaultdict
 
 from rest_framework import permissions
 from rest_framework.relations import ManyRelatedField
 from django.http import QueryDict
 
 from workflow.models import Organization, WorkflowLevel1, WorkflowLevel2, PERMISSIONS_VIEW_ONLY
+from workflow.permission_matrix import get_permission_matrix
 
 
 logger = logging.getLogger(__name__)
 
 
-def merge_permissions(permissions1: str, permissions2: str) -> str:
-    """ Merge two CRUD permissions string representations"""
-    return ''.join(map(str, [max(int(i), int(j)) for i, j in zip(permissions1, permissions2)]))
-
-
-def has_permission(permissions_: str, action: str) -> bool:
-    """ Check if CRUD action corresponds to permissions"""
-    actions = {'create': 0,
-               'list': 1,
-               'retrieve': 1,
-               'update': 2,
-               'partial_update': 2,
-               'destroy': 3,
-               }
-    try:
-        i = actions[action]
-    except KeyError:
-        logger.warning(f'No view action with such name: {action}')
-        return False
-    return bool(int(permissions_[i]))
-
-
 class IsSuperUserBrowseableAPI(permissions.BasePermission):
 
     def has_permission(self, request, view):
@@ -153,33 +131,16 @@ class CoreGroupsPermissions(permissions.BasePermission):
         if request.user.is_anonymous or not request.user.is_active:
             return False
 
-        if request.user.is_global_admin:
+        matrix = get_permission_matrix(request.user)
+        if request.user.is_superuser or matrix.is_global_admin:
             return True
 
-        # TODO: check if we can optimize following query using 'through' M2M Models
-        user_groups = request.user.core_groups.prefetch_related('workflowlevel1s', 'workflowlevel2s')
-
-        # sort up permissions into more convenient way (default is read-only '0100')
-        viewonly_display_permissions = '{0:04b}'.format(PERMISSIONS_VIEW_ONLY)
-        global_permissions, org_permissions = viewonly_display_permissions, viewonly_display_permissions
-        wl1_permissions = defaultdict(lambda: viewonly_display_permissions)
-        wl2_permissions = defaultdict(lambda: viewonly_display_permissions)
-        for group in user_groups:
-            if group.is_global:
-                global_permissions = merge_permissions(global_permissions, group.display_permissions)
-            elif group.is_org_level:
-                org_permissions = merge_permissions(org_permissions, group.display_permissions)
-            else:
-                for wl1 in group.workflowlevel1s.all():
-                    wl1_permissions[wl1.pk] = merge_permissions(wl1_permissions[wl1.pk], group.display_permissions)
-                for wl2 in group.workflowlevel2s.all():
-                    wl2_permissions[wl2.pk] = merge_permissions(wl2_permissions[wl2.pk], group.display_permissions)
-
+        # permissions are read-only by default
         action = view.action
-        if has_permission(global_permissions, action):
+        if matrix.allows(matrix.global_mask | PERMISSIONS_VIEW_ONLY, action):
             return True
 
-        if has_permission(org_permissions, action):
+        if matrix.allows(matrix.org_mask | PERMISSIONS_VIEW_ONLY, action):
             return True
 
         if action in 'create':
@@ -198,7 +159,7 @@ class CoreGroupsPermissions(permissions.BasePermission):
                     wflvl1 = [wflvl1]
 
                 for item in wflvl1:
-                    if has_permission(wl1_permissions[item.pk], action):
+                    if matrix.allows(matrix.wl1_masks.get(item.pk, 0) | PERMISSIONS_VIEW_ONLY, action):
                         return True
 
                 # TODO: Check WorkflowLevel2 permissions
@@ -233,27 +194,25 @@ class CoreGroupsPermissions(permissions.BasePermission):
         if request.user.is_anonymous or not request.user.is_active:
             return False
 
-        # TODO: Need some optimization pre-fetching all user's core gropus
-        if request.user.is_global_admin:
+        matrix = get_permission_matrix(request.user)
+        if request.user.is_superuser or matrix.is_global_admin:
             return True
 
         queryset = self._queryset(view)
         model_cls = queryset.model
 
-        if request.user.is_org_admin:
+        if matrix.is_org_admin:
             return True
 
         if model_cls is WorkflowLevel1:
             # Permissions on WorkflowLevel1 itself are defined by Org-level permissions
-            groups = request.user.core_groups.filter(is_org_level=True)
-        elif hasattr(obj, 'workflowlevel1'):
-            groups = request.user.core_groups.all().intersection(obj.workflowlevel1.core_groups.all())
+            mask = matrix.org_mask
+        elif hasattr(obj, 'workflowlevel1_id'):
+            mask = matrix.wl1_masks.get(obj.workflowlevel1_id, 0)
         else:
             return True
 
         if hasattr(view, 'action'):
-            for group in groups:
-                if has_permission(group.display_permissions, view.action):
-                    return True
+            return matrix.allows(mask, view.action)
 
         return False
@@ -0,0 +1,52 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from workflow.models import CoreGroup, CoreUser, WorkflowLevel1, WorkflowLevel2
+from workflow.permission_matrix import invalidate_permission_matrix
+
+
+def increment_core_groups_version(users) -> None:
+    """ Outdate role claims in the JWTs of the users """
+    users.update(core_groups_version=F('core_groups_version') + 1)
+
+
+@receiver([post_save, post_delete], sender=CoreGroup)
+def invalidate_permissions_on_group_change(sender, instance, **kwargs):
+    """ Permissions of a group are compiled into permissions of all its users """
+    invalidate_permission_matrix()
+
+
+@receiver([post_save, pre_delete], sender=CoreGroup)
+def increment_versions_on_group_change(sender, instance, **kwargs):
+    increment_core_groups_version(CoreUser.objects.filter(core_groups=instance))
+
+
+@receiver(m2m_changed, sender=CoreUser.core_groups.through)
+def invalidate_permissions_on_user_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # all users are going to be removed from the group
+        increment_core_groups_version(CoreUser.objects.filter(core_groups=instance))
+    if not action.startswith('post_'):
+        return
+    invalidate_permission_matrix()
+    if not reverse:
+        increment_core_groups_version(CoreUser.objects.filter(pk=instance.pk))
+    elif pk_set is not None:
+        # users were added to or removed from the group
+        increment_core_groups_version(CoreUser.objects.filter(pk__in=pk_set))
+
+
+@receiver(m2m_changed, sender=WorkflowLevel1.core_groups.through)
+@receiver(m2m_changed, sender=WorkflowLevel2.core_groups.through)
+def invalidate_permissions_on_workflowlevel_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action == 'pre_clear':
+        # all groups are going to be removed from the workflow level
+        increment_core_groups_version(CoreUser.objects.filter(core_groups__in=instance.core_groups.all()))
+    if not action.startswith('post_'):
+        return
+    invalidate_permission_matrix()
+    if reverse:
+        increment_core_groups_version(CoreUser.objects.filter(core_groups=instance))
+    elif pk_set is not None:
+        increment_core_groups_version(CoreUser.objects.filter(core_groups__in=pk_set))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import datetime
+from unittest.mock import patch
 
 from django.test import TestCase
 from django.test.client import RequestFactory
@@ -8,8 +9,9 @@ from django.utils import timezone
 import factories
 from oauth2_provider.models import get_application_model, get_access_token_model, get_refresh_token_model
 
+from ..authentication import RoleClaimsJWTAuthentication, get_role_claims
 from ..jwt_utils import payload_enricher
-from workflow.models import ROLE_ORGANIZATION_ADMIN
+from workflow.models import PERMISSIONS_ORG_ADMIN, ROLE_ORGANIZATION_ADMIN
 
 
 AccessToken = get_access_token_model()
@@ -43,6 +45,8 @@ class JWTUtilsTest(TestCase):
             application=application,
             token="007"
         )
+        # version was incremented when the default core group was added
+        self.core_user.refresh_from_db()
 
     def test_jwt_payload_enricher(self):
         request = self.rf.post('', {'username': self.core_user.username})
@@ -50,6 +54,9 @@ class JWTUtilsTest(TestCase):
         expected_payload = {
             'core_user_uuid': str(self.core_user.core_user_uuid),
             'organization_uuid': str(self.core_user.organization.organization_uuid),
+            'is_org_admin': False,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version,
         }
         self.assertEqual(payload, expected_payload)
 
@@ -68,6 +75,9 @@ class JWTUtilsTest(TestCase):
         expected_payload = {
             'core_user_uuid': str(self.core_user.core_user_uuid),
             'organization_uuid': str(self.core_user.organization.organization_uuid),
+            'is_org_admin': False,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version,
         }
         self.assertEqual(payload, expected_payload)
 
@@ -80,6 +90,9 @@ class JWTUtilsTest(TestCase):
         expected_payload = {
             'core_user_uuid': str(self.core_user.core_user_uuid),
             'organization_uuid': str(self.core_user.organization.organization_uuid),
+            'is_org_admin': False,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version,
         }
         self.assertEqual(payload, expected_payload)
 
@@ -90,5 +103,72 @@ class JWTUtilsTest(TestCase):
             'core_user_uuid': str(self.core_user.core_user_uuid),
             'organization_uuid': str(self.core_user.organization.organization_uuid),
             'username': self.core_user.username,
+            'is_org_admin': False,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version,
         }
         self.assertEqual(payload, expected_payload)
+
+    def test_jwt_payload_enricher_core_org_admin(self):
+        group_org_admin = factories.CoreGroup(name='Org Admin', is_org_level=True,
+                                              permissions=PERMISSIONS_ORG_ADMIN,
+                                              organization=self.core_user.organization)
+        self.core_user.core_groups.add(group_org_admin)
+        self.core_user.refresh_from_db()
+
+        request = self.rf.post('', {'username': self.core_user.username})
+        payload = payload_enricher(request)
+        self.assertTrue(payload['is_org_admin'])
+        self.assertEqual(payload['core_groups_version'], self.core_user.core_groups_version)
+
+
+class RoleClaimsJWTAuthenticationTest(TestCase):
+
+    def setUp(self) -> None:
+        self.core_user = factories.CoreUser()
+        self.core_user.refresh_from_db()
+
+    def _authenticate(self, claims, session=None):
+        request = RequestFactory().get('')
+        request.session = session or {}
+        with patch('oauth2_provider_jwt.authentication.JWTAuthentication.authenticate',
+                   return_value=(self.core_user, claims)):
+            user, _ = RoleClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def test_role_claims_are_trusted(self):
+        user = self._authenticate({
+            'is_org_admin': True,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version,
+        })
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_org_admin)
+            self.assertFalse(user.is_global_admin)
+
+    def test_outdated_role_claims_are_ignored(self):
+        user = self._authenticate({
+            'is_org_admin': True,
+            'is_global_admin': False,
+            'core_groups_version': self.core_user.core_groups_version - 1,
+        })
+        self.assertFalse(user.is_org_admin)
+
+    def test_stale_session_claims_are_ignored(self):
+        # the session holds the claims of another token, the current token has none
+        user = self._authenticate({'core_user_uuid': self.core_user.core_user_uuid}, session={
+            'jwt_is_org_admin': True,
+            'jwt_is_global_admin': True,
+            'jwt_core_groups_version': self.core_user.core_groups_version,
+        })
+        self.assertFalse(user.is_org_admin)
+        self.assertFalse(user.is_global_admin)
+
+    def test_global_admin_claim_does_not_outlast_superuser_status(self):
+        self.core_user.is_superuser = True
+        self.core_user.save()
+        claims = get_role_claims(self.core_user)
+        self.core_user.is_superuser = False
+        self.core_user.save()
+
+        self.assertFalse(self._authenticate(claims).is_global_admin)
@@ -0,0 +1,105 @@
+import pytest
+from django.db.models import F
+
+import factories
+from workflow.models import CoreUser, PERMISSIONS_ORG_ADMIN, PERMISSIONS_VIEW_ONLY, PERMISSIONS_WORKFLOW_TEAM
+from workflow.permission_matrix import PermissionMatrix, get_permission_matrix
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_compiles_groups():
+    user = factories.CoreUser.create()
+    wfl1 = factories.WorkflowLevel1.create(organization=user.organization)
+    wfl2 = factories.WorkflowLevel2.create(workflowlevel1=wfl1)
+    team_group = factories.CoreGroup.create(organization=user.organization, permissions=PERMISSIONS_WORKFLOW_TEAM)
+    delete_group = factories.CoreGroup.create(organization=user.organization, permissions=1)
+    wfl1.core_groups.add(team_group, delete_group)
+    wfl2.core_groups.add(delete_group)
+    user.core_groups.add(team_group, delete_group)
+
+    matrix = get_permission_matrix(user)
+
+    assert matrix.wl1_masks == {wfl1.pk: 0b1111}
+    assert matrix.wl2_masks == {wfl2.pk: 0b0001}
+    assert matrix.org_mask == PERMISSIONS_VIEW_ONLY  # default group of the organization
+    assert not matrix.is_org_admin
+    assert PermissionMatrix.allows(matrix.wl1_masks[wfl1.pk], 'destroy')
+    assert not PermissionMatrix.allows(matrix.org_mask, 'update')
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_is_cached(django_assert_num_queries):
+    user = factories.CoreUser.create()
+    get_permission_matrix(user)
+
+    with django_assert_num_queries(0):
+        get_permission_matrix(user)
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_invalidated_on_user_groups_change():
+    user = factories.CoreUser.create()
+    assert not get_permission_matrix(user).is_org_admin
+
+    group = factories.CoreGroup.create(organization=user.organization, is_org_level=True,
+                                       permissions=PERMISSIONS_ORG_ADMIN)
+    user.core_groups.add(group)
+    assert get_permission_matrix(user).is_org_admin
+
+    group.user_set.remove(user)
+    assert not get_permission_matrix(user).is_org_admin
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_invalidated_on_group_change():
+    user = factories.CoreUser.create()
+    group = factories.CoreGroup.create(organization=user.organization, is_org_level=True)
+    user.core_groups.add(group)
+    assert not get_permission_matrix(user).is_org_admin
+
+    group.permissions = PERMISSIONS_ORG_ADMIN
+    group.save()
+    assert get_permission_matrix(user).is_org_admin
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_invalidated_on_workflowlevel_groups_change():
+    user = factories.CoreUser.create()
+    wfl1 = factories.WorkflowLevel1.create(organization=user.organization)
+    group = factories.CoreGroup.create(organization=user.organization, permissions=PERMISSIONS_WORKFLOW_TEAM)
+    user.core_groups.add(group)
+    assert wfl1.pk not in get_permission_matrix(user).wl1_masks
+
+    wfl1.core_groups.add(group)
+    assert get_permission_matrix(user).wl1_masks[wfl1.pk] == PERMISSIONS_WORKFLOW_TEAM
+
+    group.workflowlevel1s.clear()
+    assert wfl1.pk not in get_permission_matrix(user).wl1_masks
+
+
+@pytest.mark.django_db()
+def test_permission_matrix_outdated_by_another_process():
+    user = factories.CoreUser.create()
+    group = factories.CoreGroup.create(organization=user.organization, is_org_level=True,
+                                       permissions=PERMISSIONS_ORG_ADMIN)
+    assert not get_permission_matrix(user).is_org_admin
+
+    # another process adds the group, its signals don't invalidate the cache of this process
+    CoreUser.core_groups.through.objects.create(coreuser_id=user.pk, coregroup_id=group.pk)
+    CoreUser.objects.filter(pk=user.pk).update(core_groups_version=F('core_groups_version') + 1)
+
+    assert get_permission_matrix(CoreUser.objects.get(pk=user.pk)).is_org_admin
+
+
+@pytest.mark.django_db()
+def test_user_save_keeps_core_groups_version():
+    # users with an explicit pk (p.e. loaded from fixtures) are inserted like others
+    user = factories.CoreUser.create(pk=1000)
+    CoreUser.objects.filter(pk=user.pk).update(core_groups_version=F('core_groups_version') + 1)
+
+    user.first_name = 'Changed'
+    user.save()
+
+    user.refresh_from_db()
+    assert user.first_name == 'Changed'
+    assert user.core_groups_version == 1
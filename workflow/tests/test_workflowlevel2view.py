@@ -116,6 +116,29 @@ class WorkflowLevel2ListViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_list_workflowlevel2_filtered_by_core_groups(self):
+        wflvl1_readable = factories.WorkflowLevel1(organization=self.core_user.organization)
+        wflvl1_no_access = factories.WorkflowLevel1(organization=self.core_user.organization)
+        wflvl1_no_read = factories.WorkflowLevel1(organization=self.core_user.organization)
+        wflvl2 = factories.WorkflowLevel2(workflowlevel1=wflvl1_readable)
+        factories.WorkflowLevel2(workflowlevel1=wflvl1_no_access)
+        factories.WorkflowLevel2(workflowlevel1=wflvl1_no_read)
+
+        group_view_only = factories.CoreGroup(name='WF View Only', permissions=PERMISSIONS_VIEW_ONLY,
+                                              organization=self.core_user.organization)
+        group_create_only = factories.CoreGroup(name='WF Create Only', permissions=8,
+                                                organization=self.core_user.organization)
+        self.core_user.core_groups.add(group_view_only, group_create_only)
+        wflvl1_readable.core_groups.add(group_view_only)
+        wflvl1_no_read.core_groups.add(group_create_only)
+
+        request = self.factory.get(reverse('workflowlevel2-list'))
+        request.user = self.core_user
+        view = WorkflowLevel2ViewSet.as_view({'get': 'list'})
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [str(wflvl2.level2_uuid)])
+
     @patch('workflow.pagination.DefaultLimitOffsetPagination.default_limit', new_callable=PropertyMock)
     def test_list_workflowlevel2_pagination(self, default_limit_mock):
         """ For default_limit 1 and pagination by default, list wfl2 endpoint should
@@ -4,6 +4,7 @@ from rest_framework import status, viewsets, filters
 from rest_framework.response import Response
 import django_filters
 
+from workflow.filters import CoreGroupsFilterBackend
 from workflow.models import WorkflowLevel1
 from workflow.serializers import WorkflowLevel1Serializer
 from workflow.permissions import IsOrgMember, CoreGroupsPermissions
@@ -41,8 +42,6 @@ class WorkflowLevel1ViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         # Use this queryset or the django-filters lib will not work
         queryset = self.filter_queryset(self.get_queryset())
-        if not request.user.is_global_admin:
-            queryset = queryset.filter(organization_id=request.user.organization_id)
 
         paginate = request.GET.get('paginate')
         if paginate and (paginate.lower() == 'true' or paginate == '1'):
@@ -75,7 +74,8 @@ class WorkflowLevel1ViewSet(viewsets.ModelViewSet):
     ordering_fields = ('name',)
     ordering = ('name',)
     filterset_fields = ('name', 'level1_uuid')
-    filter_backends = (django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter)
+    filter_backends = (CoreGroupsFilterBackend, django_filters.rest_framework.DjangoFilterBackend,
+                       filters.OrderingFilter)
 
     queryset = WorkflowLevel1.objects.all()
     serializer_class = WorkflowLevel1Serializer
@@ -4,7 +4,7 @@ from rest_framework import viewsets, filters
 from rest_framework.response import Response
 import django_filters
 
-from workflow.filters import WorkflowLevel2Filter
+from workflow.filters import CoreGroupsFilterBackend, WorkflowLevel2Filter
 from workflow.models import WorkflowLevel2, WorkflowLevel2Sort, WorkflowTeam, ROLE_ORGANIZATION_ADMIN
 from workflow.serializers import WorkflowLevel2Serializer, WorkflowLevel2SortSerializer
 from workflow.permissions import IsOrgMember, CoreGroupsPermissions
@@ -38,9 +38,6 @@ class WorkflowLevel2ViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         # Use this queryset or the django-filters lib will not work
         queryset = self.filter_queryset(self.get_queryset())
-        if not request.user.is_global_admin:
-            organization_id = request.user.organization_id
-            queryset = queryset.filter(workflowlevel1__organization_id=organization_id)
 
         all_results = request.GET.get('all')
         if all_results and (all_results.lower() == 'true' or all_results == '1'):
@@ -63,6 +60,7 @@ class WorkflowLevel2ViewSet(viewsets.ModelViewSet):
 
     ordering = ('name',)
     filter_backends = (
+        CoreGroupsFilterBackend,
         django_filters.rest_framework.DjangoFilterBackend,
         filters.OrderingFilter
     )